@@ -6,16 +6,64 @@ This script scans all markdown files in the docs directory,
 extracts metadata and content, and builds a searchable index
 for the RAG documentation agent.
 
+The output is deterministic: files are processed in sorted order, document
+dates come from the last git commit touching each file, and the metadata
+records a content hash of the docs tree, so identical docs always produce
+an identical index.
+
+Besides the docs tree, the builder can index several named roots (READMEs,
+TSDoc comments under src/, Rust doc comments under src-tauri/, see
+index_roots.py). Roots are parsed in parallel worker processes, each root
+keeps its own incremental state so unchanged files are not parsed again,
+and every document is tagged with the root it comes from.
+
+A branch or worktree does not need a full build of its own: `--overlay`
+indexes only the files `git diff` reports against the ref the shared base
+index was built from, plus tombstones for deleted files, and the search
+engine stacks that overlay on top of the base index.
+
 Usage:
     python scripts/rag/build_doc_index.py
+    python scripts/rag/build_doc_index.py --segments [docs/.doc-segments]
+    python scripts/rag/build_doc_index.py --sqlite [docs/.doc-index.sqlite]
+    python scripts/rag/build_doc_index.py --if-changed
+    python scripts/rag/build_doc_index.py --check-links
+    python scripts/rag/build_doc_index.py --max-file-size 1048576 --max-section-size 65536
+    python scripts/rag/build_doc_index.py --roots docs readme src tauri --jobs 4
+    python scripts/rag/build_doc_index.py --spimi [docs/.doc-postings] --memory-budget 256
+    python scripts/rag/build_doc_index.py --overlay [docs/.doc-overlay.json] --base-ref main
 """
 
+import argparse
+import base64
+import hashlib
 import json
+import os
+import posixpath
 import re
+import subprocess
+import sys
+import threading
 from collections import Counter
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Tuple
+from urllib.parse import unquote
+
+import index_roots
+from doc_records import Document, Section, link_section_tree
+from index_postings import (
+	DEFAULT_MEMORY_BUDGET,
+	STRING_OVERHEAD_BYTES,
+	TABLE_NAME,
+	SpimiIndexWriter,
+)
+from index_roots import DEFAULT_ROOTS, IndexRoot
+from index_segments import SegmentStore, atomic_write_json
+from index_sqlite import SqliteIndex
+from index_snapshot import build_term_filter, document_terms, write_snapshot
+from index_trigrams import write_trigrams
 
 
 # Module-level constant for stop words to avoid recreating on every call
@@ -29,21 +77,184 @@ STOP_WORDS = {
 	"avec", "par", "sur",
 }
 
+def format_timestamp(timestamp: int) -> str:
+	"""
+	Format a Unix timestamp as an ISO 8601 UTC date.
+
+	Args:
+		timestamp: Seconds since the epoch
+
+	Returns:
+		ISO date such as 2026-01-11T09:30:00+00:00
+	"""
+	return datetime.fromtimestamp(timestamp, tz=timezone.utc).isoformat()
+
+
+# Markdown heading: 1 to 6 '#' followed by the title
+HEADING_PATTERN = re.compile(r"^(#{1,6})\s+(.+)$")
+
+# Opening fence of a fenced code block (``` or ~~~, up to 3 spaces indent)
+FENCE_PATTERN = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+FENCE_PREFIXES = ("```", "~~~")
+
+# Keyword terms (markdown syntax characters are never part of a word)
+WORD_PATTERN = re.compile(r"\w+")
+
+# Inline link target: [text](target "title"), images excluded
+LINK_PATTERN = re.compile(r"(?<![!\\])\[[^\]]*\]\(\s*<?([^\s)>]+)")
+CODE_SPAN_PATTERN = re.compile(r"`[^`]*`")
+
+# URL scheme (http:, mailto:, ...) marking a link that leaves the repository
+URL_SCHEME_PATTERN = re.compile(r"^[A-Za-z][A-Za-z0-9+.-]*:")
+
+# Files larger than this (in bytes) are streamed line by line instead of
+# being read whole
+STREAMING_THRESHOLD = 1024 * 1024
+
+# Default caps, in characters, on the indexed text of a file and on the
+# content stored for a single section
+MAX_FILE_SIZE = 4 * 1024 * 1024
+MAX_SECTION_SIZE = 256 * 1024
+
+# Lines past the section cap are tokenized in chunks of about this size
+OVERFLOW_CHUNK_SIZE = 64 * 1024
+
+# Version of the per-root incremental state files
+ROOT_STATE_VERSION = 1
+
+# PageRank damping factor and convergence threshold
+AUTHORITY_DAMPING = 0.85
+AUTHORITY_TOLERANCE = 1e-10
+
+
+def resolve_link(source_path: str, target: str) -> Optional[str]:
+	"""
+	Resolve a markdown link target to a repository path.
+
+	Args:
+		source_path: POSIX path of the linking document, relative to the repo
+		target: Raw link target
+
+	Returns:
+		Normalized POSIX path relative to the repo, or None for external,
+		anchor-only and empty links
+	"""
+	if target.startswith(("#", "//")) or URL_SCHEME_PATTERN.match(target):
+		return None
+
+	target = unquote(target.split("#", 1)[0].split("?", 1)[0])
+	if not target:
+		return None
+
+	if target.startswith("/"):
+		# Root-relative links resolve from the repository root
+		return posixpath.normpath(target.lstrip("/"))
+	return posixpath.normpath(posixpath.join(posixpath.dirname(source_path), target))
+
+
+def compute_authority(
+	links: Dict[str, List[str]],
+	damping: float = AUTHORITY_DAMPING,
+	max_iterations: int = 100,
+) -> Dict[str, float]:
+	"""
+	Compute PageRank authority over the document link graph.
+
+	Rank of documents without outgoing links is spread over all documents.
+
+	Args:
+		links: Linked document paths keyed by document path; targets that are
+			not keys of the mapping are ignored
+		damping: Probability of following a link rather than jumping
+		max_iterations: Upper bound on power iterations
+
+	Returns:
+		Authority per document, normalized so the top document has 1.0 and
+		rounded so identical graphs always give identical values
+	"""
+	nodes = sorted(links)
+	if not nodes:
+		return {}
+
+	n = len(nodes)
+	edges = {
+		node: sorted({target for target in links[node] if target in links and target != node})
+		for node in nodes
+	}
+	rank = {node: 1.0 / n for node in nodes}
+
+	for _ in range(max_iterations):
+		dangling = sum(rank[node] for node in nodes if not edges[node])
+		base = (1.0 - damping) / n + damping * dangling / n
+		new_rank = {node: base for node in nodes}
+		for node in nodes:
+			if edges[node]:
+				share = damping * rank[node] / len(edges[node])
+				for target in edges[node]:
+					new_rank[target] += share
+
+		delta = sum(abs(new_rank[node] - rank[node]) for node in nodes)
+		rank = new_rank
+		if delta < AUTHORITY_TOLERANCE:
+			break
+
+	top = max(rank.values())
+	return {node: round(rank[node] / top, 6) for node in nodes}
+
 
 class DocumentationIndexBuilder:
 	"""Builds searchable index from markdown documentation files."""
 
-	def __init__(self, docs_root: str = "docs"):
+	def __init__(
+		self,
+		docs_root: str = "docs",
+		max_file_size: int = MAX_FILE_SIZE,
+		max_section_size: int = MAX_SECTION_SIZE,
+		streaming_threshold: int = STREAMING_THRESHOLD,
+		roots: Optional[List[IndexRoot]] = None,
+		state_dir: Optional[str] = None,
+		jobs: int = 1,
+	):
 		"""
 		Initialize the index builder.
 
 		Args:
-			docs_root: Root directory containing documentation
+			docs_root: Root directory containing documentation; its parent is
+				the repository root that index root directories are relative to
+			max_file_size: Characters of a file that are indexed at most
+			max_section_size: Characters of content stored per section at most
+			streaming_threshold: File size in bytes above which files are streamed
+			roots: Index roots to scan (defaults to the docs root alone)
+			state_dir: Directory of the per-root incremental state, or None
+				to parse every file on every build
+			jobs: Number of worker processes parsing roots in parallel
 		"""
 		self.docs_root = Path(docs_root)
-		self.documents: List[Dict[str, Any]] = []
+		self.repo_root = self.docs_root.parent
+		self.max_file_size = max_file_size
+		self.max_section_size = max_section_size
+		self.streaming_threshold = streaming_threshold
+		self.roots = roots if roots is not None else [IndexRoot("docs", self.docs_root.name)]
+		self.state_dir = Path(state_dir) if state_dir else None
+		self.jobs = jobs
+		self.documents: List[Document] = []
 		self.metadata: Dict[str, Any] = {}
 		self.all_keywords: Counter = Counter()
+		# Last commit time per document path, filled by build_index
+		self.commit_times: Dict[str, int] = {}
+		# Internal links whose target does not exist: source, line, target
+		self.broken_links: List[Dict[str, Any]] = []
+		# Raw (line, target) links per document path, kept for link resolution
+		self.raw_links: Dict[str, List[tuple]] = {}
+		# Paths of parsed source files without any doc comment
+		self.empty_files: set = set()
+		# Paths deleted (tombstoned) by an overlay, filled by build_overlay
+		self.deleted: List[str] = []
+		# File holding the full documents, their byte ranges and term filters,
+		# recorded by save_index or build_external_index for save_metadata
+		self.body_store: Optional[Dict[str, Any]] = None
+		# Content digest per (path, size, mtime_ns), so files are hashed once
+		self._file_digests: Dict[tuple, str] = {}
 
 	def should_exclude(self, file_path: Path) -> bool:
 		"""
@@ -116,51 +327,213 @@ class DocumentationIndexBuilder:
 		# Default priority
 		return "normal"
 
-	def extract_markdown_sections(self, content: str) -> List[Dict[str, Any]]:
+	def tokenize_markdown(self, lines: Iterable[str]) -> Iterator[Dict[str, Any]]:
 		"""
-		Extract sections from markdown content.
+		Tokenize markdown in a single streaming pass over its lines.
 
-		Args:
-			content: Markdown content
+		Lines are classified as they stream by: headings and links are only
+		detected outside fenced code blocks, and section lines are
+		accumulated in a list that is joined once when the section ends. The
+		joined text is tokenized once for both keyword term counts and word
+		counts.
 
-		Returns:
-			List of sections with title, level, and content
+		Section content is capped at `max_section_size` characters. Lines
+		past the cap are not kept, but are still tokenized in bounded chunks,
+		so term and word counts cover the whole section.
+
+		Every record carries its source span: line_start (the heading line)
+		and line_end, 1-based and inclusive, and the [byte_start, byte_end)
+		span of the section in the UTF-8 encoded text.
+
+		Args:
+			lines: Lines of the document, split on "\n"; a trailing "\r" of
+				CRLF files is counted in the byte spans, then dropped
+
+		Yields:
+			One record per section with title, level, content, line_start,
+			line_end, byte_start, byte_end, term_counts, word_count, links
+			(line number, raw target) and truncated. Text before the first
+			heading is yielded first as a level 0 record without title.
 		"""
-		sections = []
-		current_section = None
+		title, level, heading_line = None, 0, ""
+		section_lines: List[str] = []
+		section_links: List[tuple] = []
+		fence = None
+		max_section_size = self.max_section_size
+		section_size = 0
+		overflow: Optional[Dict[str, Any]] = None
+		# Start line and byte of the current section, and bytes read so far
+		span_line, span_byte = 1, 0
+		byte_offset = 0
+		line_number, line = 0, ""
+
+		for line_number, line in enumerate(lines, 1):
+			line_offset = byte_offset
+			byte_offset += (len(line) if line.isascii() else len(line.encode("utf-8"))) + 1
+			if line.endswith("\r"):
+				line = line[:-1]
+
+			# Cheap prefix checks first, regexes only on candidate lines
+			stripped = line.lstrip(" ")
+			if stripped.startswith(FENCE_PREFIXES):
+				if fence is None:
+					fence_match = FENCE_PATTERN.match(line)
+					if fence_match:
+						fence = fence_match.group(1)
+				elif stripped.startswith(fence) and not stripped.rstrip().strip(fence[0]):
+					# Closing fence: same character, at least as long as the opening
+					fence = None
+			elif fence is None:
+				line_links = self._line_links(line, line_number) if "](" in line else []
+
+				if line.startswith("#"):
+					heading_match = HEADING_PATTERN.match(line)
+					if heading_match:
+						yield self._section_record(
+							title, level, heading_line, section_lines,
+							(span_line, line_number - 1, span_byte, line_offset),
+							section_links, overflow,
+						)
+						title = heading_match.group(2).strip()
+						level = len(heading_match.group(1))
+						heading_line = line
+						section_lines = []
+						section_links = line_links
+						section_size = 0
+						overflow = None
+						span_line, span_byte = line_number, line_offset
+						continue
+
+				section_links.extend(line_links)
+
+			section_size += len(line) + 1
+			if section_size <= max_section_size:
+				section_lines.append(line)
+			else:
+				if overflow is None:
+					overflow = {"lines": [], "size": 0, "term_counts": Counter(), "word_count": 0}
+				overflow["lines"].append(line)
+				overflow["size"] += len(line) + 1
+				if overflow["size"] >= OVERFLOW_CHUNK_SIZE:
+					self._count_overflow(overflow)
+
+		# The last line has no terminator; an empty last line is the one
+		# after the final newline, not a line of its own
+		last_line = line_number if line else line_number - 1
+		yield self._section_record(
+			title, level, heading_line, section_lines,
+			(span_line, max(span_line, last_line), span_byte, max(span_byte, byte_offset - 1)),
+			section_links, overflow,
+		)
+
+	@staticmethod
+	def _count_terms(text: str) -> Counter:
+		"""Count the keyword terms of a text."""
+		return Counter(
+			[
+				word
+				for word in WORD_PATTERN.findall(text.lower())
+				if len(word) > 3 and word not in STOP_WORDS
+			]
+		)
+
+	def _count_overflow(self, overflow: Dict[str, Any]) -> None:
+		"""Tokenize the buffered lines past the section cap and drop them."""
+		# Words never span lines, so counting chunk by chunk is exact
+		text = "\n".join(overflow["lines"])
+		overflow["term_counts"].update(self._count_terms(text))
+		overflow["word_count"] += len(text.split())
+		overflow["lines"] = []
+		overflow["size"] = 0
+
+	@staticmethod
+	def _line_links(line: str, line_number: int) -> List[tuple]:
+		"""Extract (line number, target) of the inline links of a line."""
+		if "`" in line:
+			# Brackets inside code spans are code, not links
+			line = CODE_SPAN_PATTERN.sub("", line)
+		return [(line_number, target) for target in LINK_PATTERN.findall(line)]
+
+	def _section_record(
+		self,
+		title: Optional[str],
+		level: int,
+		heading_line: str,
+		lines: List[str],
+		span: Tuple[int, int, int, int],
+		links: List[tuple],
+		overflow: Optional[Dict[str, Any]] = None,
+	) -> Dict[str, Any]:
+		"""
+		Build a tokenizer record from the accumulated lines of a section.
 
-		# Split by lines
-		lines = content.split("\n")
+		Args:
+			title: Section title (None for text before the first heading)
+			level: Heading level (0 for text before the first heading)
+			heading_line: Raw heading line, counted for keywords and words
+			lines: Section lines after the heading
+			span: Line start, line end, byte start and byte end of the section
+			links: (line number, raw target) of the links in the section
+			overflow: Lines past the section cap and their counts, if any
 
-		for line in lines:
-			# Check for markdown heading
-			heading_match = re.match(r"^(#{1,6})\s+(.+)$", line)
+		Returns:
+			Section record
+		"""
+		content = "\n".join(lines) + "\n" if lines else ""
+		text = heading_line + "\n" + content
+		term_counts = self._count_terms(text)
+		word_count = len(text.split())
 
-			if heading_match:
-				# Save previous section
-				if current_section:
-					sections.append(current_section)
+		if overflow is not None:
+			self._count_overflow(overflow)
+			term_counts.update(overflow["term_counts"])
+			word_count += overflow["word_count"]
 
-				# Start new section
-				level = len(heading_match.group(1))
-				title = heading_match.group(2).strip()
+		return {
+			"title": title,
+			"level": level,
+			"content": content,
+			"line_start": span[0],
+			"line_end": span[1],
+			"byte_start": span[2],
+			"byte_end": span[3],
+			"term_counts": term_counts,
+			"word_count": word_count,
+			"links": links,
+			"truncated": overflow is not None,
+		}
 
-				current_section = {
-					"title": title,
-					"level": level,
-					"content": "",
-					"line_start": len(sections),
-				}
-			elif current_section:
-				# Add line to current section
-				current_section["content"] += line + "\n"
+	def extract_markdown_sections(self, content: str) -> List[Section]:
+		"""
+		Extract sections from markdown content.
 
-		# Add last section
-		if current_section:
-			sections.append(current_section)
+		Args:
+			content: Markdown content
 
+		Returns:
+			List of sections with title, level, content, spans and tree links
+		"""
+		sections = [
+			self._section_fields(record)
+			for record in self.tokenize_markdown(content.split("\n"))
+			if record["level"]
+		]
+		link_section_tree(sections)
 		return sections
 
+	@staticmethod
+	def _section_fields(record: Dict[str, Any]) -> Section:
+		"""Keep the fields of a tokenizer record that are stored in the index."""
+		return Section(
+			record["title"],
+			record["level"],
+			record["content"],
+			record["line_start"],
+			record["line_end"],
+			record["byte_start"],
+			record["byte_end"],
+		)
+
 	def extract_keywords(self, text: str, max_keywords: int = 50) -> List[str]:
 		"""
 		Extract keywords from text.
@@ -172,37 +545,49 @@ class DocumentationIndexBuilder:
 		Returns:
 			List of keywords sorted by frequency
 		"""
-		# Remove markdown syntax
-		text = re.sub(r"[#*`\[\]()]", " ", text)
-
-		# Split into words
-		words = re.findall(r"\b\w+\b", text.lower())
-
-		# Filter out stop words and short words using module-level constant
-		filtered_words = [
-			word for word in words if len(word) > 3 and word not in STOP_WORDS
-		]
-
-		# Count frequency
-		word_counts = Counter(filtered_words)
+		word_counts = self._count_terms(text)
 
 		# Return top keywords
 		return [word for word, _ in word_counts.most_common(max_keywords)]
 
-	def process_document(self, file_path: Path) -> Dict[str, Any]:
+	def process_document(
+		self, file_path: Path, root: Optional[IndexRoot] = None
+	) -> Optional[Document]:
 		"""
-		Process a single markdown document.
+		Process a single document.
 
 		Args:
-			file_path: Path to the markdown file
+			file_path: Path to the file
+			root: Index root of the file (defaults to the first root)
 
 		Returns:
-			Document metadata and content, or None on error
+			Document record with metadata and sections, or None on error or
+			when a source file (non-markdown root) has no doc comments
 		"""
-		# Read file
+		if root is None:
+			root = self.roots[0]
+
+		# Get relative path (POSIX separators, identical on every platform)
+		rel_path = file_path.relative_to(self.repo_root).as_posix()
+
+		# Single tokenizer pass over the file lines: sections, keyword term
+		# counts, word count and links
+		sections = []
+		term_counts: Counter = Counter()
+		word_count = 0
+		raw_links = []
+		truncation: Dict[str, int] = {}
 		try:
-			with open(file_path, "r", encoding="utf-8") as f:
-				content = f.read()
+			stats = file_path.stat()
+			lines = root.extract(self.read_lines(file_path, stats.st_size, truncation))
+			for record in self.tokenize_markdown(lines):
+				term_counts.update(record["term_counts"])
+				word_count += record["word_count"]
+				raw_links.extend(record["links"])
+				if record["truncated"]:
+					truncation["sections"] = truncation.get("sections", 0) + 1
+				if record["level"]:
+					sections.append(self._section_fields(record))
 		except (IOError, UnicodeDecodeError) as e:
 			print(f"⚠️  Error reading {file_path}: {e}")
 			import traceback
@@ -214,14 +599,25 @@ class DocumentationIndexBuilder:
 			traceback.print_exc()
 			return None
 
-		# Get file stats
-		stats = file_path.stat()
+		# Source files without doc comments are not documentation; empty
+		# markdown pages still are
+		if not word_count and root.extractor != "markdown":
+			self.empty_files.add(rel_path)
+			return None
 
-		# Extract sections
-		sections = self.extract_markdown_sections(content)
+		link_section_tree(sections)
+
+		if truncation:
+			print(f"✂️  Truncated {file_path}: {truncation}")
+
+		# Last commit time is stable across checkouts, mtime is not
+		modified = self.commit_times.get(rel_path, int(stats.st_mtime))
+
+		self.raw_links[rel_path] = raw_links
+		links = self.resolve_links(rel_path, raw_links)
 
 		# Extract keywords
-		keywords = self.extract_keywords(content, max_keywords=50)
+		keywords = [word for word, _ in term_counts.most_common(50)]
 
 		# Update global keywords
 		self.all_keywords.update(keywords)
@@ -229,72 +625,738 @@ class DocumentationIndexBuilder:
 		# Determine priority
 		priority = self.determine_priority(file_path)
 
-		# Get relative path
-		rel_path = file_path.relative_to(self.docs_root.parent)
-
 		# Extract title (first H1 or filename)
 		title = file_path.stem
 		for section in sections:
-			if section["level"] == 1:
-				title = section["title"]
+			if section.level == 1:
+				title = section.title
 				break
 
-		document = {
-			"path": str(rel_path),
-			"title": title,
-			"priority": priority,
-			"size": stats.st_size,
-			"modified": datetime.fromtimestamp(stats.st_mtime).isoformat(),
-			"sections": sections,
-			"keywords": keywords,
-			"word_count": len(content.split()),
-			"heading_count": len(sections),
-		}
+		document = Document(
+			path=rel_path,
+			title=title,
+			priority=priority,
+			size=stats.st_size,
+			modified=format_timestamp(modified),
+			sections=sections,
+			keywords=keywords,
+			word_count=word_count,
+			heading_count=len(sections),
+			links=links,
+			truncation=truncation,
+			source=root.name,
+		)
 
 		return document
 
+	def read_lines(
+		self, file_path: Path, file_size: int, truncation: Dict[str, int]
+	) -> Iterator[str]:
+		"""
+		Read the lines of a file, up to the per-file size cap.
+
+		Files up to the streaming threshold are read whole; larger files are
+		streamed line by line, so the raw text is never held in memory. Both
+		paths yield the same lines as `content.split("\\n")`. Line endings
+		are not translated, so the "\\r" of CRLF files stays at the end of
+		its line and byte spans match the file.
+
+		Args:
+			file_path: Markdown file to read
+			file_size: Size of the file in bytes
+			truncation: Receives `indexed_chars` when the file is cut short
+
+		Yields:
+			Lines without line terminators
+		"""
+		max_file_size = self.max_file_size
+		indexed = 0
+
+		with open(file_path, "r", encoding="utf-8", newline="\n") as f:
+			if file_size <= self.streaming_threshold:
+				lines = f.read().split("\n")
+			else:
+				lines = self._stream_lines(f)
+
+			for line in lines:
+				indexed += len(line) + 1
+				if indexed > max_file_size:
+					truncation["indexed_chars"] = indexed - len(line) - 1
+					return
+				yield line
+
+	@staticmethod
+	def _stream_lines(f) -> Iterator[str]:
+		"""Yield the lines of an open text file like str.split("\\n") would."""
+		ends_with_newline = True
+		for line in f:
+			ends_with_newline = line.endswith("\n")
+			yield line[:-1] if ends_with_newline else line
+		if ends_with_newline:
+			yield ""
+
+	def resolve_links(self, rel_path: str, raw_links: List[tuple]) -> List[str]:
+		"""
+		Resolve the links of a document and record the broken ones.
+
+		Args:
+			rel_path: Repository path of the linking document
+			raw_links: (line number, raw target) pairs from the tokenizer
+
+		Returns:
+			Sorted repository paths of the existing files the document links to
+		"""
+		repo_root = self.repo_root
+		links = set()
+		for line_number, target in raw_links:
+			resolved = resolve_link(rel_path, target)
+			if resolved is None:
+				continue
+			if not resolved.startswith("../") and (repo_root / resolved).exists():
+				links.add(resolved)
+			else:
+				self.broken_links.append(
+					{"source": rel_path, "line": line_number, "target": target}
+				)
+
+		return sorted(links)
+
 	def build_index(self) -> None:
 		"""Build the complete documentation index."""
 		print("🔨 Building documentation index...")
 
-		# Find all markdown files
-		md_files = list(self.docs_root.rglob("*.md"))
-		print(f"📁 Found {len(md_files)} markdown files")
+		# Find the files of every root, in a filesystem-independent order
+		root_files: Dict[str, List[Path]] = {}
+		for root in self.roots:
+			files = root.files(self.repo_root)
+			print(f"📁 Found {len(files)} files in root '{root.name}' ({root.directory})")
+
+			root_files[root.name] = []
+			for file_path in files:
+				# Skip excluded files
+				if self.should_exclude(file_path):
+					print(f"⏭️  Skipping {file_path}")
+					continue
+				root_files[root.name].append(file_path)
+
+		indexed_files = [path for root in self.roots for path in root_files[root.name]]
+		self.commit_times = self.read_commit_times()
+
+		# Reuse the documents of unchanged files from the per-root state
+		reused: Dict[str, List[Document]] = {}
+		to_parse: Dict[str, List[Path]] = {}
+		for root in self.roots:
+			reused[root.name], to_parse[root.name] = self._reuse_unchanged(
+				root, root_files[root.name]
+			)
+			for file_path in to_parse[root.name]:
+				print(f"📄 Processing {file_path}")
+
+		parsed = self._parse_roots(to_parse)
+
+		# Merge the roots, then resolve links against the whole tree
+		self.documents = []
+		self.broken_links = []
+		self.all_keywords = Counter()
+		for root in self.roots:
+			documents = sorted(reused[root.name] + parsed[root.name], key=lambda doc: doc.path)
+			for document in documents:
+				document.links = self.resolve_links(document.path, self.raw_links[document.path])
+				self.all_keywords.update(document.keywords)
+			self.documents.extend(documents)
+
+			print(
+				f"✅ Root '{root.name}': {len(documents)} documents "
+				f"({len(reused[root.name])} unchanged, "
+				f"{len(root_files[root.name]) - len(documents)} skipped)"
+			)
 
-		# Process each file
-		for file_path in md_files:
-			# Skip excluded files
-			if self.should_exclude(file_path):
-				print(f"⏭️  Skipping {file_path}")
-				continue
+		print(f"✅ Processed {len(self.documents)} documents")
+
+		if self.state_dir:
+			for root in self.roots:
+				self.save_root_state(root)
+
+		self._build_metadata(indexed_files)
 
-			print(f"📄 Processing {file_path}")
-			document = self.process_document(file_path)
+	def build_overlay(
+		self, base_ref: str = "main", base_metadata_path: str = "docs/.doc-metadata.json"
+	) -> None:
+		"""
+		Build an overlay index of the files changed since a base ref.
+
+		Only the files of the index roots that `git diff` reports between the
+		ref and the working tree (including untracked files) are parsed;
+		changed files that were deleted or have no indexable text become
+		tombstones. Authority is computed on the base link graph read from
+		the base metadata, with the overlay documents swapped in.
 
+		Args:
+			base_ref: Git ref the shared base index was built from
+			base_metadata_path: Metadata file of the base index
+		"""
+		print(f"🔨 Building overlay index against {base_ref}...")
+
+		base_commit = self._git("rev-parse", "--verify", f"{base_ref}^{{commit}}").strip()
+		changed = self.read_changed_paths(base_commit)
+		print(f"📁 Found {len(changed)} changed files since {base_ref} ({base_commit[:12]})")
+
+		root_files = {}
+		for root in self.roots:
+			for file_path in root.files(self.repo_root):
+				if not self.should_exclude(file_path):
+					root_files[file_path.relative_to(self.repo_root).as_posix()] = (root, file_path)
+
+		self.commit_times = self.read_commit_times()
+		self.documents = []
+		self.deleted = []
+		for rel_path in changed:
+			document = None
+			if rel_path in root_files:
+				root, file_path = root_files[rel_path]
+				print(f"📄 Processing {file_path}")
+				document = self.process_document(file_path, root)
 			if document:
 				self.documents.append(document)
+			else:
+				self.deleted.append(rel_path)
 
-		print(f"✅ Processed {len(self.documents)} documents")
+		# Authority of the overlay documents within the base link graph
+		try:
+			with open(base_metadata_path, "r", encoding="utf-8") as f:
+				base = json.load(f)
+		except (OSError, ValueError):
+			print(f"⚠️  No base metadata at {base_metadata_path}, authority uses the overlay links only")
+			base = {"metadata": {}, "documents": []}
+		graph = {doc["path"]: doc.get("links", []) for doc in base["documents"]}
+		for path in self.deleted:
+			graph.pop(path, None)
+		for document in self.documents:
+			graph[document.path] = document.links
+		authority = compute_authority(graph)
+		for document in self.documents:
+			document.authority = authority[document.path]
+
+		self.metadata = {
+			"version": "1.0.0",
+			"generated": self._generated_timestamp(),
+			"base_ref": base_ref,
+			"base_commit": base_commit,
+			"base_content_hash": base["metadata"].get("content_hash"),
+			"total_documents": len(self.documents),
+			"deleted_documents": len(self.deleted),
+		}
+
+		print(
+			f"✅ Overlay: {len(self.documents)} changed documents, "
+			f"{len(self.deleted)} tombstones"
+		)
+
+	def read_changed_paths(self, base_commit: str) -> List[str]:
+		"""
+		List the files of the index roots that differ from a commit.
+
+		Covers committed, staged and unstaged changes (`git diff <commit>`)
+		plus untracked files that are not ignored. Renames are reported as a
+		deletion and an addition.
+
+		Args:
+			base_commit: Commit to compare the working tree against
+
+		Returns:
+			Sorted POSIX paths relative to the repository root
+		"""
+		pathspecs = [spec for root in self.roots for spec in root.pathspecs()]
+		diff = self._git(
+			"diff", "--name-only", "--no-renames", "--relative", "-z",
+			base_commit, "--", *pathspecs,
+		)
+		untracked = self._git(
+			"ls-files", "--others", "--exclude-standard", "-z", "--", *pathspecs
+		)
+		return sorted({path for path in (diff + untracked).split("\0") if path})
+
+	def _git(self, *args: str) -> str:
+		"""
+		Run a git command in the repository and return its output.
+
+		Raises:
+			RuntimeError: If git is missing or the command fails
+		"""
+		try:
+			result = subprocess.run(
+				["git", "-c", "core.quotepath=off", *args],
+				cwd=self.repo_root,
+				capture_output=True,
+				text=True,
+				encoding="utf-8",
+				check=True,
+			)
+		except OSError as e:
+			raise RuntimeError(f"git is not available: {e}")
+		except subprocess.CalledProcessError as e:
+			raise RuntimeError(f"git {args[0]} failed: {e.stderr.strip()}")
+		return result.stdout
+
+	def _build_metadata(self, indexed_files: List[Path]) -> None:
+		"""
+		Compute link authority and the index metadata of the built documents.
+
+		Args:
+			indexed_files: Files that were indexed, for the content hash
+		"""
+		# Authority prior from the links between indexed documents
+		authority = compute_authority({doc.path: doc.links for doc in self.documents})
+		for doc in self.documents:
+			doc.authority = authority[doc.path]
 
 		# Build metadata
 		self.metadata = {
 			"version": "1.0.0",
-			"generated": datetime.now().isoformat(),
+			"generated": self._generated_timestamp(),
+			"content_hash": self.compute_content_hash(indexed_files),
 			"total_documents": len(self.documents),
 			"priority_breakdown": self._count_by_priority(),
-			"total_sections": sum(doc["heading_count"] for doc in self.documents),
-			"total_words": sum(doc["word_count"] for doc in self.documents),
+			"source_breakdown": {
+				root.name: sum(1 for doc in self.documents if doc.source == root.name)
+				for root in self.roots
+			},
+			"total_sections": sum(doc.heading_count for doc in self.documents),
+			"total_words": sum(doc.word_count for doc in self.documents),
 			"top_keywords": [
 				word for word, _ in self.all_keywords.most_common(100)
 			],
+			"truncated_documents": sum(1 for doc in self.documents if doc.truncation),
+			"link_graph": {
+				"links": sum(
+					1
+					for doc in self.documents
+					for target in doc.links
+					if target in authority and target != doc.path
+				),
+				"broken_links": self.broken_links,
+			},
 		}
 
+	def build_external_index(
+		self,
+		output_dir: str = "docs/.doc-postings",
+		memory_budget: int = DEFAULT_MEMORY_BUDGET,
+	) -> Dict[str, Any]:
+		"""
+		Build an external-memory index with SPIMI (see index_postings.py).
+
+		Documents are processed one at a time, in the same order as
+		build_index, and streamed to the document store; their postings
+		are flushed to sorted runs whenever the memory budget is reached.
+		Only a small stub per document (no section content) and its term
+		filter stay in memory, for the metadata and the link graph; they
+		are counted against the budget but not spilled.
+
+		Args:
+			output_dir: Directory receiving the index files
+			memory_budget: Bytes of in-memory postings and per-document state
+				before a run is flushed
+
+		Returns:
+			Build statistics: documents, runs and posting keys
+		"""
+		print(f"🔨 Building external-memory index (budget {memory_budget / 2**20:.0f} MB)...")
+
+		indexed_files = self.collect_files()
+		self.commit_times = self.read_commit_times()
+		self.documents = []
+		term_filters = []
+
+		writer = SpimiIndexWriter(output_dir, memory_budget)
+		try:
+			for root in self.roots:
+				for file_path in root.files(self.repo_root):
+					if self.should_exclude(file_path):
+						continue
+					print(f"📄 Processing {file_path}")
+					document = self.process_document(file_path, root)
+					if not document:
+						continue
+
+					writer.add_document(document)
+					term_filters.append(self._term_filter(document))
+					self.documents.append(self._document_stub(document))
+					writer.reserve(self._stub_bytes(self.documents[-1], term_filters[-1]))
+					self.raw_links.pop(document.path, None)
+
+			print(f"✅ Processed {len(self.documents)} documents")
+			self._build_metadata(indexed_files)
+			stats = writer.finish(
+				self.metadata, {doc.path: doc.authority for doc in self.documents}
+			)
+		finally:
+			writer.close()
+
+		self.body_store = {
+			"path": writer.documents_path,
+			"size": writer.documents_offset,
+			"ranges": [row[:2] for row in writer.rows],
+			"term_filters": term_filters,
+		}
+
+		print(
+			f"💾 Saved external index to {output_dir} "
+			f"({stats['runs']} runs merged, {stats['terms']} posting keys)"
+		)
+		if stats["resident_bytes"] > memory_budget:
+			print(
+				f"⚠️  Per-document state (~{stats['resident_bytes'] / 2**20:.0f} MB) "
+				"exceeded the memory budget; raise --memory-budget"
+			)
+		return stats
+
+	@staticmethod
+	def _term_filter(document: Document) -> str:
+		"""Get the base64 Bloom filter of every term of a full document."""
+		title_terms, keyword_terms, section_terms = document_terms(document)
+		term_filter = build_term_filter(title_terms | keyword_terms | set(section_terms))
+		return base64.b64encode(term_filter).decode("ascii")
+
+	@staticmethod
+	def _stub_bytes(stub: Document, term_filter: str) -> int:
+		"""Estimate the memory of a document stub and its term filter."""
+		texts = [stub.path, stub.title, stub.modified, term_filter]
+		texts += stub.keywords + stub.links + [section.title for section in stub.sections]
+		# Document and Section objects, besides their strings
+		return 500 + 150 * len(stub.sections) + sum(
+			STRING_OVERHEAD_BYTES + len(text) for text in texts
+		)
+
+	@staticmethod
+	def _document_stub(document: Document) -> Document:
+		"""Keep the fields of a document needed for metadata, without content."""
+		return Document(
+			path=document.path,
+			title=document.title,
+			priority=document.priority,
+			size=document.size,
+			modified=document.modified,
+			sections=[
+				Section(section.title, section.level, "", section.line_start)
+				for section in document.sections
+			],
+			keywords=document.keywords[:10],
+			word_count=document.word_count,
+			heading_count=document.heading_count,
+			links=document.links,
+			truncation=document.truncation,
+			source=document.source,
+		)
+
+	def _parse_roots(self, to_parse: Dict[str, List[Path]]) -> Dict[str, List[Document]]:
+		"""
+		Parse the changed files of every root.
+
+		Roots are parsed in worker processes when more than one root has
+		work and more than one job is allowed, and in-process otherwise.
+
+		Args:
+			to_parse: Files to parse, keyed by root name
+
+		Returns:
+			Parsed documents, keyed by root name
+		"""
+		parsed: Dict[str, List[Document]] = {root.name: [] for root in self.roots}
+		pending = [root for root in self.roots if to_parse[root.name]]
+
+		if self.jobs <= 1 or len(pending) <= 1:
+			for root in pending:
+				for file_path in to_parse[root.name]:
+					document = self.process_document(file_path, root)
+					if document:
+						parsed[root.name].append(document)
+			return parsed
+
+		config = {
+			"docs_root": str(self.docs_root),
+			"max_file_size": self.max_file_size,
+			"max_section_size": self.max_section_size,
+			"streaming_threshold": self.streaming_threshold,
+		}
+		with ProcessPoolExecutor(max_workers=min(self.jobs, len(pending))) as executor:
+			futures = {
+				root.name: executor.submit(
+					parse_root_files, config, self.commit_times, root, to_parse[root.name]
+				)
+				for root in pending
+			}
+			for name, future in futures.items():
+				documents, raw_links, empty_files = future.result()
+				parsed[name] = documents
+				self.raw_links.update(raw_links)
+				self.empty_files.update(empty_files)
+
+		return parsed
+
+	def _reuse_unchanged(
+		self, root: IndexRoot, files: List[Path]
+	) -> Tuple[List[Document], List[Path]]:
+		"""
+		Split the files of a root into reusable documents and files to parse.
+
+		Args:
+			root: Index root
+			files: Files of the root
+
+		Returns:
+			Documents of unchanged files from the root state, and the files
+			that must be parsed
+		"""
+		state = self.load_root_state(root)
+		if not state:
+			return [], list(files)
+
+		reused = []
+		to_parse = []
+		for file_path in files:
+			rel_path = file_path.relative_to(self.repo_root).as_posix()
+			entry = state["files"].get(rel_path)
+			if entry is None or entry["digest"] != self.file_digest(file_path):
+				to_parse.append(file_path)
+				continue
+			if entry["document"] is None:
+				self.empty_files.add(rel_path)
+				continue
+
+			document = Document.from_dict(entry["document"])
+			# Dates and links depend on the rest of the tree, not on the file
+			modified = self.commit_times.get(rel_path, int(file_path.stat().st_mtime))
+			document.modified = format_timestamp(modified)
+			self.raw_links[rel_path] = [tuple(link) for link in entry["raw_links"]]
+			reused.append(document)
+
+		return reused, to_parse
+
+	def root_state_path(self, root: IndexRoot) -> Path:
+		"""Get the incremental state file of a root."""
+		return self.state_dir / f"{root.name}.json"
+
+	def _root_state_settings(self, root: IndexRoot) -> Dict[str, Any]:
+		"""Get the settings a root state is only valid for."""
+		builder_digest = hashlib.sha256()
+		for source_file in (__file__, index_roots.__file__):
+			builder_digest.update(Path(source_file).read_bytes())
+
+		return {
+			"builder": builder_digest.hexdigest(),
+			"directory": root.directory,
+			"patterns": list(root.patterns),
+			"extractor": root.extractor,
+			"max_file_size": self.max_file_size,
+			"max_section_size": self.max_section_size,
+		}
+
+	def load_root_state(self, root: IndexRoot) -> Optional[Dict[str, Any]]:
+		"""
+		Load the incremental state of a root.
+
+		Args:
+			root: Index root
+
+		Returns:
+			State with the digest, document and raw links of every file, or
+			None if there is no state valid for the current settings
+		"""
+		if not self.state_dir:
+			return None
+
+		try:
+			with open(self.root_state_path(root), "r", encoding="utf-8") as f:
+				state = json.load(f)
+		except (OSError, ValueError):
+			return None
+
+		if (
+			state.get("version") != ROOT_STATE_VERSION
+			or state.get("settings") != self._root_state_settings(root)
+		):
+			return None
+		return state
+
+	def save_root_state(self, root: IndexRoot) -> None:
+		"""
+		Save the incremental state of a root after a build.
+
+		Args:
+			root: Index root
+		"""
+		self.state_dir.mkdir(parents=True, exist_ok=True)
+
+		files = {}
+		for document in self.documents:
+			if document.source != root.name:
+				continue
+			files[document.path] = {
+				"digest": self.file_digest(self.repo_root / document.path),
+				"document": document.to_dict(),
+				"raw_links": self.raw_links[document.path],
+			}
+		# Files without indexable text are remembered so they are not parsed again
+		for file_path in root.files(self.repo_root):
+			rel_path = file_path.relative_to(self.repo_root).as_posix()
+			if rel_path in self.empty_files:
+				files[rel_path] = {
+					"digest": self.file_digest(file_path),
+					"document": None,
+					"raw_links": [],
+				}
+
+		atomic_write_json(
+			self.root_state_path(root),
+			{
+				"version": ROOT_STATE_VERSION,
+				"settings": self._root_state_settings(root),
+				"files": files,
+			},
+			indent=None,
+		)
+
+	def collect_files(self) -> List[Path]:
+		"""
+		List the files to index, root by root in sorted order.
+
+		Returns:
+			Sorted paths of the files that are not excluded
+		"""
+		return [
+			file_path
+			for root in self.roots
+			for file_path in root.files(self.repo_root)
+			if not self.should_exclude(file_path)
+		]
+
+	def file_digest(self, file_path: Path) -> str:
+		"""
+		Get the SHA-256 digest of a file, reading it in chunks.
+
+		Args:
+			file_path: File to hash
+
+		Returns:
+			Hex digest, cached until the size or mtime of the file changes
+		"""
+		stats = file_path.stat()
+		key = (file_path, stats.st_size, stats.st_mtime_ns)
+		digest = self._file_digests.get(key)
+		if digest is None:
+			hasher = hashlib.sha256()
+			with open(file_path, "rb") as f:
+				for chunk in iter(lambda: f.read(OVERFLOW_CHUNK_SIZE), b""):
+					hasher.update(chunk)
+			digest = self._file_digests[key] = hasher.hexdigest()
+		return digest
+
+	def compute_content_hash(self, files: Optional[List[Path]] = None) -> str:
+		"""
+		Hash the indexed files and the builder itself.
+
+		The hash covers the relative path and content digest of every
+		indexed file, the builder and extractor sources, and the size caps,
+		so a changed builder or truncation setting also invalidates it.
+
+		Args:
+			files: Files to hash (defaults to collect_files())
+
+		Returns:
+			Hex SHA-256 digest
+		"""
+		if files is None:
+			files = self.collect_files()
+
+		digest = hashlib.sha256()
+		for source_file in (__file__, index_roots.__file__):
+			digest.update(Path(source_file).read_bytes())
+		settings = f"max_file_size={self.max_file_size}\0max_section_size={self.max_section_size}"
+		digest.update(f"\0{settings}".encode("utf-8"))
+		for file_path in files:
+			rel_path = file_path.relative_to(self.repo_root).as_posix()
+			digest.update(f"\0{rel_path}\0{self.file_digest(file_path)}".encode("utf-8"))
+
+		return digest.hexdigest()
+
+	def read_commit_times(self) -> Dict[str, int]:
+		"""
+		Read the last commit time of every file of the index roots.
+
+		Uses a single `git log` call. Files that are not tracked (or a tree
+		outside of git) fall back to their mtime in process_document.
+
+		Returns:
+			Unix timestamps keyed by POSIX path relative to the repository root
+		"""
+		try:
+			result = subprocess.run(
+				[
+					"git", "-c", "core.quotepath=off", "log",
+					"--format=%x00%ct", "--name-only", "--relative",
+					"--", *[spec for root in self.roots for spec in root.pathspecs()],
+				],
+				cwd=self.repo_root,
+				capture_output=True,
+				text=True,
+				encoding="utf-8",
+				check=True,
+			)
+		except (OSError, subprocess.CalledProcessError):
+			return {}
+
+		commit_times: Dict[str, int] = {}
+		commit_time = 0
+		for line in result.stdout.splitlines():
+			if line.startswith("\0"):
+				commit_time = int(line[1:])
+			elif line:
+				# Log is newest first: keep the first time a path shows up
+				commit_times.setdefault(line, commit_time)
+
+		return commit_times
+
+	def _generated_timestamp(self) -> Optional[str]:
+		"""
+		Get a reproducible generation timestamp.
+
+		Honors SOURCE_DATE_EPOCH, and otherwise uses the newest document
+		date, so identical docs always yield the same value.
+		"""
+		if os.environ.get("SOURCE_DATE_EPOCH"):
+			return format_timestamp(int(os.environ["SOURCE_DATE_EPOCH"]))
+		if not self.documents:
+			return None
+		return max(doc.modified for doc in self.documents)
+
+	@staticmethod
+	def recorded_content_hash(index_path: str = "docs/.doc-index.json") -> Optional[str]:
+		"""
+		Read the content hash recorded by a previous build.
+
+		The hash is read from the artifact being checked (the JSON index, or
+		the table of an external-memory index), never from the shared
+		metadata file, which other builds may have rewritten.
+
+		Args:
+			index_path: JSON file whose "metadata" holds the hash
+
+		Returns:
+			Recorded hash, or None if there is no readable index
+		"""
+		try:
+			with open(index_path, "r", encoding="utf-8") as f:
+				return json.load(f).get("metadata", {}).get("content_hash")
+		except (OSError, ValueError):
+			return None
+
 	def _count_by_priority(self) -> Dict[str, int]:
 		"""Count documents by priority level."""
 		counts = {"critical": 0, "high": 0, "normal": 0, "archive": 0}
 
 		for doc in self.documents:
-			priority = doc.get("priority", "normal")
+			priority = doc.priority
 			counts[priority] = counts.get(priority, 0) + 1
 
 		return counts
@@ -303,57 +1365,203 @@ class DocumentationIndexBuilder:
 		"""
 		Save the complete index to JSON file.
 
+		Documents are written one per line and their byte ranges recorded,
+		so that save_metadata can point the second tier of a two-tier
+		search at them (see DocumentationSearchEngine).
+
 		Args:
 			output_path: Path to save the index
 		"""
 		output_file = Path(output_path)
 
-		# Create full index
-		full_index = {
-			"metadata": self.metadata,
-			"documents": self.documents,
+		chunks = [
+			b'{"metadata": ',
+			json.dumps(self.metadata, ensure_ascii=False).encode("utf-8"),
+			b', "documents": [\n',
+		]
+		offset = sum(len(chunk) for chunk in chunks)
+		ranges = []
+		for i, doc in enumerate(self.documents):
+			data = json.dumps(doc.to_dict(), ensure_ascii=False).encode("utf-8")
+			ranges.append([offset, len(data)])
+			separator = b",\n" if i < len(self.documents) - 1 else b"\n"
+			chunks.append(data + separator)
+			offset += len(data) + len(separator)
+		chunks.append(b"]}\n")
+		content = b"".join(chunks)
+
+		# Save to file (atomically, so concurrent readers never see a partial index)
+		tmp_file = output_file.with_name(f"{output_file.name}.{os.getpid()}.tmp")
+		tmp_file.write_bytes(content)
+		os.replace(tmp_file, output_file)
+		self.body_store = {
+			"path": output_file,
+			"size": len(content),
+			"ranges": ranges,
+			"term_filters": [self._term_filter(doc) for doc in self.documents],
 		}
 
-		# Save to file
-		with open(output_file, "w", encoding="utf-8") as f:
-			json.dump(full_index, f, indent=2, ensure_ascii=False)
-
 		print(f"💾 Saved full index to {output_file}")
 		print(f"📊 Size: {output_file.stat().st_size / 1024:.2f} KB")
 
+	def save_snapshot(self, index_path: str = "docs/.doc-index.json") -> None:
+		"""
+		Save the fast-loading snapshot next to a saved index.
+
+		Must run after `save_index`, since the snapshot records the size and
+		mtime of the JSON index it mirrors.
+
+		Args:
+			index_path: Path of the saved JSON index
+		"""
+		snapshot_file = write_snapshot(Path(index_path), self.metadata, self.documents)
+
+		print(f"💾 Saved snapshot to {snapshot_file}")
+		print(f"📊 Size: {snapshot_file.stat().st_size / 1024:.2f} KB")
+
+	def save_trigrams(self, index_path: str = "docs/.doc-index.json") -> None:
+		"""
+		Save the trigram index of substring and regex queries next to a
+		saved index (see index_trigrams.py).
+
+		Must run after `save_index`, since the trigram file records the size
+		and mtime of the JSON index it mirrors.
+
+		Args:
+			index_path: Path of the saved JSON index
+		"""
+		trigrams_file = write_trigrams(Path(index_path), self.documents)
+
+		print(f"💾 Saved trigram index to {trigrams_file}")
+		print(f"📊 Size: {trigrams_file.stat().st_size / 1024:.2f} KB")
+
+	def save_sqlite(self, output_path: str = "docs/.doc-index.sqlite") -> None:
+		"""
+		Upsert the build into a SQLite FTS5 index (see index_sqlite.py).
+
+		Only changed documents are rewritten and removed ones deleted, in a
+		single transaction; readers keep querying the database meanwhile.
+
+		Args:
+			output_path: Path of the database
+		"""
+		output_file = Path(output_path)
+		stats = SqliteIndex(output_file).write(self.documents, self.metadata)
+
+		print(
+			f"💾 Saved SQLite index to {output_file} ({stats['written']} written, "
+			f"{stats['deleted']} deleted, {stats['unchanged']} unchanged)"
+		)
+		print(f"📊 Size: {output_file.stat().st_size / 1024:.2f} KB")
+
+	def save_segments(self, segments_dir: str = "docs/.doc-segments") -> threading.Thread:
+		"""
+		Save the build as a delta segment of a segmented index.
+
+		Only changed documents and tombstones for deleted ones are written.
+		Segment merging then starts in a background thread.
+
+		Args:
+			segments_dir: Directory of the segmented index
+
+		Returns:
+			The background merge thread
+		"""
+		store = SegmentStore(segments_dir)
+		segment_name = store.write_delta(
+			[doc.to_dict() for doc in self.documents], self.metadata
+		)
+
+		if segment_name:
+			print(f"💾 Saved delta segment {store.root / segment_name}")
+		else:
+			print(f"💾 No document changes, updated manifest in {store.root}")
+
+		return store.merge_in_background()
+
+	def save_overlay(self, output_path: str = "docs/.doc-overlay.json") -> None:
+		"""
+		Save an overlay built by build_overlay.
+
+		Args:
+			output_path: Path to save the overlay
+		"""
+		output_file = Path(output_path)
+
+		atomic_write_json(
+			output_file,
+			{
+				"metadata": self.metadata,
+				"documents": [doc.to_dict() for doc in self.documents],
+				"deleted": self.deleted,
+			},
+		)
+
+		print(f"💾 Saved overlay to {output_file}")
+		print(f"📊 Size: {output_file.stat().st_size / 1024:.2f} KB")
+
 	def save_metadata(self, output_path: str = "docs/.doc-metadata.json") -> None:
 		"""
-		Save simplified metadata (without full content) for version control.
+		Save simplified metadata (without full content).
+
+		The file is a build output, like the index it points at: its body
+		ranges are only valid for the index of the same build.
+
+		When the full documents were saved to a single file (save_index or
+		build_external_index), the metadata also records that file and the
+		byte range and term filter of every document, and can be searched as
+		a two-tier index: candidates are selected on the metadata, and only
+		those whose term filter can still beat the top results are read
+		from the full documents.
 
 		Args:
 			output_path: Path to save the metadata
 		"""
 		output_file = Path(output_path)
+		body_store = self.body_store
+		if body_store is not None and len(body_store["ranges"]) != len(self.documents):
+			body_store = None
 
 		# Create simplified documents list (without section content)
 		simplified_docs = []
-		for doc in self.documents:
+		for i, doc in enumerate(self.documents):
 			simplified_doc = {
-				"path": doc["path"],
-				"title": doc["title"],
-				"priority": doc["priority"],
-				"modified": doc["modified"],
-				"keywords": doc["keywords"][:10],  # Top 10 keywords only
-				"word_count": doc["word_count"],
-				"heading_count": doc["heading_count"],
-				"section_titles": [s["title"] for s in doc["sections"]],
+				"path": doc.path,
+				"title": doc.title,
+				"priority": doc.priority,
+				"modified": doc.modified,
+				"keywords": doc.keywords[:10],  # Top 10 keywords only
+				"word_count": doc.word_count,
+				"heading_count": doc.heading_count,
+				"section_titles": [s.title for s in doc.sections],
+				"links": doc.links,
+				"authority": doc.authority,
+				"truncation": doc.truncation,
+				"source": doc.source,
 			}
+			if body_store is not None:
+				simplified_doc["body"] = body_store["ranges"][i]
+				simplified_doc["terms"] = body_store["term_filters"][i]
 			simplified_docs.append(simplified_doc)
 
 		# Create metadata file
+		metadata = self.metadata
+		if body_store is not None:
+			# Relative to the metadata file, so the pair can be moved together
+			metadata = dict(
+				metadata,
+				body_store={
+					"path": os.path.relpath(body_store["path"], output_file.parent),
+					"size": body_store["size"],
+				},
+			)
 		metadata_output = {
-			"metadata": self.metadata,
+			"metadata": metadata,
 			"documents": simplified_docs,
 		}
 
 		# Save to file
-		with open(output_file, "w", encoding="utf-8") as f:
-			json.dump(metadata_output, f, indent=2, ensure_ascii=False)
+		atomic_write_json(output_file, metadata_output)
 
 		print(f"💾 Saved metadata to {output_file}")
 		print(f"📊 Size: {output_file.stat().st_size / 1024:.2f} KB")
@@ -364,6 +1572,12 @@ class DocumentationIndexBuilder:
 		print(f"  Total documents: {self.metadata['total_documents']}")
 		print(f"  Total sections: {self.metadata['total_sections']}")
 		print(f"  Total words: {self.metadata['total_words']:,}")
+		if self.metadata["truncated_documents"]:
+			print(f"  Truncated documents: {self.metadata['truncated_documents']}")
+		if len(self.roots) > 1:
+			print("\n  Source breakdown:")
+			for source, count in self.metadata["source_breakdown"].items():
+				print(f"    {source}: {count}")
 		print("\n  Priority breakdown:")
 		for priority, count in self.metadata["priority_breakdown"].items():
 			print(f"    {priority.capitalize()}: {count}")
@@ -371,26 +1585,220 @@ class DocumentationIndexBuilder:
 		for i, keyword in enumerate(self.metadata["top_keywords"][:10], 1):
 			print(f"    {i}. {keyword}")
 
+		link_graph = self.metadata["link_graph"]
+		print(f"\n  Links between documents: {link_graph['links']}")
+		print(f"  Top 5 by authority:")
+		top_documents = sorted(self.documents, key=lambda doc: -doc.authority)[:5]
+		for i, doc in enumerate(top_documents, 1):
+			print(f"    {i}. {doc.path} ({doc.authority:.3f})")
+
+		self.print_broken_links()
+
+	def print_broken_links(self) -> None:
+		"""Print the internal links whose target does not exist."""
+		if not self.broken_links:
+			print("\n✅ No broken internal links")
+			return
+
+		print(f"\n⚠️  Broken internal links: {len(self.broken_links)}")
+		for link in self.broken_links:
+			print(f"    {link['source']}:{link['line']} → {link['target']}")
+
+
+def parse_root_files(
+	config: Dict[str, Any],
+	commit_times: Dict[str, int],
+	root: IndexRoot,
+	files: List[Path],
+) -> Tuple[List[Document], Dict[str, List[tuple]], set]:
+	"""
+	Parse the files of one index root, in a worker process.
+
+	Args:
+		config: Keyword arguments for DocumentationIndexBuilder
+		commit_times: Last commit time per document path
+		root: Index root of the files
+		files: Files to parse
+
+	Returns:
+		Parsed documents, their raw links keyed by document path, and the
+		paths of files without indexable text
+	"""
+	builder = DocumentationIndexBuilder(**config)
+	builder.commit_times = commit_times
+
+	documents = []
+	for file_path in files:
+		document = builder.process_document(file_path, root)
+		if document:
+			documents.append(document)
+
+	return documents, builder.raw_links, builder.empty_files
+
 
 def main():
 	"""Main entry point."""
+	parser = argparse.ArgumentParser(description="Build the documentation index")
+	parser.add_argument(
+		"--segments",
+		nargs="?",
+		const="docs/.doc-segments",
+		help="Write a delta segment to a segmented index instead of the full JSON index",
+	)
+	parser.add_argument(
+		"--sqlite",
+		nargs="?",
+		const="docs/.doc-index.sqlite",
+		help="Upsert changed documents into a SQLite FTS5 index instead of writing the full JSON index",
+	)
+	parser.add_argument(
+		"--spimi",
+		nargs="?",
+		const="docs/.doc-postings",
+		help="Build an external-memory posting index (SPIMI) instead of the JSON index",
+	)
+	parser.add_argument(
+		"--memory-budget",
+		type=int,
+		default=DEFAULT_MEMORY_BUDGET // 2**20,
+		help=(
+			"Memory budget in MB with --spimi: in-memory postings plus the "
+			"per-document rows and metadata stubs (a few KB per document, mostly "
+			"section titles), which are not spilled; postings always keep 1/8 of it"
+		),
+	)
+	parser.add_argument(
+		"--overlay",
+		nargs="?",
+		const="docs/.doc-overlay.json",
+		help="Only index the files changed since --base-ref, as an overlay of the base index",
+	)
+	parser.add_argument(
+		"--base-ref",
+		default="main",
+		help="Git ref the shared base index was built from (with --overlay)",
+	)
+	parser.add_argument(
+		"--if-changed",
+		action="store_true",
+		help="Exit without building when the docs content hash matches the existing index",
+	)
+	parser.add_argument(
+		"--max-file-size",
+		type=int,
+		default=MAX_FILE_SIZE,
+		help="Characters of a file that are indexed at most",
+	)
+	parser.add_argument(
+		"--max-section-size",
+		type=int,
+		default=MAX_SECTION_SIZE,
+		help="Characters of content stored per section at most",
+	)
+	parser.add_argument(
+		"--roots",
+		nargs="+",
+		default=["docs"],
+		choices=[root.name for root in DEFAULT_ROOTS],
+		help="Index roots to include (default: docs)",
+	)
+	parser.add_argument(
+		"--jobs",
+		type=int,
+		default=os.cpu_count() or 1,
+		help="Worker processes parsing roots in parallel",
+	)
+	parser.add_argument(
+		"--state-dir",
+		default="docs/.doc-roots",
+		help="Directory of the per-root incremental state",
+	)
+	parser.add_argument(
+		"--check-links",
+		action="store_true",
+		help="Exit with an error when internal links are broken",
+	)
+	args = parser.parse_args()
+
 	print("🤖 Documentation Index Builder - Lumina Portfolio RAG System\n")
 
 	# Create builder
-	builder = DocumentationIndexBuilder(docs_root="docs")
-
-	# Build index
-	builder.build_index()
-
-	# Save files
-	builder.save_index()
-	builder.save_metadata()
+	builder = DocumentationIndexBuilder(
+		docs_root="docs",
+		max_file_size=args.max_file_size,
+		max_section_size=args.max_section_size,
+		roots=[root for root in DEFAULT_ROOTS if root.name in args.roots],
+		state_dir=args.state_dir,
+		jobs=args.jobs,
+	)
+
+	if args.overlay:
+		# The base index and its metadata are left untouched
+		try:
+			builder.build_overlay(args.base_ref)
+		except RuntimeError as e:
+			print(f"❌ Error: {e}")
+			sys.exit(1)
+		builder.save_overlay(args.overlay)
+		builder.print_broken_links()
+		print("\n✅ Overlay building complete!")
+		if args.check_links and builder.broken_links:
+			sys.exit(1)
+		return
+
+	if args.if_changed:
+		if args.segments:
+			manifest = SegmentStore(args.segments).read_manifest()
+			recorded_hash = manifest["metadata"].get("content_hash")
+		elif args.spimi:
+			recorded_hash = builder.recorded_content_hash(str(Path(args.spimi) / TABLE_NAME))
+		elif args.sqlite:
+			recorded_hash = (
+				SqliteIndex(args.sqlite).read_metadata().get("content_hash")
+				if Path(args.sqlite).exists()
+				else None
+			)
+		else:
+			recorded_hash = builder.recorded_content_hash()
+
+		content_hash = builder.compute_content_hash()
+		if recorded_hash == content_hash:
+			print(f"✅ Documentation unchanged ({content_hash[:12]}), skipping build")
+			return
+
+	# Build and save index
+	merge_thread = None
+	if args.spimi:
+		# Streams its files to disk while building
+		builder.build_external_index(args.spimi, args.memory_budget * 2**20)
+	else:
+		builder.build_index()
+		if args.segments:
+			merge_thread = builder.save_segments(args.segments)
+		elif args.sqlite:
+			builder.save_sqlite(args.sqlite)
+		else:
+			builder.save_index()
+			builder.save_snapshot()
+			builder.save_trigrams()
+	# Segmented and SQLite indexes keep their metadata in their own storage;
+	# the shared metadata file describes the full documents of the last
+	# JSON or external-memory build
+	if not (args.segments or args.sqlite):
+		builder.save_metadata()
 
 	# Print statistics
 	builder.print_statistics()
 
+	if merge_thread:
+		print("\n⏳ Waiting for background segment merge...")
+		merge_thread.join()
+
 	print("\n✅ Index building complete!")
 
+	if args.check_links and builder.broken_links:
+		sys.exit(1)
+
 
 if __name__ == "__main__":
 	main()
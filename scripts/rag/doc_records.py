@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Document Records for RAG System
+
+Compact `__slots__` record types for indexed documents and their sections,
+used by the index builder and the search engine instead of one dict per
+object. Records convert to and from the JSON index schema (`to_dict` /
+`from_dict`) and to plain tuples for the marshal snapshot.
+
+Read-only mapping access (`record["title"]`, `record.get("title")`) is kept
+for callers written against the JSON schema.
+
+The sections of a document form a tree stored in document order: every
+section knows its parent, its breadcrumb and where its subtree ends, so the
+subtree of section i is `sections[i:section.subtree_end]`.
+
+LazyDocuments reads documents on demand from the byte ranges of a document
+store, for indexes that keep only stubs in memory.
+"""
+
+import mmap
+import os
+from pathlib import Path
+from typing import Dict, Iterator, List, Any, Optional
+
+
+class _Record:
+	"""Base class giving slotted records read-only mapping access."""
+
+	__slots__ = ()
+
+	def __getitem__(self, key: str) -> Any:
+		try:
+			return getattr(self, key)
+		except AttributeError:
+			raise KeyError(key) from None
+
+	def __contains__(self, key: str) -> bool:
+		return key in self.__slots__
+
+	def get(self, key: str, default: Any = None) -> Any:
+		"""Get a field by its JSON name, like dict.get."""
+		return getattr(self, key, default)
+
+	def __eq__(self, other: Any) -> bool:
+		return type(self) is type(other) and self.to_tuple() == other.to_tuple()
+
+	def __repr__(self) -> str:
+		return f"{type(self).__name__}({self.title!r})"
+
+
+class Section(_Record):
+	"""A markdown section of a document."""
+
+	# Field order is the JSON key order
+	__slots__ = (
+		"title",
+		"level",
+		"content",
+		"line_start",
+		"line_end",
+		"byte_start",
+		"byte_end",
+		"parent",
+		"breadcrumb",
+		"subtree_end",
+	)
+
+	def __init__(
+		self,
+		title: str,
+		level: int,
+		content: str,
+		line_start: int,
+		line_end: int = 0,
+		byte_start: int = 0,
+		byte_end: int = 0,
+		parent: Optional[int] = None,
+		breadcrumb: Optional[List[str]] = None,
+		subtree_end: Optional[int] = None,
+	):
+		self.title = title
+		self.level = level
+		self.content = content
+		# Lines of the heading and of the last line of the section (1-based,
+		# inclusive) and [start, end) byte span of the section, in the
+		# indexed markdown text
+		self.line_start = line_start
+		self.line_end = line_end
+		self.byte_start = byte_start
+		self.byte_end = byte_end
+		# Index of the enclosing section in Document.sections, None at the top
+		self.parent = parent
+		# Titles from the outermost enclosing section down to this one
+		self.breadcrumb = breadcrumb if breadcrumb is not None else [title]
+		# Index after the last subsection (None until the tree is linked)
+		self.subtree_end = subtree_end
+
+	@classmethod
+	def from_dict(cls, data: Dict[str, Any]) -> "Section":
+		"""Create a section from its JSON representation."""
+		return cls(
+			data.get("title", ""),
+			data.get("level", 1),
+			data.get("content", ""),
+			data.get("line_start", 0),
+			data.get("line_end", 0),
+			data.get("byte_start", 0),
+			data.get("byte_end", 0),
+			data.get("parent"),
+			data.get("breadcrumb"),
+			data.get("subtree_end"),
+		)
+
+	def to_dict(self) -> Dict[str, Any]:
+		"""Convert to the JSON representation."""
+		return {
+			"title": self.title,
+			"level": self.level,
+			"content": self.content,
+			"line_start": self.line_start,
+			"line_end": self.line_end,
+			"byte_start": self.byte_start,
+			"byte_end": self.byte_end,
+			"parent": self.parent,
+			"breadcrumb": self.breadcrumb,
+			"subtree_end": self.subtree_end,
+		}
+
+	def to_tuple(self) -> tuple:
+		"""Convert to a tuple of field values, in slot order."""
+		return (
+			self.title,
+			self.level,
+			self.content,
+			self.line_start,
+			self.line_end,
+			self.byte_start,
+			self.byte_end,
+			self.parent,
+			self.breadcrumb,
+			self.subtree_end,
+		)
+
+
+def link_section_tree(sections: List[Section]) -> None:
+	"""
+	Link sections into a tree from their heading levels.
+
+	Sets the parent, breadcrumb and subtree_end of every section in a
+	single pass with a stack of the open ancestors.
+
+	Args:
+		sections: Sections of a document, in document order
+	"""
+	open_sections: List[int] = []
+	for index, section in enumerate(sections):
+		while open_sections and sections[open_sections[-1]].level >= section.level:
+			sections[open_sections.pop()].subtree_end = index
+
+		if open_sections:
+			parent = sections[open_sections[-1]]
+			section.parent = open_sections[-1]
+			section.breadcrumb = parent.breadcrumb + [section.title]
+		else:
+			section.parent = None
+			section.breadcrumb = [section.title]
+		open_sections.append(index)
+
+	for index in open_sections:
+		sections[index].subtree_end = len(sections)
+
+
+class Document(_Record):
+	"""An indexed documentation file."""
+
+	# Field order is the JSON key order
+	__slots__ = (
+		"path",
+		"title",
+		"priority",
+		"size",
+		"modified",
+		"sections",
+		"keywords",
+		"word_count",
+		"heading_count",
+		"links",
+		"authority",
+		"truncation",
+		"source",
+	)
+
+	def __init__(
+		self,
+		path: str,
+		title: str,
+		priority: str = "normal",
+		size: int = 0,
+		modified: str = "",
+		sections: Optional[List[Section]] = None,
+		keywords: Optional[List[str]] = None,
+		word_count: int = 0,
+		heading_count: Optional[int] = None,
+		links: Optional[List[str]] = None,
+		authority: float = 0.0,
+		truncation: Optional[Dict[str, int]] = None,
+		source: str = "docs",
+	):
+		self.path = path
+		self.title = title
+		self.priority = priority
+		self.size = size
+		self.modified = modified
+		self.sections = sections if sections is not None else []
+		self.keywords = keywords if keywords is not None else []
+		self.word_count = word_count
+		self.heading_count = (
+			heading_count if heading_count is not None else len(self.sections)
+		)
+		# Repository paths of the files this document links to
+		self.links = links if links is not None else []
+		# Link-graph authority, normalized so the top document has 1.0
+		self.authority = authority
+		# Size caps hit while indexing: indexed_chars, sections (empty if none)
+		self.truncation = truncation if truncation is not None else {}
+		# Name of the index root the document comes from
+		self.source = source
+
+	@classmethod
+	def from_dict(cls, data: Dict[str, Any]) -> "Document":
+		"""Create a document from its JSON representation."""
+		sections = [Section.from_dict(section) for section in data.get("sections", [])]
+		if sections and sections[0].subtree_end is None:
+			# Index written before sections were linked into a tree
+			link_section_tree(sections)
+
+		return cls(
+			data["path"],
+			data.get("title", ""),
+			data.get("priority", "normal"),
+			data.get("size", 0),
+			data.get("modified", ""),
+			sections,
+			data.get("keywords", []),
+			data.get("word_count", 0),
+			data.get("heading_count"),
+			data.get("links", []),
+			data.get("authority", 0.0),
+			data.get("truncation", {}),
+			data.get("source", "docs"),
+		)
+
+	def to_dict(self) -> Dict[str, Any]:
+		"""Convert to the JSON representation."""
+		return {
+			"path": self.path,
+			"title": self.title,
+			"priority": self.priority,
+			"size": self.size,
+			"modified": self.modified,
+			"sections": [section.to_dict() for section in self.sections],
+			"keywords": self.keywords,
+			"word_count": self.word_count,
+			"heading_count": self.heading_count,
+			"links": self.links,
+			"authority": self.authority,
+			"truncation": self.truncation,
+			"source": self.source,
+		}
+
+	def to_tuple(self) -> tuple:
+		"""Convert to a tuple of field values, sections as tuples too."""
+		return (
+			self.path,
+			self.title,
+			self.priority,
+			self.size,
+			self.modified,
+			[section.to_tuple() for section in self.sections],
+			self.keywords,
+			self.word_count,
+			self.heading_count,
+			self.links,
+			self.authority,
+			self.truncation,
+			self.source,
+		)
+
+	@classmethod
+	def from_tuple(cls, values: tuple) -> "Document":
+		"""Create a document from to_tuple() output."""
+		document = cls(*values)
+		document.sections = [Section(*section) for section in document.sections]
+		return document
+
+
+def documents_from_dicts(documents: List[Dict[str, Any]]) -> List[Document]:
+	"""
+	Convert JSON documents to records.
+
+	Args:
+		documents: Documents in the JSON index schema
+
+	Returns:
+		Document records
+	"""
+	return [Document.from_dict(document) for document in documents]
+
+
+class LazyDocuments:
+	"""
+	Sequence of documents read on demand from a document store.
+
+	The store holds one JSON document per byte range: the document store of
+	an external-memory index (see index_postings.py), or the JSON index for
+	a two-tier search.
+
+	The store is mapped when the sequence is created, so documents keep
+	coming from that file even after a rebuild replaces it.
+	"""
+
+	def __init__(self, documents_path: Path, rows: List[list], cache_size: int = 256):
+		"""
+		Initialize the sequence.
+
+		Args:
+			documents_path: Document store file
+			rows: Table rows with the offset and length of every document
+			cache_size: Number of recently read documents kept in memory
+		"""
+		self.documents_path = documents_path
+		self.rows = rows
+		self.cache_size = cache_size
+		self._cache: Dict[int, Document] = {}
+		# Guards the cache against concurrent readers (e.g. replay threads);
+		# imported here, since only disk-backed indexes need it
+		import threading
+
+		self._cache_lock = threading.Lock()
+
+		with open(documents_path, "rb") as f:
+			# Size of the mapped file, for callers checking it is the expected one
+			self.size = os.fstat(f.fileno()).st_size
+			# An empty file cannot be mapped, and has no documents to read
+			self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+
+	def __len__(self) -> int:
+		return len(self.rows)
+
+	def __getitem__(self, doc_id: int) -> Document:
+		with self._cache_lock:
+			document = self._cache.get(doc_id)
+		if document is None:
+			import json
+
+			row = self.rows[doc_id]
+			document = Document.from_dict(json.loads(self._data[row[0]:row[0] + row[1]]))
+			# Authority is only known once the whole corpus has been read
+			document.authority = row[8]
+			with self._cache_lock:
+				if doc_id not in self._cache and len(self._cache) >= self.cache_size:
+					self._cache.pop(next(iter(self._cache)))
+				self._cache[doc_id] = document
+		return document
+
+	def __iter__(self) -> Iterator[Document]:
+		import json
+
+		for row in self.rows:
+			document = Document.from_dict(json.loads(self._data[row[0]:row[0] + row[1]]))
+			document.authority = row[8]
+			yield document
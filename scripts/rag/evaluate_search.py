@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Search Evaluation Harness for RAG System
+
+This script runs a golden set of queries against every scoring mode of
+the search engine and reports result quality (recall@k, MRR, nDCG@k)
+together with cost (p50/p99 latency and peak memory), so engine settings
+can be chosen from measured trade-offs.
+
+Usage:
+    python scripts/rag/evaluate_search.py
+    python scripts/rag/evaluate_search.py --k 10 --repeats 20 --json
+"""
+
+import argparse
+import json
+import math
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Dict, List, Any
+
+from search_documentation import DocumentationSearchEngine
+
+
+DEFAULT_GOLDEN_PATH = Path(__file__).parent / "golden_queries.json"
+
+
+def load_golden(golden_path: Path) -> List[Dict[str, Any]]:
+	"""
+	Load golden queries with their graded relevant documents.
+
+	Args:
+		golden_path: Path to the golden query file
+
+	Returns:
+		List of {"query": str, "relevant": {path: grade}}
+	"""
+	with open(golden_path, "r", encoding="utf-8") as f:
+		golden = json.load(f)
+
+	queries = golden.get("queries", [])
+	for entry in queries:
+		if not entry.get("query") or not entry.get("relevant"):
+			raise ValueError(f"Invalid golden entry: {entry}")
+
+	return queries
+
+
+def recall_at_k(ranked: List[str], relevant: Dict[str, int], k: int) -> float:
+	"""
+	Fraction of relevant documents found in the top k results.
+
+	Args:
+		ranked: Ranked document paths
+		relevant: Relevant document paths with grades
+		k: Cutoff rank
+
+	Returns:
+		Recall between 0 and 1
+	"""
+	if not relevant:
+		return 0.0
+	found = sum(1 for path in ranked[:k] if path in relevant)
+	return found / len(relevant)
+
+
+def reciprocal_rank(ranked: List[str], relevant: Dict[str, int]) -> float:
+	"""
+	Reciprocal rank of the first relevant document.
+
+	Args:
+		ranked: Ranked document paths
+		relevant: Relevant document paths with grades
+
+	Returns:
+		1 / rank of the first relevant result, or 0 if none is found
+	"""
+	for rank, path in enumerate(ranked, 1):
+		if path in relevant:
+			return 1.0 / rank
+	return 0.0
+
+
+def ndcg_at_k(ranked: List[str], relevant: Dict[str, int], k: int) -> float:
+	"""
+	Normalized discounted cumulative gain over the top k results.
+
+	Args:
+		ranked: Ranked document paths
+		relevant: Relevant document paths with grades
+		k: Cutoff rank
+
+	Returns:
+		nDCG between 0 and 1
+	"""
+	dcg = sum(
+		(2 ** relevant.get(path, 0) - 1) / math.log2(rank + 1)
+		for rank, path in enumerate(ranked[:k], 1)
+	)
+	ideal_grades = sorted(relevant.values(), reverse=True)[:k]
+	idcg = sum(
+		(2 ** grade - 1) / math.log2(rank + 1)
+		for rank, grade in enumerate(ideal_grades, 1)
+	)
+	return dcg / idcg if idcg > 0 else 0.0
+
+
+def percentile(values: List[float], pct: float) -> float:
+	"""
+	Nearest-rank percentile of a list of values.
+
+	Args:
+		values: Measured values
+		pct: Percentile between 0 and 100
+
+	Returns:
+		Percentile value, or 0.0 for an empty list
+	"""
+	if not values:
+		return 0.0
+	ordered = sorted(values)
+	rank = max(1, math.ceil(pct / 100 * len(ordered)))
+	return ordered[rank - 1]
+
+
+def evaluate_mode(
+	mode: str,
+	golden: List[Dict[str, Any]],
+	index_path: str = "docs/.doc-index.json",
+	k: int = 5,
+	repeats: int = 5,
+	min_score: float = 0.3,
+) -> Dict[str, Any]:
+	"""
+	Evaluate one scoring mode against the golden queries.
+
+	Peak memory is measured in a first traced pass covering engine
+	construction and one run of every query; latencies are measured in
+	separate untraced passes, since tracing slows allocation down.
+
+	Args:
+		mode: Scoring mode of DocumentationSearchEngine
+		golden: Golden queries
+		index_path: Path to the documentation index
+		k: Cutoff rank for the quality metrics
+		repeats: Number of timed runs per query
+		min_score: Minimum relevance score passed to search()
+
+	Returns:
+		Report with quality metrics, latency percentiles and peak memory
+	"""
+	tracemalloc.start()
+	engine = DocumentationSearchEngine(index_path, scoring_mode=mode, verbose=False)
+	rankings = {}
+	for entry in golden:
+		results = engine.search(entry["query"], max_results=k, min_score=min_score)
+		rankings[entry["query"]] = [r["document"].path for r in results]
+	_, peak_bytes = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+
+	latencies_ms = []
+	for _ in range(repeats):
+		for entry in golden:
+			start = time.perf_counter()
+			engine.search(entry["query"], max_results=k, min_score=min_score)
+			latencies_ms.append((time.perf_counter() - start) * 1000)
+
+	n_queries = len(golden)
+	return {
+		"mode": mode,
+		"queries": n_queries,
+		f"recall@{k}": sum(
+			recall_at_k(rankings[e["query"]], e["relevant"], k) for e in golden
+		) / n_queries,
+		"mrr": sum(
+			reciprocal_rank(rankings[e["query"]], e["relevant"]) for e in golden
+		) / n_queries,
+		f"ndcg@{k}": sum(
+			ndcg_at_k(rankings[e["query"]], e["relevant"], k) for e in golden
+		) / n_queries,
+		"p50_ms": percentile(latencies_ms, 50),
+		"p99_ms": percentile(latencies_ms, 99),
+		"peak_memory_kb": peak_bytes / 1024,
+	}
+
+
+def print_report(reports: List[Dict[str, Any]], k: int) -> None:
+	"""Print evaluation reports as a table, one row per scoring mode."""
+	header = (
+		f"{'Mode':<12} {'Recall@' + str(k):>9} {'MRR':>7} {'nDCG@' + str(k):>8} "
+		f"{'p50 ms':>8} {'p99 ms':>8} {'Peak KB':>10}"
+	)
+	print(header)
+	print("-" * len(header))
+	for report in reports:
+		print(
+			f"{report['mode']:<12} {report[f'recall@{k}']:>9.3f} "
+			f"{report['mrr']:>7.3f} {report[f'ndcg@{k}']:>8.3f} "
+			f"{report['p50_ms']:>8.2f} {report['p99_ms']:>8.2f} "
+			f"{report['peak_memory_kb']:>10.0f}"
+		)
+
+
+def main():
+	"""Main entry point."""
+	parser = argparse.ArgumentParser(description="Evaluate RAG search modes")
+	parser.add_argument("--golden", default=str(DEFAULT_GOLDEN_PATH))
+	parser.add_argument("--index", default="docs/.doc-index.json")
+	parser.add_argument("--k", type=int, default=5)
+	parser.add_argument("--repeats", type=int, default=5)
+	parser.add_argument("--min-score", type=float, default=0.3)
+	parser.add_argument(
+		"--modes",
+		nargs="+",
+		default=list(DocumentationSearchEngine.SCORING_MODES),
+		choices=DocumentationSearchEngine.SCORING_MODES,
+	)
+	parser.add_argument("--json", action="store_true", help="Print JSON reports")
+	args = parser.parse_args()
+
+	try:
+		golden = load_golden(Path(args.golden))
+		reports = [
+			evaluate_mode(
+				mode, golden, args.index, args.k, args.repeats, args.min_score
+			)
+			for mode in args.modes
+		]
+	except (FileNotFoundError, ValueError) as e:
+		print(f"❌ Error: {e}")
+		sys.exit(1)
+
+	if args.json:
+		print(json.dumps(reports, indent=2))
+	else:
+		print("📏 Search Evaluation - Lumina Portfolio RAG System\n")
+		print(f"Golden queries: {len(golden)} ({args.golden})\n")
+		print_report(reports, args.k)
+
+
+if __name__ == "__main__":
+	main()
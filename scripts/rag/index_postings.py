@@ -0,0 +1,733 @@
+#!/usr/bin/env python3
+"""
+External-Memory Posting Index for RAG System
+
+This module builds the term postings of the search index with single-pass
+in-memory indexing (SPIMI), so a build needs a fixed amount of memory
+whatever the size of the corpus:
+
+- documents stream in one at a time and are appended to a document store;
+- their terms fill in-memory postings until the memory budget is reached,
+  then the postings are written as a sorted run to a temporary file;
+- at the end, the runs are k-way merged into the final posting file, with
+  the term dictionary spilled to a temporary file.
+
+The budget also accounts for the state kept per document until the end of
+the build (the table rows, and the metadata stubs of the caller, see
+SpimiIndexWriter.reserve), which is not spilled: postings get what is left
+of the budget, and at least MIN_POSTINGS_SHARE of it.
+
+Postings are lists of (doc id, count) pairs with delta-encoded doc ids,
+compressed with variable-byte encoding. Title and keyword postings have a
+count of 1; section postings count the sections containing the term.
+
+Layout of an index directory:
+    documents-NNNNNN.jsonl   one JSON document per line, in doc id order
+    postings-NNNNNN.bin      magic, postings, term dictionary, dictionary offset
+    table.json               metadata, the generation and its data files, plus
+                             a compact row per document (written last)
+
+Every build writes its data files under a new generation number and
+publishes them by atomically replacing table.json, so a reader only ever
+pairs a table with the files it names. Readers keep their files open, and
+the previous generation is kept for readers that have just read the old
+table; older generations are removed.
+"""
+
+import heapq
+import json
+import mmap
+import os
+import re
+import shutil
+import tempfile
+from array import array
+from pathlib import Path
+from typing import Dict, Iterator, List, Any, Optional, Tuple
+
+from doc_records import Document, LazyDocuments
+from index_segments import atomic_write_json
+from index_snapshot import document_terms
+
+
+DOCUMENTS_NAME = "documents.jsonl"
+POSTINGS_NAME = "postings.bin"
+TABLE_NAME = "table.json"
+# Term dictionary spilled during the merge, in the work directory
+DICTIONARY_NAME = "dictionary.bin"
+
+# Data files of one generation; tables without a generation name the
+# unnumbered files above
+DOCUMENTS_PATTERN = "documents-{:06d}.jsonl"
+POSTINGS_PATTERN = "postings-{:06d}.bin"
+GENERATION_FILE_RE = re.compile(r"(?:documents|postings)-(\d+)\.(?:jsonl|bin)")
+
+POSTINGS_MAGIC = b"RAGP\x01"
+
+# Size of the dictionary offset stored at the end of the posting file
+FOOTER_BYTES = 8
+
+# Default memory budget of the in-memory postings, in bytes
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+
+# Estimated memory of a new term (dict slot, key string, posting array)
+TERM_OVERHEAD_BYTES = 200
+# Estimated memory of one (doc id, count) pair in a posting array
+POSTING_BYTES = 8
+# Estimated memory of a table row, besides its strings
+ROW_OVERHEAD_BYTES = 400
+# Estimated memory of a string, besides its characters
+STRING_OVERHEAD_BYTES = 50
+# Fraction of the memory budget always left to postings (1 / N), so runs
+# keep a useful size once per-document state outgrows the budget
+MIN_POSTINGS_SHARE = 8
+
+# Field prefixes of posting keys, e.g. "t:storage"
+TITLE_FIELD = "t"
+KEYWORD_FIELD = "k"
+SECTION_FIELD = "s"
+
+# Buffer size used when reading runs and writing the posting file
+IO_BUFFER_BYTES = 1024 * 1024
+# Smallest read buffer per run when many runs share the memory budget
+MIN_RUN_BUFFER_BYTES = 64 * 1024
+
+
+def encode_varbyte(value: int, out: bytearray) -> None:
+	"""
+	Append a non-negative integer in variable-byte encoding.
+
+	Seven bits are stored per byte, least significant group first; the high
+	bit marks every byte except the last one.
+
+	Args:
+		value: Integer to encode
+		out: Buffer to append to
+	"""
+	while value >= 0x80:
+		out.append((value & 0x7F) | 0x80)
+		value >>= 7
+	out.append(value)
+
+
+def decode_varbytes(data: bytes) -> List[int]:
+	"""
+	Decode a buffer of variable-byte encoded integers.
+
+	Args:
+		data: Encoded integers
+
+	Returns:
+		Decoded integers
+	"""
+	values = []
+	value = 0
+	shift = 0
+	for byte in data:
+		if byte & 0x80:
+			value |= (byte & 0x7F) << shift
+			shift += 7
+		else:
+			values.append(value | (byte << shift))
+			value = 0
+			shift = 0
+	return values
+
+
+def encode_postings(postings: array, out: bytearray, previous_id: int = -1) -> int:
+	"""
+	Append (doc id, count) pairs with delta-encoded doc ids.
+
+	Args:
+		postings: Flat array of doc id, count, doc id, count, ...
+		out: Buffer to append to
+		previous_id: Last doc id already encoded for the same term
+
+	Returns:
+		Last encoded doc id
+	"""
+	for i in range(0, len(postings), 2):
+		doc_id = postings[i]
+		delta = doc_id - previous_id - 1
+		count = postings[i + 1]
+		# Most deltas and counts fit in one byte
+		if delta < 0x80 and count < 0x80:
+			out.append(delta)
+			out.append(count)
+		else:
+			encode_varbyte(delta, out)
+			encode_varbyte(count, out)
+		previous_id = doc_id
+	return previous_id
+
+
+def decode_postings(data: bytes) -> List[Tuple[int, int]]:
+	"""
+	Decode (doc id, count) pairs written by encode_postings.
+
+	Args:
+		data: Encoded postings of one term
+
+	Returns:
+		(doc id, count) pairs in doc id order
+	"""
+	values = decode_varbytes(data)
+	pairs = []
+	doc_id = -1
+	for i in range(0, len(values), 2):
+		doc_id += values[i] + 1
+		pairs.append((doc_id, values[i + 1]))
+	return pairs
+
+
+def _first_varbyte(data: bytes) -> Tuple[int, int]:
+	"""
+	Decode the first variable-byte integer of a buffer.
+
+	Args:
+		data: Encoded integers
+
+	Returns:
+		(value, number of bytes it takes)
+	"""
+	value = 0
+	shift = 0
+	for size, byte in enumerate(data, 1):
+		if byte & 0x80:
+			value |= (byte & 0x7F) << shift
+			shift += 7
+		else:
+			return value | (byte << shift), size
+	raise ValueError("Truncated variable-byte integer")
+
+
+def _read_exact(f, size: int) -> bytes:
+	"""Read exactly `size` bytes from a run file."""
+	data = f.read(size)
+	if len(data) != size:
+		raise ValueError(f"Truncated run file {f.name}")
+	return data
+
+
+def _read_varbyte(f) -> Optional[int]:
+	"""Read one variable-byte integer from a file, or None at end of file."""
+	value = 0
+	shift = 0
+	while True:
+		byte = f.read(1)
+		if not byte:
+			if shift:
+				raise ValueError(f"Truncated run file {f.name}")
+			return None
+		byte = byte[0]
+		if byte & 0x80:
+			value |= (byte & 0x7F) << shift
+			shift += 7
+		else:
+			return value | (byte << shift)
+
+
+def iter_run(run_path: Path, buffering: int = IO_BUFFER_BYTES) -> Iterator[Tuple[str, int, bytes]]:
+	"""
+	Stream the terms of a sorted run.
+
+	Run record: varbyte key length, key, varbyte last doc id, varbyte
+	postings length, postings.
+
+	Args:
+		run_path: Run file written by SpimiIndexWriter
+		buffering: Read buffer size
+
+	Yields:
+		(posting key, last doc id, encoded postings) in key order
+	"""
+	with open(run_path, "rb", buffering=buffering) as f:
+		while True:
+			key_length = _read_varbyte(f)
+			if key_length is None:
+				return
+			key = _read_exact(f, key_length).decode("utf-8")
+			last_id = _read_varbyte(f)
+			postings = _read_exact(f, _read_varbyte(f))
+			yield key, last_id, postings
+
+
+def _tag_run(
+	records: Iterator[Tuple[str, int, bytes]], run_index: int
+) -> Iterator[Tuple[str, int, int, bytes]]:
+	"""Tag the records of a run with the run index for the k-way merge."""
+	for key, last_id, postings in records:
+		yield key, run_index, last_id, postings
+
+
+class SpimiIndexWriter:
+	"""Builds an external-memory index from a stream of documents."""
+
+	def __init__(self, output_dir: str, memory_budget: int = DEFAULT_MEMORY_BUDGET):
+		"""
+		Initialize the writer.
+
+		Args:
+			output_dir: Directory receiving the index files
+			memory_budget: Bytes of in-memory postings and per-document state
+				before a run is flushed
+		"""
+		self.output_dir = Path(output_dir)
+		self.output_dir.mkdir(parents=True, exist_ok=True)
+		self.memory_budget = memory_budget
+
+		# Runs and the new document store live in a private temporary directory
+		self.work_dir = Path(tempfile.mkdtemp(prefix=".spimi-", dir=self.output_dir))
+		self.documents_file = open(self.work_dir / DOCUMENTS_NAME, "wb")
+		self.documents_offset = 0
+
+		# Compact per-document rows: offset, length, path, title, priority,
+		# modified, source, section count, authority
+		self.rows: List[list] = []
+		self.postings: Dict[str, array] = {}
+		self.memory_used = 0
+		# Estimated memory kept until the end of the build: rows, plus the
+		# caller state counted with reserve
+		self.resident_bytes = 0
+		self.runs: List[Path] = []
+		# Document store of the published generation, set by finish
+		self.documents_path: Optional[Path] = None
+
+	def add_document(self, document: Document) -> int:
+		"""
+		Append a document to the store and index its terms.
+
+		Args:
+			document: Processed document
+
+		Returns:
+			Doc id of the document
+		"""
+		doc_id = len(self.rows)
+
+		data = (json.dumps(document.to_dict(), ensure_ascii=False) + "\n").encode("utf-8")
+		self.documents_file.write(data)
+		self.rows.append(
+			[
+				self.documents_offset,
+				len(data),
+				document.path,
+				document.title,
+				document.priority,
+				document.modified,
+				document.source,
+				len(document.sections),
+				document.authority,
+			]
+		)
+		self.documents_offset += len(data)
+		self.resident_bytes += ROW_OVERHEAD_BYTES + sum(
+			STRING_OVERHEAD_BYTES + len(text)
+			for text in (document.path, document.title, document.modified, document.source)
+		)
+
+		title_terms, keyword_terms, section_terms = document_terms(document)
+		for term in title_terms:
+			self._add_posting(f"{TITLE_FIELD}:{term}", doc_id, 1)
+		for term in keyword_terms:
+			self._add_posting(f"{KEYWORD_FIELD}:{term}", doc_id, 1)
+		for term, count in section_terms.items():
+			self._add_posting(f"{SECTION_FIELD}:{term}", doc_id, count)
+
+		if self.memory_used >= self.postings_budget():
+			self.flush_run()
+
+		return doc_id
+
+	def reserve(self, size: int) -> None:
+		"""
+		Count memory that the caller keeps until the end of the build.
+
+		Args:
+			size: Estimated bytes (e.g. the metadata stub of a document)
+		"""
+		self.resident_bytes += size
+
+	def postings_budget(self) -> int:
+		"""Get the bytes of in-memory postings allowed before a run is flushed."""
+		return max(
+			self.memory_budget - self.resident_bytes,
+			self.memory_budget // MIN_POSTINGS_SHARE,
+		)
+
+	def _add_posting(self, key: str, doc_id: int, count: int) -> None:
+		"""Add one (doc id, count) pair to the in-memory postings."""
+		postings = self.postings.get(key)
+		if postings is None:
+			postings = self.postings[key] = array("I")
+			self.memory_used += TERM_OVERHEAD_BYTES + len(key)
+		postings.append(doc_id)
+		postings.append(count)
+		self.memory_used += POSTING_BYTES
+
+	def flush_run(self) -> Optional[Path]:
+		"""
+		Write the in-memory postings as a sorted run and release them.
+
+		Returns:
+			Path of the run file, or None if there was nothing to flush
+		"""
+		if not self.postings:
+			return None
+
+		run_path = self.work_dir / f"run-{len(self.runs):06d}.bin"
+		with open(run_path, "wb", buffering=IO_BUFFER_BYTES) as f:
+			for key in sorted(self.postings):
+				postings = self.postings[key]
+				encoded = bytearray()
+				encode_postings(postings, encoded)
+				record = bytearray()
+				key_bytes = key.encode("utf-8")
+				encode_varbyte(len(key_bytes), record)
+				record += key_bytes
+				encode_varbyte(postings[-2], record)
+				encode_varbyte(len(encoded), record)
+				f.write(record)
+				f.write(encoded)
+
+		self.runs.append(run_path)
+		self.postings = {}
+		self.memory_used = 0
+		return run_path
+
+	def merge_runs(self, output_path: Path) -> int:
+		"""
+		K-way merge the sorted runs into the final posting file.
+
+		Runs hold increasing doc id ranges, so the postings of a term are the
+		concatenation of its postings in run order; only the first doc id of
+		each run needs its delta re-encoded against the previous run.
+
+		Args:
+			output_path: Posting file to write
+
+		Returns:
+			Number of distinct posting keys
+		"""
+		# Read buffers of all runs together stay within the postings budget
+		buffering = max(
+			MIN_RUN_BUFFER_BYTES,
+			min(IO_BUFFER_BYTES, self.postings_budget() // max(1, len(self.runs))),
+		)
+		# Ties on a key are broken by run index, keeping doc ids increasing
+		streams = [
+			_tag_run(iter_run(run_path, buffering), run_index)
+			for run_index, run_path in enumerate(self.runs)
+		]
+
+		# The dictionary grows with the vocabulary, so it is spilled and
+		# appended to the posting file once the postings are written
+		dictionary_path = self.work_dir / DICTIONARY_NAME
+		terms = 0
+		with open(output_path, "wb", buffering=IO_BUFFER_BYTES) as f, open(
+			dictionary_path, "w+b", buffering=IO_BUFFER_BYTES
+		) as dictionary:
+			f.write(POSTINGS_MAGIC)
+			offset = len(POSTINGS_MAGIC)
+
+			current_key = None
+			start = offset
+			previous_id = -1
+			for key, _, last_id, postings in heapq.merge(*streams):
+				if key != current_key:
+					if current_key is not None:
+						self._add_dictionary_entry(dictionary, current_key, start, offset - start)
+						terms += 1
+					current_key = key
+					start = offset
+					previous_id = -1
+
+				if previous_id < 0:
+					f.write(postings)
+					offset += len(postings)
+				else:
+					# The first delta of a run is relative to doc id -1
+					first_id, size = _first_varbyte(postings)
+					encoded = bytearray()
+					encode_varbyte(first_id - previous_id - 1, encoded)
+					f.write(encoded)
+					f.write(memoryview(postings)[size:])
+					offset += len(encoded) + len(postings) - size
+				previous_id = last_id
+
+			if current_key is not None:
+				self._add_dictionary_entry(dictionary, current_key, start, offset - start)
+				terms += 1
+
+			dictionary.seek(0)
+			shutil.copyfileobj(dictionary, f, IO_BUFFER_BYTES)
+			f.write(offset.to_bytes(FOOTER_BYTES, "little"))
+		dictionary_path.unlink()
+
+		return terms
+
+	@staticmethod
+	def _add_dictionary_entry(dictionary, key: str, offset: int, length: int) -> None:
+		"""Write a term dictionary entry: key, postings offset and length."""
+		key_bytes = key.encode("utf-8")
+		entry = bytearray()
+		encode_varbyte(len(key_bytes), entry)
+		entry += key_bytes
+		encode_varbyte(offset, entry)
+		encode_varbyte(length, entry)
+		dictionary.write(entry)
+
+	def finish(self, metadata: Dict[str, Any], authorities: Dict[str, float]) -> Dict[str, Any]:
+		"""
+		Flush the last run, merge all runs and publish the index files.
+
+		The data files are moved in under a new generation number, then the
+		table naming them replaces the previous one, so readers switch
+		generations atomically. Generations older than the previous one are
+		removed.
+
+		Args:
+			metadata: Index metadata
+			authorities: Link-graph authority per document path
+
+		Returns:
+			Build statistics: documents, runs, posting keys and estimated
+			per-document memory
+		"""
+		self.flush_run()
+		self.documents_file.close()
+
+		postings_path = self.work_dir / POSTINGS_NAME
+		terms = self.merge_runs(postings_path)
+
+		for row in self.rows:
+			row[8] = authorities.get(row[2], 0.0)
+
+		generation = self._previous_generation() + 1
+		postings_name = POSTINGS_PATTERN.format(generation)
+		documents_name = DOCUMENTS_PATTERN.format(generation)
+		os.replace(postings_path, self.output_dir / postings_name)
+		os.replace(self.work_dir / DOCUMENTS_NAME, self.output_dir / documents_name)
+		atomic_write_json(
+			self.output_dir / TABLE_NAME,
+			{
+				"metadata": metadata,
+				"generation": generation,
+				"postings_file": postings_name,
+				"documents_file": documents_name,
+				"documents": self.rows,
+			},
+			indent=None,
+		)
+		self.documents_path = self.output_dir / documents_name
+		self._remove_generations_before(generation - 1)
+
+		stats = {
+			"documents": len(self.rows),
+			"runs": len(self.runs),
+			"terms": terms,
+			"resident_bytes": self.resident_bytes,
+		}
+		self.close()
+		return stats
+
+	def _previous_generation(self) -> int:
+		"""Get the generation of the published table, 0 if there is none."""
+		generations = [
+			int(match.group(1))
+			for match in map(GENERATION_FILE_RE.fullmatch, os.listdir(self.output_dir))
+			if match
+		]
+		try:
+			with open(self.output_dir / TABLE_NAME, "r", encoding="utf-8") as f:
+				generations.append(json.load(f).get("generation", 0))
+		except (OSError, ValueError):
+			pass
+		return max(generations, default=0)
+
+	def _remove_generations_before(self, generation: int) -> None:
+		"""Remove the data files of generations older than a generation."""
+		for name in os.listdir(self.output_dir):
+			match = GENERATION_FILE_RE.fullmatch(name)
+			if match and int(match.group(1)) < generation:
+				try:
+					(self.output_dir / name).unlink()
+				except OSError:
+					# Still open by a reader on Windows; removed by a later build
+					pass
+		if generation > 0:
+			# Unnumbered files of an older layout count as generation 0
+			for name in (POSTINGS_NAME, DOCUMENTS_NAME):
+				try:
+					(self.output_dir / name).unlink()
+				except OSError:
+					pass
+
+	def close(self) -> None:
+		"""Remove the temporary runs and document store."""
+		if not self.documents_file.closed:
+			self.documents_file.close()
+		shutil.rmtree(self.work_dir, ignore_errors=True)
+
+
+class PostingsReader:
+	"""
+	Random access to the postings of a posting file.
+
+	Only the position of every dictionary entry is kept in memory; keys are
+	looked up by binary search in the mapped dictionary, which is sorted.
+	"""
+
+	def __init__(self, postings_path: Path):
+		"""
+		Open a posting file and index its term dictionary.
+
+		Args:
+			postings_path: File written by SpimiIndexWriter.merge_runs
+		"""
+		with open(postings_path, "rb") as f:
+			self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+		if self._data[: len(POSTINGS_MAGIC)] != POSTINGS_MAGIC:
+			raise ValueError(f"Not a posting file: {postings_path}")
+
+		dictionary_offset = int.from_bytes(self._data[-FOOTER_BYTES:], "little")
+		dictionary_end = len(self._data) - FOOTER_BYTES
+
+		self._entries = array("Q")
+		position = dictionary_offset
+		while position < dictionary_end:
+			self._entries.append(position)
+			key_length, position = self._varbyte_at(self._data, position)
+			position += key_length
+			_, position = self._varbyte_at(self._data, position)
+			_, position = self._varbyte_at(self._data, position)
+
+	def __len__(self) -> int:
+		return len(self._entries)
+
+	def _key_at(self, position: int) -> Tuple[bytes, int]:
+		"""Get the UTF-8 key of the dictionary entry at a position, and its end."""
+		key_length, position = self._varbyte_at(self._data, position)
+		return self._data[position:position + key_length], position + key_length
+
+	@staticmethod
+	def _varbyte_at(data: bytes, position: int) -> Tuple[int, int]:
+		"""Decode the variable-byte integer at a position."""
+		value = 0
+		shift = 0
+		while True:
+			byte = data[position]
+			position += 1
+			if byte & 0x80:
+				value |= (byte & 0x7F) << shift
+				shift += 7
+			else:
+				return value | (byte << shift), position
+
+	def postings(self, key: str) -> List[Tuple[int, int]]:
+		"""
+		Get the postings of a key.
+
+		Args:
+			key: Posting key, e.g. "s:storage"
+
+		Returns:
+			(doc id, count) pairs, empty for an unknown key
+		"""
+		# Keys were sorted as str, which is the order of their UTF-8 bytes
+		target = key.encode("utf-8")
+		low, high = 0, len(self._entries)
+		while low < high:
+			middle = (low + high) // 2
+			if self._key_at(self._entries[middle])[0] < target:
+				low = middle + 1
+			else:
+				high = middle
+		if low == len(self._entries):
+			return []
+		found, position = self._key_at(self._entries[low])
+		if found != target:
+			return []
+		offset, position = self._varbyte_at(self._data, position)
+		length, _ = self._varbyte_at(self._data, position)
+		return decode_postings(self._data[offset:offset + length])
+
+
+class PostingsField:
+	"""Dict-like view of the postings of one field, as used by the engine."""
+
+	def __init__(self, reader: PostingsReader, field: str, counts: bool = False):
+		"""
+		Initialize the view.
+
+		Args:
+			reader: Posting file reader
+			field: Field prefix (TITLE_FIELD, KEYWORD_FIELD or SECTION_FIELD)
+			counts: Return {doc id: count} instead of a list of doc ids
+		"""
+		self.reader = reader
+		self.prefix = field + ":"
+		self.counts = counts
+
+	def get(self, term: str, default: Any = None) -> Any:
+		"""Get the postings of a term, like dict.get."""
+		pairs = self.reader.postings(self.prefix + term)
+		if not pairs:
+			return default
+		if self.counts:
+			return dict(pairs)
+		return [doc_id for doc_id, _ in pairs]
+
+
+def load_postings_index(index_dir: Path) -> Dict[str, Any]:
+	"""
+	Open an external-memory index as an engine segment.
+
+	Only the table and the dictionary entry positions are loaded; postings
+	and documents are read on demand.
+
+	Args:
+		index_dir: Directory written by SpimiIndexWriter
+
+	Returns:
+		Segment (name, documents, deleted, lookups, live_mask) and metadata
+	"""
+	from index_snapshot import build_filter_lookups
+
+	index_dir = Path(index_dir)
+	with open(index_dir / TABLE_NAME, "r", encoding="utf-8") as f:
+		table = json.load(f)
+
+	rows = table["documents"]
+	stubs = [
+		Document(
+			path=row[2],
+			title=row[3],
+			priority=row[4],
+			modified=row[5],
+			heading_count=row[7],
+			authority=row[8],
+			source=row[6],
+		)
+		for row in rows
+	]
+
+	reader = PostingsReader(index_dir / table.get("postings_file", POSTINGS_NAME))
+	lookups = {
+		"title_terms": PostingsField(reader, TITLE_FIELD),
+		"keyword_terms": PostingsField(reader, KEYWORD_FIELD),
+		"section_terms": PostingsField(reader, SECTION_FIELD, counts=True),
+	}
+	lookups.update(build_filter_lookups(stubs, [row[7] for row in rows]))
+
+	return {
+		"metadata": table["metadata"],
+		"segment": {
+			"name": index_dir.name,
+			"documents": LazyDocuments(index_dir / table.get("documents_file", DOCUMENTS_NAME), rows),
+			"deleted": [],
+			"lookups": lookups,
+			"live_mask": None,
+		},
+	}
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Index Roots for RAG System
+
+An index root is a named part of the repository that the index builder
+scans, with the glob patterns selecting its files and the extractor that
+turns those files into markdown lines for the builder's tokenizer:
+
+- markdown: the file itself (docs, READMEs);
+- tsdoc: `/** ... */` doc comments of TypeScript sources;
+- rustdoc: `///` and `//!` doc comments of Rust sources.
+
+Source extractors emit one `## <name>` section per doc comment, named after
+the declaration that follows it, so code documentation is searchable with
+the same sections, keywords and ranking as the docs.
+"""
+
+import re
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+# Declaration following a TSDoc comment: export const foo / function foo / ...
+TS_DECLARATION_PATTERN = re.compile(
+	r"^\s*(?:export\s+)?(?:default\s+)?(?:declare\s+)?(?:abstract\s+)?(?:async\s+)?"
+	r"(?:const|let|var|function\*?|class|interface|type|enum)\s+([A-Za-z_$][\w$]*)"
+)
+
+# Class members: foo(...) {, async foo(...), public static foo = ...
+TS_MEMBER_PATTERN = re.compile(
+	r"^\s*(?:(?:public|private|protected|static|readonly|async|get|set)\s+)*"
+	r"([A-Za-z_$][\w$]*)\s*[(<=:]"
+)
+
+# Item following a Rust doc comment: pub fn foo / struct Foo / ...
+RUST_ITEM_PATTERN = re.compile(
+	r"^\s*(?:pub(?:\([^)]*\))?\s+)?(?:async\s+)?(?:unsafe\s+)?(?:const\s+)?"
+	r"(?:fn|struct|enum|trait|mod|const|static|type|union|macro_rules!)\s*([A-Za-z_]\w*)"
+)
+
+# Title of the section holding module-level documentation
+MODULE_SECTION_TITLE = "Overview"
+
+
+def extract_markdown(lines: Iterable[str]) -> Iterable[str]:
+	"""Markdown files are indexed as they are."""
+	return lines
+
+
+def _declaration_name(line: str, patterns: Tuple[re.Pattern, ...]) -> Optional[str]:
+	"""Get the name declared on a source line, if any."""
+	for pattern in patterns:
+		match = pattern.match(line)
+		if match:
+			return match.group(1)
+	return None
+
+
+def extract_tsdoc(lines: Iterable[str]) -> Iterator[str]:
+	"""
+	Extract TSDoc / JSDoc comments as markdown sections.
+
+	Args:
+		lines: Lines of a .ts or .tsx file
+
+	Yields:
+		Markdown lines: a `## <declaration>` heading per doc comment, followed
+		by the comment text without its `*` gutter
+	"""
+	comment: Optional[List[str]] = None
+	pending: Optional[List[str]] = None
+
+	for line in lines:
+		stripped = line.strip()
+
+		if comment is not None:
+			end = stripped.find("*/")
+			text = stripped if end < 0 else stripped[:end]
+			if text.startswith("*"):
+				text = text[1:]
+				if text.startswith(" "):
+					text = text[1:]
+			comment.append(text.rstrip())
+			if end >= 0:
+				pending, comment = comment, None
+			continue
+
+		if stripped.startswith("/**") and not stripped.startswith("/**/"):
+			if pending is not None:
+				# Two comments in a row: the first one documents the module
+				yield from _doc_section(MODULE_SECTION_TITLE, pending)
+				pending = None
+			body = stripped[3:]
+			end = body.find("*/")
+			if end >= 0:
+				pending = [body[:end].strip()]
+			else:
+				comment = [body.strip()] if body.strip() else []
+			continue
+
+		# Decorators sit between a doc comment and its declaration
+		if pending is not None and stripped and not stripped.startswith("@"):
+			name = _declaration_name(line, (TS_DECLARATION_PATTERN, TS_MEMBER_PATTERN))
+			yield from _doc_section(name or MODULE_SECTION_TITLE, pending)
+			pending = None
+
+	if pending is not None:
+		yield from _doc_section(MODULE_SECTION_TITLE, pending)
+
+
+def extract_rustdoc(lines: Iterable[str]) -> Iterator[str]:
+	"""
+	Extract Rust `///` item docs and `//!` module docs as markdown sections.
+
+	Args:
+		lines: Lines of a .rs file
+
+	Yields:
+		Markdown lines: a `## <item>` heading per doc comment, followed by
+		the comment text without its `///` prefix
+	"""
+	module_doc: List[str] = []
+	item_doc: List[str] = []
+
+	for line in lines:
+		stripped = line.strip()
+
+		if stripped.startswith("//!"):
+			module_doc.append(_strip_doc_prefix(stripped[3:]))
+			continue
+		if stripped.startswith("///") and not stripped.startswith("////"):
+			item_doc.append(_strip_doc_prefix(stripped[3:]))
+			continue
+
+		if module_doc and not stripped.startswith("//!"):
+			yield from _doc_section(MODULE_SECTION_TITLE, module_doc)
+			module_doc = []
+
+		# Attributes and blank lines sit between a doc comment and its item
+		if item_doc and stripped and not stripped.startswith("#["):
+			name = _declaration_name(line, (RUST_ITEM_PATTERN,))
+			yield from _doc_section(name or MODULE_SECTION_TITLE, item_doc)
+			item_doc = []
+
+	if module_doc:
+		yield from _doc_section(MODULE_SECTION_TITLE, module_doc)
+	if item_doc:
+		yield from _doc_section(MODULE_SECTION_TITLE, item_doc)
+
+
+def _strip_doc_prefix(text: str) -> str:
+	"""Remove the single space that follows a doc comment marker."""
+	return text[1:] if text.startswith(" ") else text
+
+
+def _doc_section(name: str, comment: List[str]) -> Iterator[str]:
+	"""Yield a doc comment as a markdown section."""
+	# Doc comment headings are nested below the section heading
+	yield f"## {name}"
+	for text in comment:
+		yield "##" + text if text.startswith("#") else text
+	yield ""
+
+
+EXTRACTORS: Dict[str, Callable[[Iterable[str]], Iterable[str]]] = {
+	"markdown": extract_markdown,
+	"tsdoc": extract_tsdoc,
+	"rustdoc": extract_rustdoc,
+}
+
+
+class IndexRoot:
+	"""A named set of files indexed with one extractor."""
+
+	__slots__ = ("name", "directory", "patterns", "extractor")
+
+	def __init__(
+		self,
+		name: str,
+		directory: str,
+		patterns: Tuple[str, ...] = ("**/*.md",),
+		extractor: str = "markdown",
+	):
+		"""
+		Initialize an index root.
+
+		Args:
+			name: Source tag of the documents of this root
+			directory: Directory relative to the repository root
+			patterns: Glob patterns relative to the directory
+			extractor: Name of the extractor in EXTRACTORS
+		"""
+		if extractor not in EXTRACTORS:
+			raise ValueError(
+				f"Unknown extractor {extractor}. Expected: {', '.join(EXTRACTORS)}"
+			)
+		self.name = name
+		self.directory = directory
+		self.patterns = tuple(patterns)
+		self.extractor = extractor
+
+	def __repr__(self) -> str:
+		return f"IndexRoot({self.name!r}, {self.directory!r})"
+
+	def files(self, repo_root: Path) -> List[Path]:
+		"""
+		List the files of the root, in sorted order.
+
+		Args:
+			repo_root: Repository root
+
+		Returns:
+			Sorted paths matching any of the root patterns
+		"""
+		base = repo_root / self.directory
+		matched = set()
+		for pattern in self.patterns:
+			matched.update(path for path in base.glob(pattern) if path.is_file())
+		return sorted(matched)
+
+	def pathspecs(self) -> List[str]:
+		"""Get git pathspecs matching the files of the root."""
+		prefix = "" if self.directory in ("", ".") else self.directory.rstrip("/") + "/"
+		return [f":(glob){prefix}{pattern}" for pattern in self.patterns]
+
+	def extract(self, lines: Iterable[str]) -> Iterable[str]:
+		"""Convert the lines of a file of this root into markdown lines."""
+		return EXTRACTORS[self.extractor](lines)
+
+
+# Roots known to the CLI; the builder indexes only "docs" unless told otherwise
+DEFAULT_ROOTS = [
+	IndexRoot("docs", "docs"),
+	IndexRoot("readme", ".", ("README.md", "scripts/README.md")),
+	IndexRoot("src", "src", ("**/*.ts", "**/*.tsx"), "tsdoc"),
+	IndexRoot("tauri", "src-tauri/src", ("**/*.rs",), "rustdoc"),
+]
@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Segmented Index Storage for RAG System
+
+This module stores the documentation index as a log of immutable segments
+listed by a manifest, in the spirit of an LSM tree:
+
+- every build writes a small delta segment holding only the documents
+  that changed, plus tombstones for deleted ones;
+- segments are merged in the background with a size-tiered policy;
+- the manifest is replaced atomically, so readers always see a complete
+  set of segments and can detect updates with a single `stat`;
+- manifest updates hold an exclusive lock on `manifest.lock`, so
+  concurrent builders (a watcher and a CI run) never drop each other's
+  segments;
+- the manifest records the fingerprint of every live document, so a
+  delta is computed without reading any segment.
+
+Newer segments shadow older ones: a document path resolves to the newest
+segment that contains it, unless a newer tombstone deletes it.
+
+Layout:
+    docs/.doc-segments/manifest.json
+    docs/.doc-segments/manifest.lock
+    docs/.doc-segments/seg-000001.json
+"""
+
+import hashlib
+import json
+import math
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Any, Optional, Tuple
+
+try:
+	import fcntl
+except ImportError:  # Windows
+	fcntl = None
+	import msvcrt
+
+
+MANIFEST_NAME = "manifest.json"
+LOCK_NAME = "manifest.lock"
+MANIFEST_VERSION = 1
+
+# Number of same-tier segments that triggers a merge
+MERGE_FACTOR = 4
+
+# Size ratio between two consecutive tiers
+TIER_BASE = 4
+
+
+def atomic_write_json(path: Path, data: Any, indent: Optional[int] = 2) -> None:
+	"""
+	Write JSON to a file atomically.
+
+	Data is written to a temporary file in the same directory and renamed
+	over the target, so readers see either the old or the new content.
+
+	Args:
+		path: Destination file
+		data: JSON-serializable data
+		indent: Indentation passed to json.dump
+	"""
+	path = Path(path)
+	tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+	with open(tmp_path, "w", encoding="utf-8") as f:
+		json.dump(data, f, indent=indent, ensure_ascii=False)
+	os.replace(tmp_path, path)
+
+
+def document_fingerprint(document: Dict[str, Any]) -> str:
+	"""
+	Get a stable fingerprint of a document's indexed content.
+
+	Args:
+		document: Index document
+
+	Returns:
+		Hex digest identifying the document content
+	"""
+	payload = json.dumps(document, sort_keys=True, ensure_ascii=False)
+	return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+def segment_tier(entries: int) -> int:
+	"""
+	Get the size tier of a segment.
+
+	Args:
+		entries: Number of documents and tombstones in the segment
+
+	Returns:
+		Tier number, 0 for the smallest segments
+	"""
+	if entries < TIER_BASE:
+		return 0
+	return int(math.log(entries, TIER_BASE))
+
+
+class SegmentStore:
+	"""Reads and writes a manifest of immutable index segments."""
+
+	def __init__(self, root: str = "docs/.doc-segments", merge_factor: int = MERGE_FACTOR):
+		"""
+		Initialize the segment store.
+
+		Args:
+			root: Directory holding the manifest and segment files
+			merge_factor: Number of same-tier segments that triggers a merge
+		"""
+		self.root = Path(root)
+		self.manifest_path = self.root / MANIFEST_NAME
+		self.lock_path = self.root / LOCK_NAME
+		self.merge_factor = merge_factor
+		# Serializes manifest updates between the writer and merge threads;
+		# other processes are excluded by the lock file (see _manifest_lock)
+		self._lock = threading.Lock()
+
+	@contextmanager
+	def _manifest_lock(self) -> Iterator[None]:
+		"""
+		Hold the manifest lock for a read-modify-write of the manifest.
+
+		The lock is taken both between threads and, through an exclusive
+		lock on the lock file, between processes.
+		"""
+		with self._lock:
+			with open(self.lock_path, "a+b") as f:
+				if fcntl is not None:
+					fcntl.flock(f, fcntl.LOCK_EX)
+				else:
+					f.seek(0)
+					msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+				try:
+					yield
+				finally:
+					if fcntl is not None:
+						fcntl.flock(f, fcntl.LOCK_UN)
+					else:
+						f.seek(0)
+						msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+	def read_manifest(self) -> Dict[str, Any]:
+		"""
+		Read the current manifest.
+
+		Returns:
+			Manifest with live segments, or an empty manifest if none exists
+		"""
+		if not self.manifest_path.exists():
+			return {
+				"version": MANIFEST_VERSION,
+				"next_id": 1,
+				"segments": [],
+				"metadata": {},
+				"fingerprints": {},
+			}
+
+		with open(self.manifest_path, "r", encoding="utf-8") as f:
+			return json.load(f)
+
+	def read_segment(self, name: str) -> Dict[str, Any]:
+		"""
+		Read one segment file.
+
+		Args:
+			name: Segment file name as listed in the manifest
+
+		Returns:
+			Segment with its documents and deleted paths
+		"""
+		with open(self.root / name, "r", encoding="utf-8") as f:
+			return json.load(f)
+
+	def live_documents(self, manifest: Optional[Dict[str, Any]] = None) -> Dict[str, Dict[str, Any]]:
+		"""
+		Resolve the live documents of the store.
+
+		Args:
+			manifest: Manifest to resolve (defaults to the current one)
+
+		Returns:
+			Live documents keyed by path, in segment order
+		"""
+		if manifest is None:
+			manifest = self.read_manifest()
+
+		live: Dict[str, Dict[str, Any]] = {}
+		for entry in manifest["segments"]:
+			segment = self.read_segment(entry["name"])
+			for path in segment.get("deleted", []):
+				live.pop(path, None)
+			for document in segment.get("documents", []):
+				# Re-insert so the document takes its newest position
+				live.pop(document["path"], None)
+				live[document["path"]] = document
+
+		return live
+
+	def _write_segment(
+		self, manifest: Dict[str, Any], documents: List[Dict[str, Any]], deleted: List[str]
+	) -> Dict[str, Any]:
+		"""Write a new immutable segment and return its manifest entry."""
+		segment_id = manifest["next_id"]
+		manifest["next_id"] = segment_id + 1
+		name = f"seg-{segment_id:06d}.json"
+
+		atomic_write_json(
+			self.root / name,
+			{"id": segment_id, "documents": documents, "deleted": deleted},
+			indent=None,
+		)
+
+		return {
+			"name": name,
+			"documents": len(documents),
+			"deleted": len(deleted),
+		}
+
+	def _commit(self, manifest: Dict[str, Any]) -> None:
+		"""Atomically publish a manifest."""
+		manifest["generation"] = manifest.get("generation", 0) + 1
+		atomic_write_json(self.manifest_path, manifest)
+
+	def write_delta(
+		self, documents: List[Dict[str, Any]], metadata: Dict[str, Any]
+	) -> Optional[str]:
+		"""
+		Write a delta segment bringing the store in line with a full build.
+
+		Only documents whose content changed are written; paths that are no
+		longer present become tombstones. Changes are found from the
+		fingerprints recorded in the manifest, without reading segments.
+
+		Args:
+			documents: Complete list of documents from the latest build
+			metadata: Index metadata for the complete build
+
+		Returns:
+			Name of the new segment, or None if nothing changed
+		"""
+		self.root.mkdir(parents=True, exist_ok=True)
+
+		fingerprints = {document["path"]: document_fingerprint(document) for document in documents}
+
+		with self._manifest_lock():
+			manifest = self.read_manifest()
+			recorded = manifest.get("fingerprints")
+			if recorded is None:
+				# Manifests written before fingerprints were recorded
+				recorded = {
+					path: document_fingerprint(document)
+					for path, document in self.live_documents(manifest).items()
+				}
+
+			changed = [
+				document
+				for document in documents
+				if recorded.get(document["path"]) != fingerprints[document["path"]]
+			]
+			deleted = [path for path in recorded if path not in fingerprints]
+
+			manifest["metadata"] = metadata
+			manifest["fingerprints"] = fingerprints
+			if not changed and not deleted:
+				self._commit(manifest)
+				return None
+
+			entry = self._write_segment(manifest, changed, deleted)
+			manifest["segments"].append(entry)
+			self._commit(manifest)
+
+		return entry["name"]
+
+	def pick_merge(self, segments: List[Dict[str, Any]]) -> Optional[Tuple[int, int]]:
+		"""
+		Pick a run of segments to merge with the size-tiered policy.
+
+		Only contiguous runs are merged, which keeps newest-wins shadowing
+		intact.
+
+		Args:
+			segments: Manifest segment entries, oldest first
+
+		Returns:
+			(start, end) slice of the run to merge, or None
+		"""
+		start = 0
+		while start < len(segments):
+			tier = segment_tier(segments[start]["documents"] + segments[start]["deleted"])
+			end = start + 1
+			while end < len(segments) and segment_tier(
+				segments[end]["documents"] + segments[end]["deleted"]
+			) == tier:
+				end += 1
+
+			if end - start >= self.merge_factor:
+				return start, start + self.merge_factor
+			start = end
+
+		return None
+
+	def merge(self) -> int:
+		"""
+		Merge segments until no tier holds enough segments.
+
+		The merged segment is built outside the lock; the manifest is only
+		updated if the merged run is still live.
+
+		Returns:
+			Number of merges performed
+		"""
+		merges = 0
+
+		while True:
+			manifest = self.read_manifest()
+			run = self.pick_merge(manifest["segments"])
+			if run is None:
+				return merges
+
+			start, end = run
+			run_entries = manifest["segments"][start:end]
+
+			merged: Dict[str, Dict[str, Any]] = {}
+			deleted = set()
+			for entry in run_entries:
+				segment = self.read_segment(entry["name"])
+				for path in segment.get("deleted", []):
+					merged.pop(path, None)
+					deleted.add(path)
+				for document in segment.get("documents", []):
+					merged.pop(document["path"], None)
+					merged[document["path"]] = document
+					deleted.discard(document["path"])
+
+			# Tombstones only matter while older segments remain below them
+			kept_deleted = sorted(deleted) if start > 0 else []
+
+			with self._manifest_lock():
+				current = self.read_manifest()
+				names = [entry["name"] for entry in current["segments"]]
+				run_names = [entry["name"] for entry in run_entries]
+				if names[start:end] != run_names:
+					continue
+
+				entry = self._write_segment(current, list(merged.values()), kept_deleted)
+				current["segments"][start:end] = [entry]
+				self._commit(current)
+
+			for name in run_names:
+				try:
+					(self.root / name).unlink()
+				except FileNotFoundError:
+					pass
+
+			merges += 1
+
+	def merge_in_background(self) -> threading.Thread:
+		"""
+		Start merging segments in a background thread.
+
+		Returns:
+			The started merge thread
+		"""
+		thread = threading.Thread(target=self.merge, name="doc-segment-merge")
+		thread.start()
+		return thread
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Index Snapshot for RAG System
+
+This module builds the precomputed lookup structures used by the search
+engine and persists them, together with the index documents, as a
+`marshal` snapshot written next to `.doc-index.json`. Loading a snapshot
+avoids both the JSON parse and the lookup construction on every query.
+
+The snapshot is an implementation cache: it is tied to the Python version
+that wrote it and to the size and mtime of the JSON index it was built
+from. Whenever either does not match, callers fall back to the JSON index.
+"""
+
+import marshal
+import os
+import re
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, List, Any, Optional, Tuple
+
+from doc_records import Document
+
+
+# Bump whenever the layout of the lookup structures changes
+SNAPSHOT_FORMAT = 8
+
+SNAPSHOT_SUFFIX = ".snapshot"
+
+# Size of the length prefix stored before the snapshot header
+HEADER_LENGTH_BYTES = 4
+
+# Bloom filter of the terms of a document: bits per term and hash functions
+# (about 2% false positives)
+TERM_FILTER_BITS = 8
+TERM_FILTER_HASHES = 4
+
+
+def snapshot_path_for(index_path: Path) -> Path:
+	"""
+	Get the snapshot path that belongs to an index file.
+
+	Args:
+		index_path: Path to the JSON index
+
+	Returns:
+		Path of the snapshot file (e.g. docs/.doc-index.snapshot)
+	"""
+	return Path(index_path).with_suffix(SNAPSHOT_SUFFIX)
+
+
+def extract_terms(text: str) -> set:
+	"""
+	Extract the set of lowercase word terms from text.
+
+	Args:
+		text: Text to tokenize
+
+	Returns:
+		Set of distinct terms
+	"""
+	# Same definition of a word as the `\b...\b` matching done by the engine;
+	# not precompiled at import so the snapshot query path never pays for it
+	return set(re.findall(r"\w+", text.lower()))
+
+
+def ids_to_bitmap(doc_ids: Iterable[int], size: int) -> int:
+	"""
+	Pack document ids into a bitmap.
+
+	Args:
+		doc_ids: Document ids to set
+		size: Number of documents covered by the bitmap
+
+	Returns:
+		Integer whose bit `i` is set for every id `i`
+	"""
+	bits = bytearray((size + 7) // 8)
+	for doc_id in doc_ids:
+		bits[doc_id >> 3] |= 1 << (doc_id & 7)
+	return int.from_bytes(bits, "little")
+
+
+def bitmap_ids(bitmap: int) -> List[int]:
+	"""
+	Unpack a bitmap into sorted document ids.
+
+	Args:
+		bitmap: Integer bitmap
+
+	Returns:
+		Ids of the set bits, ascending
+	"""
+	return [doc_id for doc_id, bit in enumerate(bin(bitmap)[:1:-1]) if bit == "1"]
+
+
+def document_terms(document: Document) -> Tuple[set, set, Dict[str, int]]:
+	"""
+	Extract the indexed terms of a document.
+
+	Args:
+		document: Document to tokenize
+
+	Returns:
+		Title terms, keyword terms, and the number of sections containing
+		each section term
+	"""
+	title_terms = extract_terms(document.title)
+	keyword_terms = extract_terms(" ".join(document.keywords))
+
+	section_terms: Dict[str, int] = {}
+	for section in document.sections:
+		for term in extract_terms(section.title + " " + section.content):
+			section_terms[term] = section_terms.get(term, 0) + 1
+
+	return title_terms, keyword_terms, section_terms
+
+
+def build_term_filter(terms: Iterable[str]) -> bytes:
+	"""
+	Build a Bloom filter of the terms of a document.
+
+	Used by two-tier indexes to bound the score of a document whose full
+	text has not been read: a term absent from the filter is absent from
+	the document.
+
+	Args:
+		terms: Distinct terms (see document_terms)
+
+	Returns:
+		Filter of TERM_FILTER_BITS bits per term
+	"""
+	terms = list(terms)
+	bits = bytearray(max(1, len(terms) * TERM_FILTER_BITS // 8))
+	size = len(bits) * 8
+	for term in terms:
+		for position in _term_positions(term):
+			position %= size
+			bits[position >> 3] |= 1 << (position & 7)
+	return bytes(bits)
+
+
+def term_filter_contains(term_filter: bytes, term: str) -> bool:
+	"""
+	Check whether a term may be in a term filter.
+
+	Args:
+		term_filter: Filter from build_term_filter
+		term: Lowercase term
+
+	Returns:
+		False if the term is certainly absent, True if it may be present
+	"""
+	size = len(term_filter) * 8
+	for position in _term_positions(term):
+		position %= size
+		if not term_filter[position >> 3] & (1 << (position & 7)):
+			return False
+	return True
+
+
+def _term_positions(term: str) -> List[int]:
+	"""Get the TERM_FILTER_HASHES bit positions of a term, before the modulo."""
+	# Stable across processes, unlike hash(); imported here to keep it off
+	# the snapshot query path
+	import hashlib
+
+	digest = hashlib.blake2b(term.encode("utf-8"), digest_size=4 * TERM_FILTER_HASHES).digest()
+	return [
+		int.from_bytes(digest[i:i + 4], "little") for i in range(0, len(digest), 4)
+	]
+
+
+def build_lookups(documents: List[Document]) -> Dict[str, Any]:
+	"""
+	Build the inverted lookup structures used for indexed scoring.
+
+	Term postings reproduce exactly the word-boundary matches of
+	`DocumentationSearchEngine.calculate_relevance_score`, so scores
+	computed from them are identical to a full regex scan.
+
+	Args:
+		documents: Index documents, in index order
+
+	Returns:
+		Dictionary with title, keyword and section term postings, plus
+		the per-document lookups of build_filter_lookups
+	"""
+	title_terms: Dict[str, List[int]] = {}
+	keyword_terms: Dict[str, List[int]] = {}
+	section_terms: Dict[str, Dict[int, int]] = {}
+
+	for doc_id, document in enumerate(documents):
+		title, keywords, sections = document_terms(document)
+		for term in title:
+			title_terms.setdefault(term, []).append(doc_id)
+		for term in keywords:
+			keyword_terms.setdefault(term, []).append(doc_id)
+		for term, count in sections.items():
+			section_terms.setdefault(term, {})[doc_id] = count
+
+	lookups = {
+		"title_terms": title_terms,
+		"keyword_terms": keyword_terms,
+		"section_terms": section_terms,
+	}
+	lookups.update(
+		build_filter_lookups(documents, [len(document.sections) for document in documents])
+	)
+	return lookups
+
+
+def build_filter_lookups(documents: List[Document], section_counts: List[int]) -> Dict[str, Any]:
+	"""
+	Build the per-document lookups used to filter and rank candidates.
+
+	Only document fields that are cheap to keep in memory are read, so
+	documents may be stubs without sections or keywords.
+
+	Args:
+		documents: Index documents, in index order
+		section_counts: Number of sections of every document
+
+	Returns:
+		Dictionary with section counts, priorities and authorities, the
+		priority and source bitmaps, and sorted path/modified arrays
+	"""
+	n_documents = len(documents)
+	priority_ids: Dict[str, List[int]] = {}
+	source_ids: Dict[str, List[int]] = {}
+	for doc_id, document in enumerate(documents):
+		priority_ids.setdefault(document.priority, []).append(doc_id)
+		source_ids.setdefault(document.source, []).append(doc_id)
+
+	path_order = sorted(range(n_documents), key=lambda i: documents[i].path)
+	modified_order = sorted(range(n_documents), key=lambda i: documents[i].modified)
+
+	return {
+		"section_counts": section_counts,
+		"priorities": [document.priority for document in documents],
+		"authorities": [document.authority for document in documents],
+		"priority_bitmaps": {
+			priority: ids_to_bitmap(ids, n_documents)
+			for priority, ids in priority_ids.items()
+		},
+		"source_bitmaps": {
+			source: ids_to_bitmap(ids, n_documents)
+			for source, ids in source_ids.items()
+		},
+		# Parallel arrays: sorted keys for bisect, and the matching doc ids
+		"sorted_paths": [documents[i].path for i in path_order],
+		"path_order": path_order,
+		"sorted_modified": [documents[i].modified for i in modified_order],
+		"modified_order": modified_order,
+	}
+
+
+def _source_signature(index_path: Path) -> Dict[str, int]:
+	"""Get the size and mtime of the JSON index a snapshot belongs to."""
+	stats = os.stat(index_path)
+	return {"size": stats.st_size, "mtime_ns": stats.st_mtime_ns}
+
+
+def write_snapshot(
+	index_path: Path, metadata: Dict[str, Any], documents: List[Document]
+) -> Path:
+	"""
+	Write the snapshot for an already saved JSON index.
+
+	The file is written to a temporary path and atomically renamed, so a
+	concurrent reader never sees a partial snapshot.
+
+	Args:
+		index_path: Path to the JSON index the snapshot mirrors
+		metadata: Index metadata
+		documents: Index documents
+
+	Returns:
+		Path of the written snapshot
+	"""
+	index_path = Path(index_path)
+	snapshot_path = snapshot_path_for(index_path)
+
+	header = {
+		"format": SNAPSHOT_FORMAT,
+		"cache_tag": sys.implementation.cache_tag,
+		"source": _source_signature(index_path),
+	}
+	body = {
+		"metadata": metadata,
+		# Records are stored as plain tuples, which marshal loads fastest
+		"documents": [document.to_tuple() for document in documents],
+		"lookups": build_lookups(documents),
+	}
+
+	# Layout: header length (4 bytes, little endian), header, body
+	header_bytes = marshal.dumps(header)
+	# Unique per process, so concurrent builds never write the same file
+	tmp_path = snapshot_path.with_name(f"{snapshot_path.name}.{os.getpid()}.tmp")
+	with open(tmp_path, "wb") as f:
+		f.write(len(header_bytes).to_bytes(HEADER_LENGTH_BYTES, "little"))
+		f.write(header_bytes)
+		f.write(marshal.dumps(body))
+	os.replace(tmp_path, snapshot_path)
+
+	return snapshot_path
+
+
+def load_snapshot(index_path: Path) -> Optional[Dict[str, Any]]:
+	"""
+	Load the snapshot of an index if it is present and up to date.
+
+	Args:
+		index_path: Path to the JSON index
+
+	Returns:
+		Snapshot body (metadata, documents, lookups), or None when the
+		snapshot is missing, stale or written by another Python version
+	"""
+	snapshot_path = snapshot_path_for(index_path)
+
+	try:
+		# One read plus marshal.loads is much faster than marshal.load(f)
+		with open(snapshot_path, "rb") as f:
+			data = f.read()
+
+		header_end = HEADER_LENGTH_BYTES + int.from_bytes(
+			data[:HEADER_LENGTH_BYTES], "little"
+		)
+		header = marshal.loads(data[HEADER_LENGTH_BYTES:header_end])
+		if (
+			not isinstance(header, dict)
+			or header.get("format") != SNAPSHOT_FORMAT
+			or header.get("cache_tag") != sys.implementation.cache_tag
+			or header.get("source") != _source_signature(index_path)
+		):
+			return None
+
+		body = marshal.loads(memoryview(data)[header_end:])
+		body["documents"] = [Document.from_tuple(values) for values in body["documents"]]
+		return body
+	except (OSError, EOFError, ValueError, TypeError):
+		return None
@@ -0,0 +1,493 @@
+#!/usr/bin/env python3
+"""
+SQLite Index Storage for RAG System
+
+This module stores the documentation index in a SQLite database (stdlib
+`sqlite3`) with FTS5 full-text tables, as an alternative to the monolithic
+JSON index:
+
+- the builder upserts only the documents whose content changed and
+  deletes removed ones, in a single transaction;
+- the database runs in WAL mode, so any number of readers query it while
+  a build writes, each seeing the last committed index;
+- queries are executed on disk, so the memory of the search engine does
+  not grow with the corpus.
+
+Scores are those of lexical scoring, computed from FTS5 hit counts per
+column and per section; `bm25()` ranks the documents of equal score. bm25
+alone cannot be thresholded: FTS5 floors the IDF of terms present in more
+than half of the documents, so common terms of a small corpus score ~0.
+
+Both full-text tables keep diacritics and treat `_` as a word character,
+matching the `\\w+` words of the query keywords.
+
+Tables:
+    metadata        key / JSON value pairs (index metadata, format)
+    documents       one row per document: path, title, priority, modified,
+                    source, authority, section count, content fingerprint,
+                    JSON record
+    documents_fts   FTS5 over title, keywords and body, with path and
+                    priority columns; rowid = documents.id
+    sections_fts    FTS5 over section title and content; rowid encodes the
+                    document id and the section index
+"""
+
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Any, Optional, Tuple
+
+from doc_records import Document
+from index_segments import document_fingerprint
+
+
+# Bump whenever the schema changes
+SQLITE_FORMAT = 1
+
+# Section rowids: document id in the high bits, section index in the low bits
+SECTION_ROWID_BITS = 20
+
+# bm25 weights of the title, keywords and body columns, mirroring the 0.3 /
+# 0.3 / 0.2 weights of lexical scoring
+DOCUMENT_WEIGHTS = (3.0, 3.0, 2.0)
+
+# SQLite virtual machine steps between two deadline checks
+PROGRESS_STEPS = 1000
+
+# Candidates scored per query, in bm25 order; results scored before a
+# deadline are kept
+SEARCH_BATCH_ROWS = 256
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (
+	key TEXT PRIMARY KEY,
+	value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS documents (
+	id INTEGER PRIMARY KEY,
+	path TEXT NOT NULL UNIQUE,
+	title TEXT NOT NULL,
+	priority TEXT NOT NULL,
+	modified TEXT NOT NULL,
+	source TEXT NOT NULL,
+	authority REAL NOT NULL,
+	section_count INTEGER NOT NULL,
+	fingerprint TEXT NOT NULL,
+	record TEXT NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(
+	title, keywords, body, path UNINDEXED, priority UNINDEXED,
+	tokenize = "unicode61 remove_diacritics 0 tokenchars '_'"
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS sections_fts USING fts5(
+	title, content,
+	tokenize = "unicode61 remove_diacritics 0 tokenchars '_'"
+);
+"""
+
+
+def match_expression(keywords: List[str], column: Optional[str] = None) -> str:
+	"""
+	Build an FTS5 query matching any of the keywords.
+
+	Args:
+		keywords: Query keywords
+		column: Column to restrict the match to, or None for all columns
+
+	Returns:
+		FTS5 MATCH expression with every keyword quoted as a string
+	"""
+	expression = " OR ".join('"' + keyword.replace('"', '""') + '"' for keyword in keywords)
+	return f"{{{column}}} : ({expression})" if column else expression
+
+
+class SqliteIndex:
+	"""Documentation index stored in a SQLite database with FTS5 tables."""
+
+	def __init__(
+		self,
+		path: str,
+		prior_score: Optional[Callable[[str, float], float]] = None,
+	):
+		"""
+		Initialize the index.
+
+		Args:
+			path: Database file
+			prior_score: Score of a document from its priority and authority,
+				added to its lexical score by search
+		"""
+		self.path = Path(path)
+		self.prior_score = prior_score
+		# Read connections, one per thread (sqlite3 connections are not shared)
+		self._local = threading.local()
+
+	def write(self, documents: List[Document], metadata: Dict[str, Any]) -> Dict[str, int]:
+		"""
+		Bring the database in line with a full build.
+
+		Documents whose fingerprint did not change are left untouched, and
+		paths that are no longer present are deleted. Everything happens in
+		one transaction, so readers see either the old or the new index.
+
+		Args:
+			documents: Complete list of documents from the latest build
+			metadata: Index metadata for the complete build
+
+		Returns:
+			Number of documents written, deleted and unchanged
+		"""
+		connection = sqlite3.connect(self.path)
+		try:
+			connection.execute("PRAGMA journal_mode=WAL")
+			connection.executescript(SCHEMA)
+
+			with connection:
+				existing = {
+					path: (document_id, fingerprint)
+					for document_id, path, fingerprint in connection.execute(
+						"SELECT id, path, fingerprint FROM documents"
+					)
+				}
+				stats = {"written": 0, "deleted": 0, "unchanged": 0}
+
+				for document in documents:
+					record = document.to_dict()
+					fingerprint = document_fingerprint(record)
+					previous = existing.pop(document.path, None)
+					if previous is not None and previous[1] == fingerprint:
+						stats["unchanged"] += 1
+						continue
+					self._write_document(connection, document, record, fingerprint, previous)
+					stats["written"] += 1
+
+				for document_id, _ in existing.values():
+					self._delete_document(connection, document_id)
+					stats["deleted"] += 1
+
+				connection.executemany(
+					"INSERT INTO metadata (key, value) VALUES (?, ?) "
+					"ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+					[
+						("format", json.dumps(SQLITE_FORMAT)),
+						("index", json.dumps(metadata, ensure_ascii=False)),
+					],
+				)
+		finally:
+			connection.close()
+
+		return stats
+
+	@staticmethod
+	def _write_document(
+		connection: sqlite3.Connection,
+		document: Document,
+		record: Dict[str, Any],
+		fingerprint: str,
+		previous: Optional[Tuple[int, str]],
+	) -> None:
+		"""Insert or replace one document and its full-text rows."""
+		if len(document.sections) >= 1 << SECTION_ROWID_BITS:
+			raise ValueError(f"Too many sections in {document.path} for the SQLite index")
+
+		values = (
+			document.title,
+			document.priority,
+			document.modified,
+			document.source,
+			document.authority,
+			len(document.sections),
+			fingerprint,
+			json.dumps(record, ensure_ascii=False),
+		)
+		if previous is None:
+			document_id = connection.execute(
+				"INSERT INTO documents "
+				"(path, title, priority, modified, source, authority, section_count, "
+				"fingerprint, record) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+				(document.path,) + values,
+			).lastrowid
+		else:
+			# Updating in place keeps the id, and with it the tie order
+			document_id = previous[0]
+			connection.execute(
+				"UPDATE documents SET title = ?, priority = ?, modified = ?, source = ?, "
+				"authority = ?, section_count = ?, fingerprint = ?, record = ? WHERE id = ?",
+				values + (document_id,),
+			)
+			SqliteIndex._delete_full_text(connection, document_id)
+
+		connection.execute(
+			"INSERT INTO documents_fts (rowid, title, keywords, body, path, priority) "
+			"VALUES (?, ?, ?, ?, ?, ?)",
+			(
+				document_id,
+				document.title,
+				" ".join(document.keywords),
+				"\n".join(section.title + "\n" + section.content for section in document.sections),
+				document.path,
+				document.priority,
+			),
+		)
+		connection.executemany(
+			"INSERT INTO sections_fts (rowid, title, content) VALUES (?, ?, ?)",
+			[
+				((document_id << SECTION_ROWID_BITS) | index, section.title, section.content)
+				for index, section in enumerate(document.sections)
+			],
+		)
+
+	@staticmethod
+	def _delete_full_text(connection: sqlite3.Connection, document_id: int) -> None:
+		"""Delete the full-text rows of a document."""
+		connection.execute("DELETE FROM documents_fts WHERE rowid = ?", (document_id,))
+		connection.execute(
+			"DELETE FROM sections_fts WHERE rowid BETWEEN ? AND ?",
+			(
+				document_id << SECTION_ROWID_BITS,
+				((document_id + 1) << SECTION_ROWID_BITS) - 1,
+			),
+		)
+
+	@staticmethod
+	def _delete_document(connection: sqlite3.Connection, document_id: int) -> None:
+		"""Delete a document and its full-text rows."""
+		SqliteIndex._delete_full_text(connection, document_id)
+		connection.execute("DELETE FROM documents WHERE id = ?", (document_id,))
+
+	def reader(self) -> sqlite3.Connection:
+		"""
+		Get the read connection of the calling thread.
+
+		Returns:
+			Query-only connection with the prior_score SQL function
+		"""
+		connection = getattr(self._local, "connection", None)
+		if connection is None:
+			connection = sqlite3.connect(self.path)
+			connection.execute("PRAGMA query_only = ON")
+			if self.prior_score is not None:
+				connection.create_function(
+					"prior_score", 2, self.prior_score, deterministic=True
+				)
+			self._local.connection = connection
+		return connection
+
+	def read_metadata(self) -> Dict[str, Any]:
+		"""
+		Read the index metadata.
+
+		Returns:
+			Metadata of the last build
+
+		Raises:
+			ValueError: If the database is not a SQLite index of this format
+		"""
+		try:
+			values = dict(self.reader().execute("SELECT key, value FROM metadata"))
+		except sqlite3.DatabaseError as e:
+			raise ValueError(f"Not a SQLite documentation index: {self.path} ({e})") from None
+		if json.loads(values.get("format", "null")) != SQLITE_FORMAT:
+			raise ValueError(f"Unsupported SQLite index format in {self.path}, rebuild the index")
+		return json.loads(values.get("index", "{}"))
+
+	def document(self, document_id: int) -> Document:
+		"""Read a document by id."""
+		row = self.reader().execute(
+			"SELECT record FROM documents WHERE id = ?", (document_id,)
+		).fetchone()
+		return Document.from_dict(json.loads(row[0]))
+
+	def document_by_path(self, path: str) -> Optional[Document]:
+		"""Read a document by path, or None if it is not in the index."""
+		row = self.reader().execute(
+			"SELECT record FROM documents WHERE path = ?", (path,)
+		).fetchone()
+		return Document.from_dict(json.loads(row[0])) if row else None
+
+	def documents(self) -> "SqliteDocuments":
+		"""Get the documents as a sized iterable read on demand."""
+		return SqliteDocuments(self)
+
+	def search(
+		self,
+		keywords: List[str],
+		filters: Optional[Dict[str, Any]],
+		min_score: float,
+		limit: int,
+		deadline: Optional[float] = None,
+	) -> Tuple[List[Tuple[int, float]], bool]:
+		"""
+		Rank the documents matching any keyword, on disk.
+
+		Scores follow DocumentationSearchEngine.calculate_relevance_score:
+		0.3 per share of keywords in the title and in the keywords, 0.2 for
+		the share of (section, keyword) matches, plus the prior score,
+		capped at 1.0. Documents matching no keyword are not returned.
+
+		Candidates are scored in slices of SEARCH_BATCH_ROWS, best bm25
+		first. A deadline stops the search between or within slices, and
+		the documents scored so far are ranked.
+
+		Args:
+			keywords: Query keywords
+			filters: Normalized filters (see DocumentationSearchEngine.normalize_filters)
+			min_score: Minimum score threshold
+			limit: Maximum number of documents to return
+			deadline: perf_counter() time at which the query is interrupted
+
+		Returns:
+			(document id, score) best first, then by bm25 and id, and whether
+			every candidate was scored before the deadline
+		"""
+		conditions = []
+		filter_parameters: List[Any] = []
+		if filters:
+			for column in ("priority", "source"):
+				if filters.get(column):
+					conditions.append(
+						f"d.{column} IN ({', '.join('?' * len(filters[column]))})"
+					)
+					filter_parameters.extend(filters[column])
+			if filters.get("path_prefix"):
+				conditions.append("substr(d.path, 1, ?) = ?")
+				filter_parameters.extend([len(filters["path_prefix"]), filters["path_prefix"]])
+			if filters.get("modified_since"):
+				conditions.append("d.modified >= ?")
+				filter_parameters.append(filters["modified_since"])
+			if filters.get("modified_before"):
+				conditions.append("d.modified < ?")
+				filter_parameters.append(filters["modified_before"])
+
+		# One hit per keyword found in a column (or section) of a candidate of
+		# the slice: a UNION ALL of per-keyword matches, counted per document
+		def hits(table: str, id_expression: str) -> str:
+			return " UNION ALL ".join(
+				[
+					f"SELECT {id_expression} AS id FROM {table} WHERE {table} MATCH ? "
+					f"AND {id_expression} IN (SELECT id FROM candidates)"
+				] * len(keywords)
+			)
+
+		hit_parameters: List[Any] = []
+		hit_parameters.extend(match_expression([keyword], "title") for keyword in keywords)
+		hit_parameters.extend(match_expression([keyword], "keywords") for keyword in keywords)
+		hit_parameters.extend(match_expression([keyword]) for keyword in keywords)
+
+		n_keywords = float(len(keywords))
+		weights = ", ".join(str(weight) for weight in DOCUMENT_WEIGHTS)
+		# Filters are returned rather than applied, so a short slice means
+		# the last one
+		sql = f"""
+			WITH
+				candidates AS (
+					SELECT rowid AS id, bm25(documents_fts, {weights}) AS rank
+					FROM documents_fts WHERE documents_fts MATCH ?
+					ORDER BY rank, rowid
+					LIMIT ? OFFSET ?
+				),
+				title_hits AS (
+					SELECT id, COUNT(*) AS hits FROM ({hits("documents_fts", "rowid")})
+					GROUP BY id
+				),
+				keyword_hits AS (
+					SELECT id, COUNT(*) AS hits FROM ({hits("documents_fts", "rowid")})
+					GROUP BY id
+				),
+				section_hits AS (
+					SELECT id, COUNT(*) AS hits
+					FROM ({hits("sections_fts", f"(rowid >> {SECTION_ROWID_BITS})")})
+					GROUP BY id
+				)
+			SELECT
+				d.id,
+				MIN(
+					IFNULL(t.hits, 0) / {n_keywords} * 0.3
+					+ IFNULL(k.hits, 0) / {n_keywords} * 0.3
+					+ CASE WHEN d.section_count > 0
+						THEN MIN(IFNULL(s.hits, 0) / ({n_keywords} * d.section_count), 1.0) * 0.2
+						ELSE 0.0 END
+					+ prior_score(d.priority, d.authority),
+					1.0
+				) AS score,
+				c.rank,
+				{" AND ".join(conditions) if conditions else "1"} AS allowed
+			FROM candidates AS c
+			JOIN documents AS d ON d.id = c.id
+			LEFT JOIN title_hits AS t ON t.id = d.id
+			LEFT JOIN keyword_hits AS k ON k.id = d.id
+			LEFT JOIN section_hits AS s ON s.id = d.id
+		"""
+
+		connection = self.reader()
+		if deadline is not None:
+			connection.set_progress_handler(
+				lambda: time.perf_counter() >= deadline, PROGRESS_STEPS
+			)
+		scored = []
+		complete = True
+		try:
+			offset = 0
+			while True:
+				if deadline is not None and time.perf_counter() >= deadline:
+					complete = False
+					break
+				parameters = [match_expression(keywords), SEARCH_BATCH_ROWS, offset]
+				parameters += hit_parameters + filter_parameters
+				try:
+					rows = connection.execute(sql, parameters).fetchall()
+				except sqlite3.OperationalError as e:
+					if deadline is None or "interrupted" not in str(e):
+						raise
+					complete = False
+					break
+				scored.extend(
+					(score, rank, document_id)
+					for document_id, score, rank, allowed in rows
+					if allowed and score >= min_score
+				)
+				if len(rows) < SEARCH_BATCH_ROWS:
+					break
+				offset += SEARCH_BATCH_ROWS
+		finally:
+			if deadline is not None:
+				connection.set_progress_handler(None, 0)
+
+		scored.sort(key=lambda row: (-row[0], row[1], row[2]))
+		return [(document_id, score) for score, _, document_id in scored[:limit]], complete
+
+	def matching_sections(self, document_id: int, keywords: List[str], limit: int) -> List[int]:
+		"""
+		Rank the sections of a document matching any keyword.
+
+		Args:
+			document_id: Document id
+			keywords: Query keywords
+			limit: Maximum number of sections
+
+		Returns:
+			Section indexes, best bm25 first
+		"""
+		first = document_id << SECTION_ROWID_BITS
+		rows = self.reader().execute(
+			"SELECT rowid FROM sections_fts WHERE sections_fts MATCH ? "
+			"AND rowid BETWEEN ? AND ? ORDER BY rank LIMIT ?",
+			(match_expression(keywords), first, first + (1 << SECTION_ROWID_BITS) - 1, limit),
+		)
+		return [rowid - first for (rowid,) in rows]
+
+
+class SqliteDocuments:
+	"""Documents of a SQLite index, counted and iterated on demand."""
+
+	def __init__(self, index: SqliteIndex):
+		self.index = index
+
+	def __len__(self) -> int:
+		return self.index.reader().execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+
+	def __iter__(self) -> Iterator[Document]:
+		for (record,) in self.index.reader().execute("SELECT record FROM documents ORDER BY id"):
+			yield Document.from_dict(json.loads(record))
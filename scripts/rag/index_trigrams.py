@@ -0,0 +1,467 @@
+#!/usr/bin/env python3
+"""
+Trigram Index for RAG System
+
+Word postings only answer whole-word queries. Identifiers such as
+`useTagStore`, file paths or command names need substring and regex
+queries, which would otherwise scan every section.
+
+A trigram index maps every three-character sequence of the case-folded
+document titles and section texts to the entries containing it. A query is
+narrowed to the entries holding every trigram of its required literals
+(posting intersection), and only those are checked for an actual match, as
+code search tools do.
+
+Entries are numbered in document order: each document contributes its title,
+then its sections. Postings are delta and variable-byte encoded.
+
+The builder writes the index next to the JSON index (`.doc-index.trigrams`),
+stamped like the snapshot with the size and mtime of the JSON file; when it
+is missing or stale, the engine builds it in memory on first use.
+"""
+
+import marshal
+import os
+import sys
+from bisect import bisect_right
+from itertools import accumulate
+from pathlib import Path
+from typing import Dict, Iterable, List, Any, Optional, Tuple
+
+from doc_records import Document, Section
+from index_postings import decode_varbytes, encode_varbyte
+
+
+# Bump whenever the layout of the trigram file changes
+TRIGRAM_FORMAT = 1
+
+TRIGRAM_SUFFIX = ".trigrams"
+
+# Non-ASCII characters that case-insensitive regexes match with ASCII letters,
+# folded so that a regex literal's trigrams are always found in the index
+CASE_FOLD = str.maketrans({"\u0130": "i", "\u0131": "i", "\u017f": "s", "\u212a": "k"})
+
+
+def fold_case(text: str) -> str:
+	"""
+	Lowercase text the way the trigram index does.
+
+	Args:
+		text: Text to fold
+
+	Returns:
+		Lowercased text, of the same length as the input
+	"""
+	return text.translate(CASE_FOLD).lower()
+
+
+def trigrams_path_for(index_path: Path) -> Path:
+	"""
+	Get the trigram index path that belongs to an index file.
+
+	Args:
+		index_path: Path to the JSON index
+
+	Returns:
+		Path of the trigram file (e.g. docs/.doc-index.trigrams)
+	"""
+	return Path(index_path).with_suffix(TRIGRAM_SUFFIX)
+
+
+def section_search_text(section: Section) -> str:
+	"""Get the text of a section matched by substring and regex queries."""
+	return section.title + "\n" + section.content
+
+
+def text_trigrams(text: str) -> set:
+	"""
+	Get the distinct trigrams of a text.
+
+	Args:
+		text: Text to index, folded by the caller (see fold_case)
+
+	Returns:
+		Set of three-character strings
+	"""
+	return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def build_trigrams(documents: Iterable[Document]) -> Dict[str, Any]:
+	"""
+	Build the trigram index of documents.
+
+	Args:
+		documents: Documents in index order (may be a lazy iterable)
+
+	Returns:
+		Dictionary with the first entry id of every document ("starts") and
+		the encoded postings of every trigram ("postings")
+	"""
+	starts: List[int] = []
+	postings: Dict[str, List[int]] = {}
+	entry_id = 0
+
+	for document in documents:
+		starts.append(entry_id)
+		texts = [document.title] + [section_search_text(s) for s in document.sections]
+		for text in texts:
+			for trigram in text_trigrams(fold_case(text)):
+				postings.setdefault(trigram, []).append(entry_id)
+			entry_id += 1
+
+	encoded: Dict[str, bytes] = {}
+	for trigram, entry_ids in postings.items():
+		out = bytearray()
+		previous = 0
+		for value in entry_ids:
+			encode_varbyte(value - previous, out)
+			previous = value
+		encoded[trigram] = bytes(out)
+
+	return {"starts": starts, "entries": entry_id, "postings": encoded}
+
+
+def _index_signature(index_path: Path) -> Dict[str, int]:
+	"""Get the size and mtime of the JSON index a trigram file belongs to."""
+	stats = os.stat(index_path)
+	return {"size": stats.st_size, "mtime_ns": stats.st_mtime_ns}
+
+
+def write_trigrams(index_path: Path, documents: List[Document]) -> Path:
+	"""
+	Write the trigram index for an already saved JSON index.
+
+	Args:
+		index_path: Path to the JSON index the trigram index mirrors
+		documents: Index documents, in index order
+
+	Returns:
+		Path of the written trigram file
+	"""
+	index_path = Path(index_path)
+	trigrams_path = trigrams_path_for(index_path)
+
+	data = build_trigrams(documents)
+	data.update(
+		format=TRIGRAM_FORMAT,
+		cache_tag=sys.implementation.cache_tag,
+		source=_index_signature(index_path),
+	)
+
+	# Unique per process, so concurrent builds never write the same file
+	tmp_path = trigrams_path.with_name(f"{trigrams_path.name}.{os.getpid()}.tmp")
+	with open(tmp_path, "wb") as f:
+		f.write(marshal.dumps(data))
+	os.replace(tmp_path, trigrams_path)
+
+	return trigrams_path
+
+
+def load_trigrams(index_path: Path) -> Optional[Dict[str, Any]]:
+	"""
+	Load the trigram index of an index file if it is present and up to date.
+
+	Args:
+		index_path: Path to the JSON index
+
+	Returns:
+		Trigram index (see build_trigrams), or None when the file is missing,
+		stale or written by another Python version
+	"""
+	try:
+		with open(trigrams_path_for(index_path), "rb") as f:
+			data = marshal.loads(f.read())
+		if (
+			not isinstance(data, dict)
+			or data.get("format") != TRIGRAM_FORMAT
+			or data.get("cache_tag") != sys.implementation.cache_tag
+			or data.get("source") != _index_signature(index_path)
+		):
+			return None
+		return data
+	except (OSError, EOFError, ValueError, TypeError):
+		return None
+
+
+def entry_location(trigrams: Dict[str, Any], entry_id: int) -> Tuple[int, int]:
+	"""
+	Map an entry id to its document and section.
+
+	Args:
+		trigrams: Trigram index
+		entry_id: Entry id
+
+	Returns:
+		(document position, section index), with section index -1 for the
+		document title
+	"""
+	starts = trigrams["starts"]
+	position = bisect_right(starts, entry_id) - 1
+	return position, entry_id - starts[position] - 1
+
+
+def substring_query(needle: str) -> Optional[Tuple[str, List[Any]]]:
+	"""
+	Get the trigram query of a case-insensitive substring.
+
+	Args:
+		needle: Substring to find
+
+	Returns:
+		Query for candidate_entries, or None if the needle is too short to
+		narrow anything
+	"""
+	needle = fold_case(needle)
+	return ("all", [needle]) if len(needle) >= 3 else None
+
+
+def regex_query(pattern: str) -> Optional[Tuple[str, List[Any]]]:
+	"""
+	Get the trigram query implied by a regex.
+
+	The extraction is conservative: literal runs outside groups and
+	character classes are required, top-level alternatives are OR-ed, and
+	anything else (groups, classes, optional characters, non-ASCII
+	literals) only ends the current run. Patterns in verbose mode must not
+	be passed here, since their literal whitespace is not matched.
+
+	Args:
+		pattern: Regular expression, matched case-insensitively
+
+	Returns:
+		Query for candidate_entries, or None if the regex has no required
+		literal of three characters or more
+	"""
+	branches = [_branch_literals(branch) for branch in _split_alternatives(pattern)]
+	if any(not literals for literals in branches):
+		return None
+	if len(branches) == 1:
+		return ("all", branches[0])
+	return ("any", [("all", literals) for literals in branches])
+
+
+def _split_alternatives(pattern: str) -> List[str]:
+	"""Split a regex on its top-level `|` operators."""
+	branches = []
+	depth = 0
+	in_class = False
+	start = 0
+	i = 0
+	while i < len(pattern):
+		char = pattern[i]
+		if char == "\\":
+			i += 2
+			continue
+		if in_class:
+			in_class = char != "]"
+		elif char == "[":
+			in_class = True
+			# A `]` right after `[` or `[^` is a literal
+			if pattern[i + 1:i + 2] == "^":
+				i += 1
+			if pattern[i + 1:i + 2] == "]":
+				i += 1
+		elif char == "(":
+			depth += 1
+		elif char == ")":
+			depth -= 1
+		elif char == "|" and depth == 0:
+			branches.append(pattern[start:i])
+			start = i + 1
+		i += 1
+	branches.append(pattern[start:])
+	return branches
+
+
+def _skip_group(pattern: str, i: int) -> int:
+	"""Get the index following the group or character class starting at i."""
+	depth = 0
+	in_class = False
+	while i < len(pattern):
+		char = pattern[i]
+		if char == "\\":
+			i += 2
+			continue
+		if in_class:
+			in_class = char != "]"
+		elif char == "[":
+			in_class = True
+			if pattern[i + 1:i + 2] == "^":
+				i += 1
+			if pattern[i + 1:i + 2] == "]":
+				i += 1
+			if depth == 0:
+				# A top-level class ends at its closing bracket
+				i += 1
+				while i < len(pattern) and in_class:
+					if pattern[i] == "\\":
+						i += 1
+					elif pattern[i] == "]":
+						in_class = False
+					i += 1
+				return i
+		elif char == "(":
+			depth += 1
+		elif char == ")":
+			depth -= 1
+			if depth == 0:
+				return i + 1
+		i += 1
+	return i
+
+
+def _escape_literal(pattern: str, i: int) -> Tuple[Optional[str], int]:
+	"""
+	Read the escape sequence starting with the backslash at i.
+
+	Args:
+		pattern: Regular expression
+		i: Index of the backslash
+
+	Returns:
+		The character the escape matches, or None for class escapes,
+		anchors, backreferences and named characters, and the index
+		following the whole escape
+	"""
+	escaped = pattern[i + 1:i + 2]
+	if escaped in ("x", "u", "U"):
+		digits = {"x": 2, "u": 4, "U": 8}[escaped]
+		code = pattern[i + 2:i + 2 + digits]
+		end = i + 2 + digits
+		try:
+			return chr(int(code, 16)), end
+		except ValueError:
+			return None, end
+	if escaped == "N":
+		# \N{NAME}: flushed rather than looked up
+		end = pattern.find("}", i)
+		return None, len(pattern) if end < 0 else end + 1
+	if escaped.isdigit():
+		# Same rules as re: \0 plus up to two octal digits, or three octal
+		# digits, is an octal escape; otherwise one or two digits refer to a group
+		octal = "01234567"
+		end = i + 2
+		if escaped == "0":
+			while end < i + 4 and pattern[end:end + 1] and pattern[end] in octal:
+				end += 1
+			return chr(int(pattern[i + 1:end], 8)), end
+		digits = pattern[i + 1:i + 4]
+		if len(digits) == 3 and all(d in octal for d in digits):
+			return chr(int(digits, 8)), i + 4
+		if pattern[end:end + 1].isdigit():
+			end += 1
+		return None, end
+	if not escaped or escaped.isalnum():
+		# Class escapes and anchors
+		return None, i + 2
+	return escaped, i + 2
+
+
+def _branch_literals(branch: str) -> List[str]:
+	"""Get the lowercased literal runs (3+ characters) a regex branch requires."""
+	literals: List[str] = []
+	run: List[str] = []
+
+	def flush() -> None:
+		if len(run) >= 3:
+			literals.append("".join(run))
+		run.clear()
+
+	i = 0
+	while i < len(branch):
+		char = branch[i]
+		if char == "\\":
+			literal, i = _escape_literal(branch, i)
+			if literal is None:
+				flush()
+				continue
+		elif char in "([":
+			flush()
+			i = _skip_group(branch, i)
+			continue
+		elif char in ".^$)":
+			flush()
+			i += 1
+			continue
+		elif char in "*?{":
+			# The quantified character may be absent
+			if run:
+				run.pop()
+			flush()
+			if char == "{":
+				end = branch.find("}", i)
+				i = len(branch) if end < 0 else end + 1
+			else:
+				i += 1
+			continue
+		elif char == "+":
+			# The character occurs at least once, but may repeat
+			flush()
+			i += 1
+			continue
+		else:
+			literal = char
+			i += 1
+
+		if not literal.isascii():
+			flush()
+			continue
+		run.append(literal.lower())
+
+	flush()
+	return literals
+
+
+def _literal_entries(trigrams: Dict[str, Any], literal: str) -> set:
+	"""Intersect the postings of the trigrams of a literal."""
+	postings = trigrams["postings"]
+	encoded = []
+	for trigram in text_trigrams(literal):
+		data = postings.get(trigram)
+		if data is None:
+			return set()
+		encoded.append(data)
+
+	# Shortest postings first, so the intersection shrinks fastest
+	encoded.sort(key=len)
+	entries = set(accumulate(decode_varbytes(encoded[0])))
+	for data in encoded[1:]:
+		if not entries:
+			break
+		entries.intersection_update(accumulate(decode_varbytes(data)))
+	return entries
+
+
+def candidate_entries(
+	trigrams: Dict[str, Any], query: Optional[Tuple[str, List[Any]]]
+) -> Optional[set]:
+	"""
+	Evaluate a trigram query.
+
+	Args:
+		trigrams: Trigram index
+		query: Query from substring_query or regex_query: ("all", parts) or
+			("any", parts), whose parts are literals or nested queries
+
+	Returns:
+		Ids of the entries that may match, or None if every entry may match
+	"""
+	if query is None:
+		return None
+
+	operator, parts = query
+	results = [
+		_literal_entries(trigrams, part) if isinstance(part, str) else candidate_entries(trigrams, part)
+		for part in parts
+	]
+
+	if operator == "any":
+		if any(result is None for result in results):
+			return None
+		return set().union(*results)
+
+	entries = None
+	for result in results:
+		if result is not None:
+			entries = result if entries is None else entries & result
+	return entries
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Query Log Replay Load Tester for RAG System
+
+This script replays a query log recorded by the search engine (see the
+`query_log` option of DocumentationSearchEngine) at a target rate with
+concurrent workers, and reports throughput, latency percentiles and the
+slowest queries.
+
+The load is open-loop: query i is issued at start + i / rate whether or
+not earlier queries have finished, so a slow engine shows up as growing
+response times (service time plus queueing delay) instead of silently
+lowering the offered rate.
+
+Usage:
+    RAG_QUERY_LOG=queries.jsonl python scripts/rag/search_documentation.py "tags"
+    python scripts/rag/replay_queries.py queries.jsonl
+    python scripts/rag/replay_queries.py queries.jsonl --rate 50 --workers 4 --processes
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
+
+from evaluate_search import percentile
+from search_documentation import DocumentationSearchEngine
+
+
+# Operations recorded by the engine
+OPERATIONS = ("search", "related")
+
+# Engine of the current worker: shared by the threads, one per process
+_engine: Optional[DocumentationSearchEngine] = None
+
+
+def load_query_log(log_path: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+	"""
+	Load the records of a query log.
+
+	Lines that are not valid records (e.g. a line cut short by a crash) are
+	skipped.
+
+	Args:
+		log_path: JSON lines file written by the search engine
+		limit: Maximum number of records to load
+
+	Returns:
+		Query records in log order
+	"""
+	records = []
+	with open(log_path, "r", encoding="utf-8") as f:
+		for line in f:
+			try:
+				record = json.loads(line)
+			except ValueError:
+				continue
+			if not isinstance(record, dict) or record.get("operation") not in OPERATIONS:
+				continue
+			records.append(record)
+			if limit is not None and len(records) >= limit:
+				break
+
+	return records
+
+
+def _init_worker(index_path: str, scoring_mode: str, overlay_path: Optional[str]) -> None:
+	"""Load the engine of a worker process."""
+	global _engine
+	_engine = DocumentationSearchEngine(
+		index_path, scoring_mode=scoring_mode, verbose=False, overlay_path=overlay_path
+	)
+
+
+def run_record(record: Dict[str, Any]) -> Tuple[float, int]:
+	"""
+	Run one logged query against the worker engine.
+
+	Args:
+		record: Query record
+
+	Returns:
+		(service time in ms, number of results)
+	"""
+	params = record.get("params", {})
+	start = time.perf_counter()
+	if record["operation"] == "related":
+		results = _engine.find_related_documents(record["query"], **params)
+	else:
+		results = _engine.search(record["query"], **params)
+	return (time.perf_counter() - start) * 1000, len(results)
+
+
+def replay(
+	records: List[Dict[str, Any]],
+	index_path: str = "docs/.doc-index.json",
+	rate: float = 0.0,
+	workers: int = 4,
+	processes: bool = False,
+	scoring_mode: str = "indexed",
+	overlay_path: Optional[str] = None,
+	slowest: int = 5,
+) -> Dict[str, Any]:
+	"""
+	Replay query records against the engine under concurrent load.
+
+	Args:
+		records: Query records from load_query_log
+		index_path: Path to the documentation index
+		rate: Target queries per second, 0 to issue them as fast as possible
+		workers: Number of concurrent workers
+		processes: Use worker processes (one engine each) instead of threads
+			sharing one engine
+		scoring_mode: Scoring mode of DocumentationSearchEngine
+		overlay_path: Optional overlay index
+		slowest: Number of slowest queries to report
+
+	Returns:
+		Report with throughput, service and response time percentiles,
+		errors, result count mismatches and the slowest queries
+	"""
+	init_args = (index_path, scoring_mode, overlay_path)
+	if processes:
+		executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=init_args)
+		# Start every worker (and load its engine) before the clock starts
+		list(executor.map(time.sleep, [0] * workers))
+	else:
+		_init_worker(*init_args)
+		executor = ThreadPoolExecutor(workers)
+
+	outcomes: List[Optional[Tuple[float, float, int]]] = [None] * len(records)
+	errors: List[Dict[str, Any]] = []
+	lock = threading.Lock()
+
+	def on_done(index: int, due: float, future) -> None:
+		"""Record the outcome of a query when its future completes."""
+		response_ms = (time.perf_counter() - due) * 1000
+		try:
+			service_ms, result_count = future.result()
+		except Exception as e:
+			with lock:
+				errors.append({"query": records[index]["query"], "error": str(e)})
+			return
+		outcomes[index] = (service_ms, response_ms, result_count)
+
+	with executor:
+		start = time.perf_counter()
+		for index, record in enumerate(records):
+			due = start + index / rate if rate > 0 else time.perf_counter()
+			delay = due - time.perf_counter()
+			if delay > 0:
+				time.sleep(delay)
+			future = executor.submit(run_record, record)
+			future.add_done_callback(
+				lambda future, index=index, due=due: on_done(index, due, future)
+			)
+	elapsed = time.perf_counter() - start
+
+	completed = [
+		(index, outcome) for index, outcome in enumerate(outcomes) if outcome is not None
+	]
+	service_ms = [outcome[0] for _, outcome in completed]
+	response_ms = [outcome[1] for _, outcome in completed]
+	mismatches = sum(
+		1
+		for index, outcome in completed
+		if "results" in records[index] and records[index]["results"] != outcome[2]
+	)
+	slowest_queries = sorted(completed, key=lambda item: -item[1][0])[:slowest]
+
+	return {
+		"queries": len(records),
+		"completed": len(completed),
+		"errors": errors,
+		"workers": workers,
+		"executor": "processes" if processes else "threads",
+		"target_rate": rate,
+		"duration_s": elapsed,
+		"throughput_qps": len(completed) / elapsed if elapsed > 0 else 0.0,
+		"service_ms": _latency_summary(service_ms),
+		"response_ms": _latency_summary(response_ms),
+		"result_mismatches": mismatches,
+		"slowest": [
+			{
+				"operation": records[index]["operation"],
+				"query": records[index]["query"],
+				"params": records[index].get("params", {}),
+				"service_ms": outcome[0],
+				"logged_ms": records[index].get("latency_ms"),
+			}
+			for index, outcome in slowest_queries
+		],
+	}
+
+
+def _latency_summary(values: List[float]) -> Dict[str, float]:
+	"""Summarize latencies with percentiles and the maximum."""
+	return {
+		"p50": percentile(values, 50),
+		"p90": percentile(values, 90),
+		"p99": percentile(values, 99),
+		"max": max(values, default=0.0),
+	}
+
+
+def print_report(report: Dict[str, Any]) -> None:
+	"""Print a replay report."""
+	target = f"{report['target_rate']:.1f} q/s" if report["target_rate"] > 0 else "unbounded"
+	print(
+		f"Replayed {report['completed']}/{report['queries']} queries with "
+		f"{report['workers']} {report['executor']} (target rate: {target})"
+	)
+	print(f"  Duration: {report['duration_s']:.2f} s")
+	print(f"  Throughput: {report['throughput_qps']:.1f} q/s")
+	if report["errors"]:
+		print(f"  ⚠️  Errors: {len(report['errors'])} (first: {report['errors'][0]['error']})")
+	if report["result_mismatches"]:
+		print(f"  ⚠️  Result counts differing from the log: {report['result_mismatches']}")
+
+	header = f"\n  {'Latency':<10} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8}"
+	print(header)
+	print("  " + "-" * (len(header) - 3))
+	for name, key in [("Service", "service_ms"), ("Response", "response_ms")]:
+		summary = report[key]
+		print(
+			f"  {name:<10} {summary['p50']:>8.2f} {summary['p90']:>8.2f} "
+			f"{summary['p99']:>8.2f} {summary['max']:>8.2f}"
+		)
+
+	print("\n  Slowest queries:")
+	for i, query in enumerate(report["slowest"], 1):
+		logged = f", logged {query['logged_ms']:.2f} ms" if query["logged_ms"] is not None else ""
+		print(
+			f"    {i}. [{query['operation']}] {query['query']!r} - "
+			f"{query['service_ms']:.2f} ms{logged}"
+		)
+
+
+def main():
+	"""Main entry point."""
+	parser = argparse.ArgumentParser(description="Replay a RAG query log under load")
+	parser.add_argument("log", help="Query log written with --query-log / RAG_QUERY_LOG")
+	parser.add_argument("--index", default="docs/.doc-index.json")
+	parser.add_argument("--overlay", help="Overlay index searched on top of --index")
+	parser.add_argument("--rate", type=float, default=0.0, help="Target queries per second (0: unbounded)")
+	parser.add_argument("--workers", type=int, default=4)
+	parser.add_argument("--processes", action="store_true", help="Use worker processes instead of threads")
+	parser.add_argument("--limit", type=int, help="Replay at most this many queries")
+	parser.add_argument("--slowest", type=int, default=5, help="Number of slowest queries to report")
+	parser.add_argument(
+		"--mode",
+		default="indexed",
+		choices=DocumentationSearchEngine.SCORING_MODES,
+		help="Scoring mode of the engine",
+	)
+	parser.add_argument("--json", action="store_true", help="Print a JSON report")
+	args = parser.parse_args()
+
+	try:
+		records = load_query_log(args.log, args.limit)
+		if not records:
+			raise ValueError(f"No query records in {args.log}")
+		report = replay(
+			records,
+			args.index,
+			args.rate,
+			args.workers,
+			args.processes,
+			args.mode,
+			args.overlay,
+			args.slowest,
+		)
+	except (FileNotFoundError, ValueError) as e:
+		print(f"❌ Error: {e}")
+		sys.exit(1)
+
+	if args.json:
+		print(json.dumps(report, indent=2))
+	else:
+		print("⏱️  Query Replay - Lumina Portfolio RAG System\n")
+		print_report(report)
+
+
+if __name__ == "__main__":
+	main()
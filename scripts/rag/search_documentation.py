@@ -4,61 +4,706 @@ Documentation Search Engine for RAG System
 
 This script provides search functionality over the documentation index,
 implementing lexical keyword search with word boundary detection and
-multi-factor ranking.
+multi-factor ranking (lexical matches, path priority and the link-graph
+authority computed by the builder).
 
 Current implementation: Lexical keyword matching only
 Future enhancement: Semantic search with embeddings (planned for v1.1)
 
 Usage:
     python scripts/rag/search_documentation.py "your query here"
+
+Startup is kept cheap for one-shot CLI calls: the index is loaded from the
+marshal snapshot written by the builder when it is up to date, and modules
+only needed on the JSON fallback path are imported lazily.
+
+A branch or worktree can search a shared base index together with a small
+overlay built from its `git diff` (`build_doc_index.py --overlay`): overlay
+documents shadow base documents of the same path, and its tombstones hide
+deleted ones.
+
+Around a matching section, expand_section returns its subtree, parent or
+siblings within a token budget, using the section tree stored by the
+builder.
+
+Pointed at the metadata file (`--index docs/.doc-metadata.json`), the engine
+searches two tiers: candidates are selected on the compact metadata, and
+only the best ones are read, by byte offset, from the full index.
+
+With a `deadline_ms` or `max_work` budget, search visits documents in
+descending prior order (priority and authority) and returns the best
+results found when the budget runs out, flagged as partial.
+
+A SQLite index (`build_doc_index.py --sqlite`) is queried on disk with FTS5
+instead of being loaded; bm25 orders documents of equal score and ranks
+their matching sections (see index_sqlite.py).
+
+Queries prefixed with `substring:` or `regex:` match identifiers, paths and
+code snippets anywhere in titles and sections, case-insensitively; their
+candidates are narrowed with the trigram index of index_trigrams.py.
+
+Queries can be logged as JSON lines (`query_log`, or `--query-log` /
+RAG_QUERY_LOG on the CLI) and replayed under load with replay_queries.py.
 """
 
-import json
+import heapq
+import os
 import re
 import sys
+import time
 from pathlib import Path
-from typing import Dict, List, Any
-from collections import Counter
+from bisect import bisect_left
+from typing import Dict, Iterable, List, Any, Optional, Tuple
+
+from doc_records import Document, LazyDocuments, Section, documents_from_dicts
+from index_snapshot import (
+	bitmap_ids,
+	build_lookups,
+	ids_to_bitmap,
+	load_snapshot,
+	term_filter_contains,
+)
+
+
+# Priority boost multipliers applied on top of lexical matching
+PRIORITY_MULTIPLIERS = {
+	"critical": 2.0,
+	"high": 1.5,
+	"normal": 1.0,
+	"archive": 0.3,
+}
+
+# Weight of the priority boost in the total score
+PRIORITY_WEIGHT = 0.2
+
+
+def priority_score(priority: str) -> float:
+	"""
+	Get the score contribution of a document priority.
+
+	Args:
+		priority: Priority level of the document
+
+	Returns:
+		Priority score, normalized so critical documents get the full weight
+	"""
+	# Normalize by dividing by 2.0 so critical documents get full 0.2 weight
+	return PRIORITY_MULTIPLIERS.get(priority, 1.0) * PRIORITY_WEIGHT / 2.0
+
+
+# Weight of the link-graph authority prior in the total score
+AUTHORITY_WEIGHT = 0.05
+
+# Highest score a document can get without matching any query keyword
+MAX_PRIOR_SCORE = PRIORITY_WEIGHT + AUTHORITY_WEIGHT
+
+# First bytes of every SQLite database file (see index_sqlite.py)
+SQLITE_HEADER = b"SQLite format 3\x00"
+
+# First-tier candidates read and rescored per batch by a two-tier index
+# (at least max_results)
+FIRST_TIER_CANDIDATES = 20
+
+
+# Rough number of characters per token, used to size context to a token budget
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+	"""
+	Estimate the number of tokens of a text.
+
+	Args:
+		text: Text to measure
+
+	Returns:
+		Estimated token count
+	"""
+	return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def section_text(section: Section) -> str:
+	"""Render a section as markdown: heading line followed by its content."""
+	return f"{'#' * section.level} {section.title}\n{section.content}"
+
+
+class SearchResults(list):
+	"""
+	List of search results from a possibly budgeted search.
+
+	Attributes:
+		partial: True when a deadline or work budget stopped the search
+			before every candidate document was scored
+		visited: Documents scored (budgeted and pattern searches only)
+		candidates: Documents that a complete search scores (budgeted and
+			pattern searches only)
+	"""
+
+	def __init__(
+		self,
+		results: Iterable[Dict[str, Any]] = (),
+		partial: bool = False,
+		visited: Optional[int] = None,
+		candidates: Optional[int] = None,
+	):
+		super().__init__(results)
+		self.partial = partial
+		self.visited = visited
+		self.candidates = candidates
 
 
 class DocumentationSearchEngine:
 	"""Search engine for documentation with lexical keyword matching and priority-based ranking."""
 
-	def __init__(self, index_path: str = "docs/.doc-index.json"):
+	# "indexed" scores from precomputed term postings, "scan" runs the
+	# reference word-boundary regex over every document
+	SCORING_MODES = ("indexed", "scan")
+
+	# Context returned around a section by expand_section
+	EXPANSION_SCOPES = ("section", "subtree", "parent", "siblings")
+
+	# Query prefixes answered by the trigram index, e.g. "substring:TagStore"
+	PATTERN_MODES = ("substring", "regex")
+
+	def __init__(
+		self,
+		index_path: str = "docs/.doc-index.json",
+		scoring_mode: str = "indexed",
+		verbose: bool = True,
+		overlay_path: Optional[str] = None,
+		query_log: Optional[str] = None,
+	):
 		"""
 		Initialize the search engine.
 
 		Args:
 			index_path: Path to the documentation index
+			scoring_mode: One of SCORING_MODES
+			verbose: Print progress messages while loading and searching
+			overlay_path: Optional overlay index of working-tree changes,
+				searched on top of the base index
+			query_log: Optional JSON lines file receiving one record per
+				search and related-documents query
 		"""
+		if scoring_mode not in self.SCORING_MODES:
+			raise ValueError(
+				f"Unknown scoring mode '{scoring_mode}'. "
+				f"Expected one of: {', '.join(self.SCORING_MODES)}"
+			)
+
 		self.index_path = Path(index_path)
+		self.scoring_mode = scoring_mode
+		self.verbose = verbose
 		self.index_data = None
+		# Loaded index segments, oldest first; a single JSON index is one segment
+		self.segments: List[Dict[str, Any]] = []
+		self.segment_store = None
+		self._manifest_signature = None
+		self.overlay_path = Path(overlay_path) if overlay_path else None
+		# Overlay segment, always the newest one (see _set_segments)
+		self.overlay = None
+		# Trigram index of the live documents, loaded on the first pattern query
+		self._trigrams = None
+		# SQLite FTS5 index queried on disk, if index_path is a database
+		self.sqlite = None
+		self.query_log = Path(query_log) if query_log else None
+		self._query_log_lock = None
+		if self.query_log is not None:
+			import threading
+
+			# Serializes log writes of threads sharing this engine
+			self._query_log_lock = threading.Lock()
 		self.load_index()
 
 	def load_index(self) -> None:
-		"""Load the documentation index from file."""
+		"""
+		Load the documentation index.
+
+		A directory is read as an external-memory posting index when it
+		holds a posting table (see index_postings.py), else as a segmented
+		index (see index_segments.py). A SQLite database is queried on disk
+		(see index_sqlite.py); any other file is read from its snapshot when
+		up to date, else from JSON. An overlay is loaded first and stacked on
+		top of the base segments.
+		"""
 		if not self.index_path.exists():
 			raise FileNotFoundError(
 				f"Index not found at {self.index_path}. "
 				"Run 'python scripts/rag/build_doc_index.py' first."
 			)
 
-		with open(self.index_path, "r", encoding="utf-8") as f:
-			self.index_data = json.load(f)
+		if self.overlay_path is not None:
+			self.overlay = self._load_overlay()
+
+		if self.index_path.is_dir():
+			from index_postings import TABLE_NAME
+
+			if (self.index_path / TABLE_NAME).exists():
+				if self.overlay is not None:
+					raise ValueError(
+						"Overlays need a JSON or segmented base index, "
+						f"not the posting index at {self.index_path}"
+					)
+				self._load_postings_index()
+			else:
+				from index_segments import SegmentStore
+
+				self.segment_store = SegmentStore(self.index_path)
+				self.segments = []
+				self._manifest_signature = None
+				self.refresh()
+		elif self._is_sqlite_index():
+			if self.overlay is not None:
+				raise ValueError(
+					f"Overlays need a JSON or segmented base index, not the SQLite index at {self.index_path}"
+				)
+			self._load_sqlite_index()
+		else:
+			self._load_single_index()
+
+		total_documents = self.index_data["metadata"].get("total_documents", 0)
+		# Fallback: count documents array if metadata is missing
+		if total_documents == 0:
+			total_documents = len(self.index_data["documents"])
+
+		if self.verbose:
+			print(f"📚 Loaded index with {total_documents} documents")
+
+	def _load_single_index(self) -> None:
+		"""Load a monolithic index file as a single segment."""
+		snapshot = load_snapshot(self.index_path)
+		if snapshot is not None:
+			metadata = snapshot["metadata"]
+			documents = snapshot["documents"]
+			lookups = snapshot["lookups"]
+		else:
+			# Fallback path: only pay for the JSON parser when needed
+			import json
+
+			with open(self.index_path, "r", encoding="utf-8") as f:
+				index = json.load(f)
+
+			# Be defensive about potentially missing keys in the index file
+			metadata, documents = {}, []
+			if isinstance(index, dict):
+				if isinstance(index.get("metadata"), dict):
+					metadata = index["metadata"]
+				if isinstance(index.get("documents"), list):
+					documents = index["documents"]
+			if "body_store" in metadata or any(
+				"section_titles" in doc and "sections" not in doc for doc in documents
+			):
+				self._set_segments([self._load_first_tier(metadata, documents)], metadata)
+				return
+			documents = documents_from_dicts(documents)
+			lookups = build_lookups(documents)
+
+		segment = {
+			"name": self.index_path.name,
+			"documents": documents,
+			"deleted": [],
+			"lookups": lookups,
+		}
+		self._set_segments([segment], metadata)
+
+	def _load_first_tier(
+		self, metadata: Dict[str, Any], documents: List[Dict[str, Any]]
+	) -> Dict[str, Any]:
+		"""
+		Load a metadata file (see save_metadata) as the first tier of a
+		two-tier index.
+
+		Documents are searched through stubs holding the title, top keywords
+		and section titles of the metadata. Since these are subsets of the
+		full document terms, a stub never scores above its full document.
+		The term filter of every document bounds its full score from above,
+		so _rerank_candidates only reads the full documents of the body
+		store that can still reach the top results.
+
+		Args:
+			metadata: Metadata of the metadata file
+			documents: Simplified documents of the metadata file
+
+		Returns:
+			Segment of stubs, with the full documents in "bodies" and the
+			term filter (None if not recorded) per path in "term_filters"
+
+		Raises:
+			ValueError: If the metadata does not record its body store (older
+				or non-JSON builds) or the body store changed since
+		"""
+		import base64
+
+		body_store = metadata.get("body_store")
+		if body_store is None or any("body" not in doc for doc in documents):
+			# Stubs alone would silently serve body-less results
+			raise ValueError(
+				f"{self.index_path} does not point at its full documents. "
+				"Rebuild the JSON index with 'python scripts/rag/build_doc_index.py'."
+			)
+
+		stubs = [
+			Document(
+				path=doc["path"],
+				title=doc["title"],
+				priority=doc["priority"],
+				modified=doc["modified"],
+				sections=[Section(title, 0, "", 0) for title in doc["section_titles"]],
+				keywords=doc["keywords"],
+				word_count=doc["word_count"],
+				heading_count=doc["heading_count"],
+				links=doc["links"],
+				authority=doc["authority"],
+				source=doc["source"],
+			)
+			for doc in documents
+		]
+		rows = [
+			doc["body"] + [
+				doc["path"], doc["title"], doc["priority"], doc["modified"],
+				doc["source"], doc["heading_count"], doc["authority"],
+			]
+			for doc in documents
+		]
+
+		body_path = self.index_path.parent / body_store["path"]
+		try:
+			bodies = LazyDocuments(body_path, rows)
+		except FileNotFoundError:
+			bodies = None
+		# Checked on the mapped file itself, which later rebuilds cannot change
+		if bodies is None or bodies.size != body_store["size"]:
+			raise ValueError(
+				f"Body store {body_path} does not match {self.index_path}. "
+				"Rebuild the JSON index with 'python scripts/rag/build_doc_index.py'."
+			)
+
+		return {
+			"name": self.index_path.name,
+			"documents": stubs,
+			"deleted": [],
+			"lookups": build_lookups(stubs),
+			"bodies": bodies,
+			"term_filters": {
+				doc["path"]: base64.b64decode(doc["terms"]) if "terms" in doc else None
+				for doc in documents
+			},
+		}
+
+	def _load_postings_index(self) -> None:
+		"""Open an external-memory index; postings and documents stay on disk."""
+		from index_postings import load_postings_index
 
-		# Be defensive about potentially missing metadata in the index file
-		total_documents = 0
-		if isinstance(self.index_data, dict):
-			metadata = self.index_data.get("metadata")
-			if isinstance(metadata, dict):
-				total_documents = metadata.get("total_documents", 0)
-			# Fallback: count documents array if metadata is missing
-			if total_documents == 0:
-				documents = self.index_data.get("documents", [])
-				if isinstance(documents, list):
-					total_documents = len(documents)
+		loaded = load_postings_index(self.index_path)
+		self.segments = [loaded["segment"]]
+		self.index_data = {
+			"metadata": loaded["metadata"],
+			"documents": loaded["segment"]["documents"],
+		}
+
+	def _is_sqlite_index(self) -> bool:
+		"""Check the index file for the SQLite header, without importing sqlite3."""
+		with open(self.index_path, "rb") as f:
+			return f.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+
+	def _load_sqlite_index(self) -> None:
+		"""Open a SQLite index; only its metadata is read into memory."""
+		from index_sqlite import SqliteIndex
+
+		self.sqlite = SqliteIndex(self.index_path, self._prior_score)
+		self.segments = []
+		self.index_data = {
+			"metadata": self.sqlite.read_metadata(),
+			"documents": self.sqlite.documents(),
+		}
 
-		print(f"📚 Loaded index with {total_documents} documents")
+	@staticmethod
+	def _prior_score(priority: str, authority: float) -> float:
+		"""Get the query-independent part of a document score."""
+		return priority_score(priority) + authority * AUTHORITY_WEIGHT
+
+	def _load_overlay(self) -> Dict[str, Any]:
+		"""Read an overlay index and build its lookups."""
+		import json
+
+		if not self.overlay_path.exists():
+			raise FileNotFoundError(
+				f"Overlay not found at {self.overlay_path}. "
+				"Run 'python scripts/rag/build_doc_index.py --overlay' first."
+			)
+
+		with open(self.overlay_path, "r", encoding="utf-8") as f:
+			overlay = json.load(f)
+
+		documents = documents_from_dicts(overlay.get("documents", []))
+		return {
+			"name": self.overlay_path.name,
+			"documents": documents,
+			"deleted": overlay.get("deleted", []),
+			"lookups": build_lookups(documents),
+			"metadata": overlay.get("metadata", {}),
+		}
+
+	def refresh(self) -> bool:
+		"""
+		Pick up a new manifest of a segmented index.
+
+		Costs a single `stat` when nothing changed. Otherwise only the
+		segments that are not loaded yet are read; already loaded segments
+		are kept as they are.
+
+		Returns:
+			True if a new manifest was swapped in
+		"""
+		if self.segment_store is None:
+			return False
+
+		manifest_path = self.segment_store.manifest_path
+		for _ in range(3):
+			try:
+				stats = os.stat(manifest_path)
+			except FileNotFoundError:
+				stats = None
+			signature = (
+				(stats.st_ino, stats.st_size, stats.st_mtime_ns) if stats else None
+			)
+			if signature == self._manifest_signature and self.index_data is not None:
+				return False
+
+			manifest = self.segment_store.read_manifest()
+			loaded = {segment["name"]: segment for segment in self.segments}
+			try:
+				segments = [
+					loaded.get(entry["name"]) or self._load_segment(entry["name"])
+					for entry in manifest["segments"]
+				]
+			except FileNotFoundError:
+				# A merge removed a segment after we read the manifest: retry
+				continue
+
+			self._manifest_signature = signature
+			self._set_segments(segments, manifest.get("metadata", {}))
+			return True
+
+		raise RuntimeError(f"Could not read a consistent manifest in {self.index_path}")
+
+	def _load_segment(self, name: str) -> Dict[str, Any]:
+		"""Read one segment file and build its lookups."""
+		segment = self.segment_store.read_segment(name)
+		documents = documents_from_dicts(segment.get("documents", []))
+		return {
+			"name": name,
+			"documents": documents,
+			"deleted": segment.get("deleted", []),
+			"lookups": build_lookups(documents),
+		}
+
+	def _set_segments(self, segments: List[Dict[str, Any]], metadata: Dict[str, Any]) -> None:
+		"""
+		Install segments and resolve which of their documents are live.
+
+		Newer segments shadow documents and apply tombstones to older ones.
+		The overlay, if any, is stacked on top of the given segments.
+
+		Args:
+			segments: Loaded segments, oldest first
+			metadata: Metadata of the complete index
+		"""
+		overlay = self.overlay
+		if overlay is not None:
+			segments = [segment for segment in segments if segment is not overlay]
+			segments.append(overlay)
+
+		shadowed = set()
+		for segment in reversed(segments):
+			live_ids = [
+				doc_id
+				for doc_id, document in enumerate(segment["documents"])
+				if document.path not in shadowed
+			]
+			# None means every document of the segment is live
+			segment["live_mask"] = (
+				None
+				if len(live_ids) == len(segment["documents"])
+				else ids_to_bitmap(live_ids, len(segment["documents"]))
+			)
+			shadowed.update(document.path for document in segment["documents"])
+			shadowed.update(segment["deleted"])
+
+		self.segments = segments
+		self._trigrams = None
+		self.index_data = {
+			"metadata": metadata,
+			"documents": [
+				document
+				for segment in segments
+				for document in self._live_documents(segment)
+			],
+		}
+
+		if overlay is not None:
+			overlay_metadata = overlay["metadata"]
+			base_hash = overlay_metadata.get("base_content_hash")
+			if self.verbose and base_hash and base_hash != metadata.get("content_hash"):
+				print("⚠️  Overlay was built against a different base index, rebuild it")
+			self.index_data["metadata"] = dict(
+				metadata,
+				total_documents=len(self.index_data["documents"]),
+				overlay=overlay_metadata,
+			)
+
+	@staticmethod
+	def _live_documents(segment: Dict[str, Any]) -> List[Document]:
+		"""Get the live documents of a segment, in segment order."""
+		documents = segment["documents"]
+		if segment["live_mask"] is None:
+			return documents
+		return [documents[doc_id] for doc_id in bitmap_ids(segment["live_mask"])]
+
+	@staticmethod
+	def _range_bitmap(
+		sorted_keys: List[str], order: List[int], low: str, high: Optional[str], size: int
+	) -> int:
+		"""
+		Get the bitmap of documents whose key lies in [low, high).
+
+		Args:
+			sorted_keys: Sorted keys (paths or modified dates)
+			order: Document ids matching sorted_keys
+			low: Inclusive lower bound
+			high: Exclusive upper bound, or None for no upper bound
+			size: Number of documents in the segment
+
+		Returns:
+			Bitmap of the matching documents
+		"""
+		start = bisect_left(sorted_keys, low)
+		end = len(sorted_keys) if high is None else bisect_left(sorted_keys, high)
+		return ids_to_bitmap(order[start:end], size)
+
+	def _allowed_ids(
+		self, segment: Dict[str, Any], filters: Optional[Dict[str, Any]]
+	) -> Optional[set]:
+		"""
+		Intersect the filter bitmaps and the live documents of a segment.
+
+		Args:
+			segment: Loaded segment
+			filters: Normalized filters, or None
+
+		Returns:
+			Set of allowed document ids, or None if every document is allowed
+		"""
+		mask = segment["live_mask"]
+		if filters:
+			lookups = segment["lookups"]
+			size = len(segment["documents"])
+
+			if filters.get("priority"):
+				priority_mask = 0
+				for priority in filters["priority"]:
+					priority_mask |= lookups["priority_bitmaps"].get(priority, 0)
+				mask = priority_mask if mask is None else mask & priority_mask
+
+			if filters.get("source"):
+				source_mask = 0
+				for source in filters["source"]:
+					source_mask |= lookups["source_bitmaps"].get(source, 0)
+				mask = source_mask if mask is None else mask & source_mask
+
+			if filters.get("path_prefix"):
+				prefix = filters["path_prefix"]
+				# Smallest string above every path starting with the prefix
+				upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+				prefix_mask = self._range_bitmap(
+					lookups["sorted_paths"], lookups["path_order"], prefix, upper, size
+				)
+				mask = prefix_mask if mask is None else mask & prefix_mask
+
+			if filters.get("modified_since") or filters.get("modified_before"):
+				modified_mask = self._range_bitmap(
+					lookups["sorted_modified"],
+					lookups["modified_order"],
+					filters.get("modified_since") or "",
+					filters.get("modified_before"),
+					size,
+				)
+				mask = modified_mask if mask is None else mask & modified_mask
+
+		if mask is None:
+			return None
+		return set(bitmap_ids(mask))
+
+	@staticmethod
+	def normalize_filters(
+		priority: Optional[Any] = None,
+		path_prefix: Optional[str] = None,
+		modified_since: Optional[str] = None,
+		modified_before: Optional[str] = None,
+		source: Optional[Any] = None,
+	) -> Optional[Dict[str, Any]]:
+		"""
+		Validate search filters.
+
+		Args:
+			priority: Priority level or list of levels to keep
+			path_prefix: Keep documents whose path starts with this prefix
+			modified_since: Keep documents modified at or after this ISO date
+			modified_before: Keep documents modified before this ISO date
+			source: Index root name or list of names to keep (e.g. docs, src)
+
+		Returns:
+			Normalized filters, or None when no filter is set
+		"""
+		if isinstance(priority, str):
+			priority = [priority]
+		if isinstance(source, str):
+			source = [source]
+		if priority:
+			unknown = [p for p in priority if p not in PRIORITY_MULTIPLIERS]
+			if unknown:
+				raise ValueError(
+					f"Unknown priority {', '.join(unknown)}. "
+					f"Expected: {', '.join(PRIORITY_MULTIPLIERS)}"
+				)
+
+		filters = {
+			"priority": list(priority) if priority else None,
+			"path_prefix": path_prefix or None,
+			"modified_since": modified_since or None,
+			"modified_before": modified_before or None,
+			"source": list(source) if source else None,
+		}
+		if not any(filters.values()):
+			return None
+		return filters
+
+	@staticmethod
+	def matches_filters(document: Document, filters: Optional[Dict[str, Any]]) -> bool:
+		"""
+		Check a single document against filters, without any index.
+
+		Args:
+			document: Document to check
+			filters: Normalized filters, or None
+
+		Returns:
+			True if the document passes every filter
+		"""
+		if not filters:
+			return True
+		if filters["priority"] and document.priority not in filters["priority"]:
+			return False
+		if filters["source"] and document.source not in filters["source"]:
+			return False
+		if filters["path_prefix"] and not document.path.startswith(filters["path_prefix"]):
+			return False
+		modified = document.modified
+		if filters["modified_since"] and modified < filters["modified_since"]:
+			return False
+		if filters["modified_before"] and modified >= filters["modified_before"]:
+			return False
+		return True
 
 	def extract_query_keywords(self, query: str) -> List[str]:
 		"""
@@ -82,7 +727,7 @@ class DocumentationSearchEngine:
 		return keywords
 
 	def calculate_relevance_score(
-		self, document: Dict[str, Any], query_keywords: List[str]
+		self, document: Document, query_keywords: List[str]
 	) -> float:
 		"""
 		Calculate relevance score for a document using lexical keyword matching.
@@ -98,9 +743,9 @@ class DocumentationSearchEngine:
 			return 0.0
 
 		# Get document text for matching
-		doc_title = document.get("title", "").lower()
-		doc_keywords = [k.lower() for k in document.get("keywords", [])]
-		doc_sections = document.get("sections", [])
+		doc_title = document.title.lower()
+		doc_keywords = [k.lower() for k in document.keywords]
+		doc_sections = document.sections
 
 		# 1. Title matching with word boundaries (weight: 0.3)
 		title_matches = 0
@@ -122,7 +767,7 @@ class DocumentationSearchEngine:
 		section_matches = 0
 		for section in doc_sections:
 			section_text = (
-				section.get("title", "") + " " + section.get("content", "")
+				section.title + " " + section.content
 			).lower()
 			for kw in query_keywords:
 				if re.search(r'\b' + re.escape(kw) + r'\b', section_text):
@@ -135,23 +780,297 @@ class DocumentationSearchEngine:
 			section_score = 0.0
 
 		# 4. Priority boost (weight: 0.2, normalized so critical = 0.2 max)
-		priority_multipliers = {
-			"critical": 2.0,
-			"high": 1.5,
-			"normal": 1.0,
-			"archive": 0.3,
-		}
-		priority = document.get("priority", "normal")
-		# Normalize by dividing by 2.0 so critical documents get full 0.2 weight
-		priority_score = priority_multipliers.get(priority, 1.0) * 0.2 / 2.0
+		prio_score = priority_score(document.priority)
+
+		# 5. Link-graph authority (weight: 0.05, most linked-to document = max)
+		authority_score = document.authority * AUTHORITY_WEIGHT
 
 		# Calculate total score
-		score = title_score + keyword_score + section_score + priority_score
+		score = title_score + keyword_score + section_score + prio_score + authority_score
 
 		return min(score, 1.0)  # Cap at 1.0
 
+	def calculate_indexed_scores(
+		self,
+		query_keywords: List[str],
+		min_score: float,
+		filters: Optional[Dict[str, Any]] = None,
+	) -> List[Tuple[Document, float]]:
+		"""
+		Score documents from the precomputed term postings.
+
+		Produces the same scores as `calculate_relevance_score`, but only
+		visits live documents that pass the filters and contain at least
+		one query keyword.
+
+		Args:
+			query_keywords: Keywords from the query
+			min_score: Minimum relevance score threshold
+			filters: Normalized filters (see normalize_filters)
+
+		Returns:
+			List of (document, score) in index order
+		"""
+		if not query_keywords:
+			return []
+
+		scored = []
+		for segment in self.segments:
+			scored.extend(
+				self._score_segment(segment, query_keywords, min_score, filters)
+			)
+
+		return scored
+
+	def _score_segment(
+		self,
+		segment: Dict[str, Any],
+		query_keywords: List[str],
+		min_score: float,
+		filters: Optional[Dict[str, Any]],
+	) -> List[Tuple[Document, float]]:
+		"""Score the allowed documents of one segment from its postings."""
+		candidates = self._segment_candidates(segment, query_keywords, min_score, filters)
+		if candidates is None:
+			return []
+
+		doc_ids, hits, _ = candidates
+		documents = segment["documents"]
+		lookups = segment["lookups"]
+		n_keywords = len(query_keywords)
+		scored = []
+
+		for doc_id in doc_ids:
+			score = self._indexed_score(lookups, hits, doc_id, n_keywords)
+			if score >= min_score:
+				scored.append((documents[doc_id], score))
+
+		return scored
+
+	def _segment_candidates(
+		self,
+		segment: Dict[str, Any],
+		query_keywords: List[str],
+		min_score: float,
+		filters: Optional[Dict[str, Any]],
+		deadline: Optional[float] = None,
+	) -> Optional[Tuple[Any, Tuple[Dict[int, int], ...], bool]]:
+		"""
+		Collect the query postings of one segment.
+
+		Args:
+			segment: Loaded segment
+			query_keywords: Keywords from the query
+			min_score: Minimum relevance score threshold
+			filters: Normalized filters (see normalize_filters)
+			deadline: perf_counter() time after which no more keywords are
+				collected
+
+		Returns:
+			Candidate doc ids in id order, (title, keyword, section) hit counts
+			per doc id and whether every keyword was collected, or None if the
+			filters exclude every document of the segment
+		"""
+		allowed = self._allowed_ids(segment, filters)
+		if allowed is not None and not allowed:
+			return None
+
+		lookups = segment["lookups"]
+		title_hits: Dict[int, int] = {}
+		keyword_hits: Dict[int, int] = {}
+		section_hits: Dict[int, int] = {}
+		complete = True
+
+		# Postings are intersected with the allowed documents before scoring
+		for kw in query_keywords:
+			if deadline is not None and time.perf_counter() >= deadline:
+				complete = False
+				break
+			for doc_id in lookups["title_terms"].get(kw, ()):
+				if allowed is None or doc_id in allowed:
+					title_hits[doc_id] = title_hits.get(doc_id, 0) + 1
+			for doc_id in lookups["keyword_terms"].get(kw, ()):
+				if allowed is None or doc_id in allowed:
+					keyword_hits[doc_id] = keyword_hits.get(doc_id, 0) + 1
+			for doc_id, count in lookups["section_terms"].get(kw, {}).items():
+				if allowed is None or doc_id in allowed:
+					section_hits[doc_id] = section_hits.get(doc_id, 0) + count
+
+		if min_score <= MAX_PRIOR_SCORE:
+			# Documents without any match can still pass on priority and authority alone
+			doc_ids = range(len(segment["documents"])) if allowed is None else sorted(allowed)
+		else:
+			doc_ids = sorted(set(title_hits) | set(keyword_hits) | set(section_hits))
+
+		return doc_ids, (title_hits, keyword_hits, section_hits), complete
+
+	@staticmethod
+	def _indexed_score(
+		lookups: Dict[str, Any],
+		hits: Tuple[Dict[int, int], ...],
+		doc_id: int,
+		n_keywords: int,
+	) -> float:
+		"""Score one document from its hit counts, like calculate_relevance_score."""
+		title_hits, keyword_hits, section_hits = hits
+		title_score = (title_hits.get(doc_id, 0) / n_keywords) * 0.3
+		keyword_score = (keyword_hits.get(doc_id, 0) / n_keywords) * 0.3
+
+		max_possible_section_matches = n_keywords * lookups["section_counts"][doc_id]
+		if max_possible_section_matches > 0:
+			section_score = min(
+				section_hits.get(doc_id, 0) / max_possible_section_matches, 1.0
+			) * 0.2
+		else:
+			section_score = 0.0
+
+		# Priors come from the lookups, so documents are only read once they pass
+		prio_score = priority_score(lookups["priorities"][doc_id])
+		authority_score = lookups["authorities"][doc_id] * AUTHORITY_WEIGHT
+
+		return min(
+			title_score + keyword_score + section_score + prio_score + authority_score,
+			1.0,
+		)
+
+	@staticmethod
+	def _segment_priors(segment: Dict[str, Any]) -> Tuple[List[float], List[int]]:
+		"""
+		Get the prior score and prior rank of every document of a segment.
+
+		Computed on first use and cached on the segment, which never changes.
+
+		Returns:
+			Prior score per doc id, and rank per doc id in descending prior
+			order (ties in doc id order)
+		"""
+		if "prior_rank" not in segment:
+			lookups = segment["lookups"]
+			priors = [
+				DocumentationSearchEngine._prior_score(priority, authority)
+				for priority, authority in zip(lookups["priorities"], lookups["authorities"])
+			]
+			prior_rank = [0] * len(priors)
+			for rank, doc_id in enumerate(sorted(range(len(priors)), key=lambda i: -priors[i])):
+				prior_rank[doc_id] = rank
+			segment["priors"] = priors
+			segment["prior_rank"] = prior_rank
+		return segment["priors"], segment["prior_rank"]
+
+	@staticmethod
+	def _prior_stream(
+		doc_ids: List[int],
+		priors: List[float],
+		position: int,
+		hits: Tuple[Dict[int, int], ...],
+	) -> Iterable[tuple]:
+		"""Yield the candidates of a segment as merge keys, in prior order."""
+		for doc_id in doc_ids:
+			yield -priors[doc_id], position, doc_id, hits
+
+	def calculate_budgeted_scores(
+		self,
+		query_keywords: List[str],
+		min_score: float,
+		filters: Optional[Dict[str, Any]],
+		deadline: Optional[float],
+		max_work: Optional[int],
+	) -> Tuple[List[Tuple[Document, float]], bool, int, int]:
+		"""
+		Score documents from the postings, best priors first, within a budget.
+
+		Candidates of all segments are merged in descending prior order and
+		scored until the deadline passes or max_work documents are scored.
+		Scores equal those of calculate_indexed_scores; a search that ends
+		within its budget returns the same documents in the same order.
+
+		Args:
+			query_keywords: Keywords from the query
+			min_score: Minimum relevance score threshold
+			filters: Normalized filters (see normalize_filters)
+			deadline: perf_counter() time to stop at, or None
+			max_work: Maximum number of documents to score, or None
+
+		Returns:
+			(document, score) pairs in index order, whether the search was
+			cut short, documents scored and candidate documents
+		"""
+		n_keywords = len(query_keywords)
+		streams = []
+		candidates = 0
+		partial = False
+		for position, segment in enumerate(self.segments):
+			collected = self._segment_candidates(
+				segment, query_keywords, min_score, filters, deadline
+			)
+			if collected is None:
+				continue
+			doc_ids, hits, complete = collected
+			partial = partial or not complete
+			priors, prior_rank = self._segment_priors(segment)
+			ordered = sorted(doc_ids, key=prior_rank.__getitem__)
+			candidates += len(ordered)
+			streams.append(self._prior_stream(ordered, priors, position, hits))
+
+		scored = []
+		visited = 0
+		for _, position, doc_id, hits in heapq.merge(*streams, key=lambda item: item[:2]):
+			if (max_work is not None and visited >= max_work) or (
+				deadline is not None and time.perf_counter() >= deadline
+			):
+				partial = True
+				break
+			visited += 1
+			segment = self.segments[position]
+			score = self._indexed_score(segment["lookups"], hits, doc_id, n_keywords)
+			if score >= min_score:
+				scored.append((position, doc_id, segment["documents"][doc_id], score))
+
+		# Back to index order, so ties rank like in a complete search
+		scored.sort(key=lambda item: item[:2])
+		return [(document, score) for _, _, document, score in scored], partial, visited, candidates
+
+	def _scan_budgeted(
+		self,
+		query_keywords: List[str],
+		min_score: float,
+		filters: Optional[Dict[str, Any]],
+		deadline: Optional[float],
+		max_work: Optional[int],
+	) -> Tuple[List[Tuple[Document, float]], bool, int, int]:
+		"""Scan-mode counterpart of calculate_budgeted_scores."""
+		documents = self.index_data["documents"]
+		prior_order = self.index_data.get("prior_order")
+		if prior_order is None:
+			# Cached until the next refresh replaces index_data
+			prior_order = self.index_data["prior_order"] = sorted(
+				range(len(documents)),
+				key=lambda i: -(
+					priority_score(documents[i].priority)
+					+ documents[i].authority * AUTHORITY_WEIGHT
+				),
+			)
+
+		candidates = [i for i in prior_order if self.matches_filters(documents[i], filters)]
+		scored = []
+		visited = 0
+		partial = False
+		for position in candidates:
+			if (max_work is not None and visited >= max_work) or (
+				deadline is not None and time.perf_counter() >= deadline
+			):
+				partial = True
+				break
+			visited += 1
+			score = self.calculate_relevance_score(documents[position], query_keywords)
+			if score >= min_score:
+				scored.append((position, documents[position], score))
+
+		scored.sort(key=lambda item: item[0])
+		return [(document, score) for _, document, score in scored], partial, visited, len(candidates)
+
 	def find_matching_sections(
-		self, document: Dict[str, Any], query_keywords: List[str], max_sections: int = 3
+		self, document: Document, query_keywords: List[str], max_sections: int = 3
 	) -> List[Dict[str, Any]]:
 		"""
 		Find the most relevant sections in a document.
@@ -162,14 +1081,15 @@ class DocumentationSearchEngine:
 			max_sections: Maximum number of sections to return
 
 		Returns:
-			List of matching sections with scores
+			List of matching sections with scores and their index in
+			document.sections (see expand_section)
 		"""
-		sections = document.get("sections", [])
+		sections = document.sections
 		scored_sections = []
 
-		for section in sections:
+		for index, section in enumerate(sections):
 			section_text = (
-				section.get("title", "") + " " + section.get("content", "")
+				section.title + " " + section.content
 			).lower()
 
 			# Count keyword matches
@@ -180,6 +1100,7 @@ class DocumentationSearchEngine:
 				scored_sections.append(
 					{
 						"section": section,
+						"index": index,
 						"score": score,
 						"matches": matches,
 					}
@@ -191,86 +1112,774 @@ class DocumentationSearchEngine:
 		return scored_sections[:max_sections]
 
 	def search(
-		self, query: str, max_results: int = 5, min_score: float = 0.3
-	) -> List[Dict[str, Any]]:
+		self,
+		query: str,
+		max_results: int = 5,
+		min_score: float = 0.3,
+		priority: Optional[Any] = None,
+		path_prefix: Optional[str] = None,
+		modified_since: Optional[str] = None,
+		modified_before: Optional[str] = None,
+		source: Optional[Any] = None,
+		deadline_ms: Optional[float] = None,
+		max_work: Optional[int] = None,
+	) -> SearchResults:
 		"""
 		Search the documentation index.
 
+		Filters are applied before scoring, so narrower filters make the
+		search cheaper. With a deadline or work budget, documents are scored
+		in descending prior order and the best results found when the budget
+		runs out are returned, flagged as partial.
+
 		Args:
 			query: Search query string
 			max_results: Maximum number of results to return
 			min_score: Minimum relevance score threshold
+			priority: Priority level or list of levels to keep
+			path_prefix: Keep documents whose path starts with this prefix
+			modified_since: Keep documents modified at or after this ISO date
+			modified_before: Keep documents modified before this ISO date
+			source: Index root name or list of names to keep (e.g. docs, src)
+			deadline_ms: Time budget of the call in milliseconds
+			max_work: Maximum number of documents to score
 
 		Returns:
-			List of search results with scores
+			List of search results with scores (see SearchResults)
+		"""
+		start = time.perf_counter()
+		deadline = None if deadline_ms is None else start + deadline_ms / 1000
+		results = self._search(
+			query, max_results, min_score, priority, path_prefix,
+			modified_since, modified_before, source, deadline, max_work,
+		)
+		if self.query_log is not None:
+			self._log_query(
+				"search",
+				query,
+				{
+					"max_results": max_results,
+					"min_score": min_score,
+					"priority": priority,
+					"path_prefix": path_prefix,
+					"modified_since": modified_since,
+					"modified_before": modified_before,
+					"source": source,
+					"deadline_ms": deadline_ms,
+					"max_work": max_work,
+				},
+				results,
+				start,
+			)
+		return results
+
+	def _search(
+		self,
+		query: str,
+		max_results: int,
+		min_score: float,
+		priority: Optional[Any],
+		path_prefix: Optional[str],
+		modified_since: Optional[str],
+		modified_before: Optional[str],
+		source: Optional[Any],
+		deadline: Optional[float] = None,
+		max_work: Optional[int] = None,
+	) -> SearchResults:
+		"""
+		Search the documentation index without logging (see search).
+
+		The deadline is a perf_counter() time, not a duration.
 		"""
+		filters = self.normalize_filters(
+			priority, path_prefix, modified_since, modified_before, source
+		)
+
+		mode, _, pattern = query.partition(":")
+		if mode in self.PATTERN_MODES:
+			return self._pattern_search(
+				mode, pattern.strip(), max_results, min_score, filters, deadline, max_work
+			)
+
 		# Extract keywords from query
 		query_keywords = self.extract_query_keywords(query)
 
 		if not query_keywords:
-			print("⚠️  No valid keywords in query")
-			return []
+			if self.verbose:
+				print("⚠️  No valid keywords in query")
+			return SearchResults()
+
+		if self.verbose:
+			print(f"🔍 Searching for: {', '.join(query_keywords)}")
+
+		# Pick up new segments of a segmented index (a single stat otherwise)
+		self.refresh()
+
+		if self.sqlite is not None:
+			return self._sqlite_search(query_keywords, max_results, min_score, filters, deadline)
+
+		# First-tier scores of a two-tier index are lower bounds, so its
+		# candidates are selected without the threshold
+		two_tier = any("bodies" in segment for segment in self.segments)
+		tier_min_score = 0.0 if two_tier else min_score
+
+		# Score documents
+		partial, visited, candidates = False, None, None
+		if deadline is not None or max_work is not None:
+			score_budgeted = (
+				self.calculate_budgeted_scores
+				if self.scoring_mode == "indexed"
+				else self._scan_budgeted
+			)
+			scored, partial, visited, candidates = score_budgeted(
+				query_keywords, tier_min_score, filters, deadline, max_work
+			)
+		elif self.scoring_mode == "indexed":
+			scored = self.calculate_indexed_scores(query_keywords, tier_min_score, filters)
+		else:
+			scored = []
+			for document in self.index_data["documents"]:
+				if not self.matches_filters(document, filters):
+					continue
+				score = self.calculate_relevance_score(document, query_keywords)
+				if score >= tier_min_score:
+					scored.append((document, score))
+
+		if two_tier:
+			scored = self._rerank_candidates(scored, query_keywords, min_score, max_results)
+
+		# Sort by score (stable, so ties keep index order)
+		scored.sort(key=lambda x: x[1], reverse=True)
+
+		# Find best matching sections for the returned documents only
+		results = SearchResults(partial=partial, visited=visited, candidates=candidates)
+		for document, score in scored[:max_results]:
+			results.append(
+				{
+					"document": document,
+					"score": score,
+					"matching_sections": self.find_matching_sections(
+						document, query_keywords
+					),
+				}
+			)
 
-		print(f"🔍 Searching for: {', '.join(query_keywords)}")
+		return results
 
-		# Score all documents
-		results = []
-		for document in self.index_data["documents"]:
-			score = self.calculate_relevance_score(document, query_keywords)
+	def _sqlite_search(
+		self,
+		query_keywords: List[str],
+		max_results: int,
+		min_score: float,
+		filters: Optional[Dict[str, Any]],
+		deadline: Optional[float],
+	) -> SearchResults:
+		"""
+		Search a SQLite index on disk (see SqliteIndex.search).
 
-			if score >= min_score:
-				# Find best matching sections
-				matching_sections = self.find_matching_sections(
-					document, query_keywords
-				)
+		Only the returned documents are read. A deadline stops the scoring
+		of the candidates, which are visited best bm25 first; the documents
+		scored by then are returned, flagged as partial. max_work does not
+		apply.
+
+		Args:
+			query_keywords: Keywords from the query
+			max_results: Maximum number of results to return
+			min_score: Minimum relevance score threshold
+			filters: Normalized filters (see normalize_filters)
+			deadline: perf_counter() time at which the query is interrupted
 
-				results.append(
+		Returns:
+			Search results whose matching sections are ranked by bm25
+		"""
+		rows, complete = self.sqlite.search(
+			query_keywords, filters, min_score, max_results, deadline
+		)
+		results = SearchResults(partial=not complete)
+
+		for document_id, score in rows:
+			document = self.sqlite.document(document_id)
+			matching_sections = []
+			for index in self.sqlite.matching_sections(document_id, query_keywords, 3):
+				section = document.sections[index]
+				text = (section.title + " " + section.content).lower()
+				matches = sum(1 for kw in query_keywords if kw in text)
+				matching_sections.append(
 					{
-						"document": document,
-						"score": score,
-						"matching_sections": matching_sections,
+						"section": section,
+						"index": index,
+						"score": matches / len(query_keywords),
+						"matches": matches,
 					}
 				)
+			results.append(
+				{"document": document, "score": score, "matching_sections": matching_sections}
+			)
 
-		# Sort by score
-		results.sort(key=lambda x: x["score"], reverse=True)
+		return results
+
+	def _trigram_index(self) -> Dict[str, Any]:
+		"""
+		Get the trigram index of the live documents.
+
+		A single JSON index uses the trigram file written by the builder when
+		it is up to date; otherwise the index is built in memory from the
+		full documents. The index also records the (segment, doc id) of every
+		indexed document, in entry order.
+		"""
+		if self._trigrams is None:
+			from index_trigrams import build_trigrams, load_trigrams
+
+			documents = [
+				(segment, doc_id)
+				for segment in self.segments
+				for doc_id in (
+					range(len(segment["documents"]))
+					if segment["live_mask"] is None
+					else bitmap_ids(segment["live_mask"])
+				)
+			]
+
+			trigrams = None
+			if (
+				len(self.segments) == 1
+				and self.index_path.is_file()
+				and "bodies" not in self.segments[0]
+			):
+				trigrams = load_trigrams(self.index_path)
+			if trigrams is None or len(trigrams["starts"]) != len(documents):
+				trigrams = build_trigrams(
+					self._full_document(segment, doc_id) for segment, doc_id in documents
+				)
+
+			trigrams["documents"] = documents
+			self._trigrams = trigrams
+		return self._trigrams
+
+	@staticmethod
+	def _full_document(segment: Dict[str, Any], doc_id: int) -> Document:
+		"""Get a document of a segment with its sections, from the body store if stubbed."""
+		return segment.get("bodies", segment["documents"])[doc_id]
+
+	def _pattern_search(
+		self,
+		mode: str,
+		pattern: str,
+		max_results: int,
+		min_score: float,
+		filters: Optional[Dict[str, Any]],
+		deadline: Optional[float],
+		max_work: Optional[int],
+	) -> SearchResults:
+		"""
+		Search for a case-insensitive substring or regex.
+
+		Candidate titles and sections are narrowed with the trigram index,
+		then checked for an actual match, in descending prior order. A
+		document matching in its title scores 0.3, matching in any section
+		0.3, plus 0.2 times the fraction of matching sections and its
+		priority and authority, like calculate_relevance_score.
+
+		Args:
+			mode: One of PATTERN_MODES
+			pattern: Substring or regex, without the mode prefix
+			max_results: Maximum number of results to return
+			min_score: Minimum relevance score threshold
+			filters: Normalized filters (see normalize_filters)
+			deadline: perf_counter() time after which no more documents
+				are checked
+			max_work: Maximum number of documents to check
+
+		Returns:
+			Search results whose matching sections hold the number of
+			matches of the pattern
+		"""
+		from index_trigrams import (
+			candidate_entries,
+			entry_location,
+			fold_case,
+			regex_query,
+			section_search_text,
+			substring_query,
+		)
+
+		if not pattern:
+			if self.verbose:
+				print(f"⚠️  Empty {mode} pattern")
+			return SearchResults()
+
+		if self.sqlite is not None:
+			raise ValueError(f"{mode}: queries are not supported by the SQLite index")
+
+		if mode == "regex":
+			try:
+				compiled = re.compile(pattern, re.IGNORECASE | re.MULTILINE)
+			except re.error as e:
+				raise ValueError(f"Invalid regex '{pattern}': {e}") from None
+			# Literal whitespace of a verbose regex is not matched
+			query = None if compiled.flags & re.VERBOSE else regex_query(pattern)
+		else:
+			needle = fold_case(pattern)
+			query = substring_query(pattern)
+
+		if self.verbose:
+			print(f"🔍 Searching for {mode}: {pattern}")
+
+		self.refresh()
+		trigrams = self._trigram_index()
+		documents = trigrams["documents"]
+
+		# Entries to check per document position; None checks every entry
+		entries = candidate_entries(trigrams, query)
+		if entries is None:
+			to_check: Dict[int, Optional[List[int]]] = dict.fromkeys(range(len(documents)))
+		else:
+			to_check = {}
+			for entry_id in sorted(entries):
+				position, section_index = entry_location(trigrams, entry_id)
+				to_check.setdefault(position, []).append(section_index)
+
+		allowed = {
+			id(segment): self._allowed_ids(segment, filters) for segment in self.segments
+		}
+		candidates = []
+		for position in to_check:
+			segment, doc_id = documents[position]
+			segment_allowed = allowed[id(segment)]
+			if segment_allowed is None or doc_id in segment_allowed:
+				priors, _ = self._segment_priors(segment)
+				candidates.append((-priors[doc_id], position))
+		candidates.sort()
+
+		results = SearchResults(partial=False, visited=0, candidates=len(candidates))
+		scored = []
+		for negative_prior, position in candidates:
+			if (deadline is not None and time.perf_counter() >= deadline) or (
+				max_work is not None and results.visited >= max_work
+			):
+				results.partial = True
+				break
+			results.visited += 1
+
+			segment, doc_id = documents[position]
+			document = self._full_document(segment, doc_id)
+			section_indexes = to_check[position]
+			if section_indexes is None:
+				section_indexes = range(-1, len(document.sections))
+
+			title_match = False
+			matching_sections = []
+			for index in section_indexes:
+				text = document.title if index < 0 else section_search_text(document.sections[index])
+				if mode == "regex":
+					matches = sum(1 for _ in compiled.finditer(text))
+				else:
+					matches = fold_case(text).count(needle)
+				if not matches:
+					continue
+				if index < 0:
+					title_match = True
+				else:
+					matching_sections.append(
+						{
+							"section": document.sections[index],
+							"index": index,
+							"score": 1.0,
+							"matches": matches,
+						}
+					)
+			if not title_match and not matching_sections:
+				continue
+
+			score = (0.3 if title_match else 0.0) - negative_prior
+			if matching_sections:
+				score += 0.3 + len(matching_sections) / len(document.sections) * 0.2
+			score = min(score, 1.0)
+			if score >= min_score:
+				matching_sections.sort(key=lambda x: x["matches"], reverse=True)
+				scored.append((position, document, score, matching_sections[:3]))
+
+		# Sort by score (stable, so ties keep index order)
+		scored.sort(key=lambda item: item[0])
+		scored.sort(key=lambda item: item[2], reverse=True)
+		for _, document, score, sections in scored[:max_results]:
+			results.append(
+				{"document": document, "score": score, "matching_sections": sections}
+			)
+
+		return results
 
-		return results[:max_results]
+	def _rerank_candidates(
+		self,
+		scored: List[Tuple[Document, float]],
+		query_keywords: List[str],
+		min_score: float,
+		max_results: int,
+	) -> List[Tuple[Document, float]]:
+		"""
+		Rescore first-tier candidates on their full documents.
+
+		The best candidates by first-tier score are read first. Unread
+		candidates are then read, by descending upper bound, as long as
+		their upper bound reaches the max_results-th full score (or
+		min_score), so the top max_results are exactly those of a one-tier
+		index.
+
+		Args:
+			scored: First-tier (document, score) in index order
+			query_keywords: Keywords from the query
+			min_score: Minimum relevance score threshold
+			max_results: Maximum number of results to return
+
+		Returns:
+			(full document, score) of the read candidates reaching
+			min_score, in index order
+		"""
+		limit = max(FIRST_TIER_CANDIDATES, max_results)
+		term_filters: Dict[str, Optional[bytes]] = {}
+		for segment in self.segments:
+			term_filters.update(segment.get("term_filters", {}))
+
+		bounds = [
+			self._upper_bound(document, score, term_filters, query_keywords)
+			for document, score in scored
+		]
+		unread = sorted(range(len(scored)), key=lambda i: -scored[i][1])
+		full_scores: Dict[int, Tuple[Document, float]] = {}
+
+		while unread:
+			batch, unread = unread[:limit], unread[limit:]
+			documents = [self.get_document(scored[i][0].path) for i in batch]
+			for i, document, score in zip(
+				batch, documents, self._full_scores(documents, query_keywords)
+			):
+				full_scores[i] = (document, score)
+
+			# No unread candidate bounded below the threshold can enter the
+			# results (the margin absorbs rounding differences of the bound)
+			passing = sorted(
+				(score for _, score in full_scores.values() if score >= min_score),
+				reverse=True,
+			)
+			threshold = passing[max_results - 1] if len(passing) >= max_results else min_score
+			unread = sorted(
+				(i for i in unread if bounds[i] + 1e-9 >= threshold), key=lambda i: -bounds[i]
+			)
+
+		return [
+			full_scores[i] for i in sorted(full_scores) if full_scores[i][1] >= min_score
+		]
+
+	def _upper_bound(
+		self,
+		stub: Document,
+		score: float,
+		term_filters: Dict[str, Optional[bytes]],
+		query_keywords: List[str],
+	) -> float:
+		"""
+		Bound the full score of a first-tier candidate from above.
+
+		Titles and priors of the stubs are complete; the keyword and
+		section scores are bounded by the query keywords that the term
+		filter of the full document may contain.
+		"""
+		if stub.path not in term_filters:
+			# Not a stub (e.g. an overlay document): its score is exact
+			return score
+
+		term_filter = term_filters[stub.path]
+		n_keywords = len(query_keywords)
+		title_terms = set(re.findall(r"\w+", stub.title.lower()))
+		title_hits = sum(1 for kw in query_keywords if kw in title_terms)
+		possible = n_keywords if term_filter is None else sum(
+			1 for kw in query_keywords if term_filter_contains(term_filter, kw)
+		)
+
+		bound = (title_hits / n_keywords) * 0.3 + (possible / n_keywords) * 0.3
+		if stub.sections:
+			bound += (possible / n_keywords) * 0.2
+		return min(bound + self._prior_score(stub.priority, stub.authority), 1.0)
+
+	def _full_scores(
+		self, documents: List[Document], query_keywords: List[str]
+	) -> List[float]:
+		"""Score full documents like calculate_indexed_scores, without lookups."""
+		# Hit counts of the query keywords only, with the word definition
+		# of extract_terms; sections without the keyword as a substring are
+		# never tokenized
+		title_hits: Dict[int, int] = {}
+		keyword_hits: Dict[int, int] = {}
+		section_hits: Dict[int, int] = {}
+		for doc_id, document in enumerate(documents):
+			title_terms = set(re.findall(r"\w+", document.title.lower()))
+			keyword_terms = set(re.findall(r"\w+", " ".join(document.keywords).lower()))
+			title_hits[doc_id] = sum(1 for kw in query_keywords if kw in title_terms)
+			keyword_hits[doc_id] = sum(1 for kw in query_keywords if kw in keyword_terms)
+			hits = 0
+			for section in document.sections:
+				text = (section.title + " " + section.content).lower()
+				present = [kw for kw in query_keywords if kw in text]
+				if present:
+					terms = set(re.findall(r"\w+", text))
+					hits += sum(1 for kw in present if kw in terms)
+			section_hits[doc_id] = hits
+
+		lookups = {
+			"section_counts": [len(document.sections) for document in documents],
+			"priorities": [document.priority for document in documents],
+			"authorities": [document.authority for document in documents],
+		}
+		return [
+			self._indexed_score(
+				lookups, (title_hits, keyword_hits, section_hits), doc_id, len(query_keywords)
+			)
+			for doc_id in range(len(documents))
+		]
 
 	def find_related_documents(
-		self, document_path: str, max_related: int = 3
-	) -> List[Dict[str, Any]]:
+		self,
+		document_path: str,
+		max_related: int = 3,
+		deadline_ms: Optional[float] = None,
+		max_work: Optional[int] = None,
+	) -> SearchResults:
 		"""
 		Find documents related to a given document.
 
 		Args:
 			document_path: Path to the reference document
 			max_related: Maximum number of related documents
+			deadline_ms: Time budget of the call in milliseconds
+			max_work: Maximum number of documents to score
 
 		Returns:
-			List of related documents
+			List of related documents (see SearchResults)
 		"""
+		start = time.perf_counter()
+		deadline = None if deadline_ms is None else start + deadline_ms / 1000
+		related = self._find_related_documents(document_path, max_related, deadline, max_work)
+		if self.query_log is not None:
+			self._log_query(
+				"related",
+				document_path,
+				{"max_related": max_related, "deadline_ms": deadline_ms, "max_work": max_work},
+				related,
+				start,
+			)
+		return related
+
+	def _find_related_documents(
+		self,
+		document_path: str,
+		max_related: int,
+		deadline: Optional[float] = None,
+		max_work: Optional[int] = None,
+	) -> SearchResults:
+		"""Find related documents without logging (see find_related_documents)."""
+		self.refresh()
+
 		# Find the reference document
-		ref_doc = None
-		for doc in self.index_data["documents"]:
-			if doc["path"] == document_path:
-				ref_doc = doc
-				break
+		ref_doc = self.get_document(document_path)
 
 		if not ref_doc:
-			print(f"⚠️  Document not found: {document_path}")
-			return []
+			if self.verbose:
+				print(f"⚠️  Document not found: {document_path}")
+			return SearchResults()
 
 		# Use document keywords to find related docs
-		ref_keywords = ref_doc.get("keywords", [])[:10]  # Top 10 keywords
+		ref_keywords = ref_doc.keywords[:10]  # Top 10 keywords
 
-		# Search using reference keywords
-		related = self.search(" ".join(ref_keywords), max_results=max_related + 1)
+		# Search using reference keywords (logged as a single related query)
+		related = self._search(
+			" ".join(ref_keywords), max_related + 1, 0.3, None, None, None, None, None,
+			deadline, max_work,
+		)
 
 		# Remove the reference document itself
-		related = [r for r in related if r["document"]["path"] != document_path]
+		return SearchResults(
+			[r for r in related if r["document"].path != document_path][:max_related],
+			related.partial,
+			related.visited,
+			related.candidates,
+		)
+
+	def get_document(self, document_path: str) -> Optional[Document]:
+		"""
+		Get a live document by path.
+
+		Segments are searched newest first with a binary search on their
+		sorted paths; a newer tombstone hides older copies. The first tier
+		of a two-tier index returns the full document from its body store.
+
+		Args:
+			document_path: Repository path of the document
+
+		Returns:
+			The document, or None if it is not in the index
+		"""
+		if self.sqlite is not None:
+			return self.sqlite.document_by_path(document_path)
+
+		for segment in reversed(self.segments):
+			lookups = segment["lookups"]
+			sorted_paths = lookups["sorted_paths"]
+			position = bisect_left(sorted_paths, document_path)
+			if position < len(sorted_paths) and sorted_paths[position] == document_path:
+				doc_id = lookups["path_order"][position]
+				if "bodies" not in segment:
+					return segment["documents"][doc_id]
+				document = segment["bodies"][doc_id]
+				if document.path != document_path:
+					raise ValueError(
+						f"Body store of {self.index_path} is out of date, rebuild the index"
+					)
+				return document
+			if document_path in segment["deleted"]:
+				return None
+		return None
+
+	def expand_section(
+		self,
+		document: Any,
+		section_index: int,
+		scope: str = "subtree",
+		token_budget: int = 2000,
+	) -> Dict[str, Any]:
+		"""
+		Get the context around a section, sized to a token budget.
+
+		Scopes, read from the section tree without scanning the document:
+		- section: the section alone;
+		- subtree: the section and all its subsections;
+		- parent: the enclosing section and its whole subtree (the section
+		  subtree for a top-level section);
+		- siblings: the section and the other children of its parent,
+		  without their subsections.
+
+		The section itself always comes first (cut to the budget if needed),
+		then the parent, then the other sections, nearest first; sections
+		that do not fit are left out. Returned sections are in document
+		order.
+
+		Args:
+			document: Document or document path
+			section_index: Index of the section in document.sections (the
+				"index" of a matching section in a search result)
+			scope: One of EXPANSION_SCOPES
+			token_budget: Maximum estimated tokens of the returned text
 
-		return related[:max_related]
+		Returns:
+			Dictionary with the document, the section, its breadcrumb, the
+			selected sections ({"index", "section", "text"}), the estimated
+			tokens used and whether anything was left out or cut
+		"""
+		if scope not in self.EXPANSION_SCOPES:
+			raise ValueError(
+				f"Unknown scope '{scope}'. Expected one of: {', '.join(self.EXPANSION_SCOPES)}"
+			)
+		if isinstance(document, str):
+			path = document
+			document = self.get_document(path)
+			if document is None:
+				raise ValueError(f"Document not found: {path}")
+
+		sections = document.sections
+		if not 0 <= section_index < len(sections):
+			raise ValueError(f"No section {section_index} in {document.path}")
+		section = sections[section_index]
+
+		if scope == "section":
+			candidates = [section_index]
+		elif scope == "subtree":
+			candidates = list(range(section_index, section.subtree_end))
+		elif scope == "parent":
+			root = section_index if section.parent is None else section.parent
+			candidates = [section_index, root] + sorted(
+				(i for i in range(root, sections[root].subtree_end) if i not in (root, section_index)),
+				key=lambda i: abs(i - section_index),
+			)
+		else:
+			# Children of the parent: hop from one sibling subtree to the next
+			siblings = []
+			index = 0 if section.parent is None else section.parent + 1
+			end = len(sections) if section.parent is None else sections[section.parent].subtree_end
+			while index < end:
+				siblings.append(index)
+				index = sections[index].subtree_end
+			candidates = sorted(siblings, key=lambda i: abs(i - section_index))
+
+		selected: Dict[int, str] = {}
+		tokens = 0
+		truncated = False
+		for index in candidates:
+			if index in selected:
+				continue
+			text = section_text(sections[index])
+			cost = estimate_tokens(text)
+			if tokens + cost > token_budget:
+				truncated = True
+				if index == section_index:
+					# The section itself is always returned, cut to the budget
+					text = text[: token_budget * CHARS_PER_TOKEN]
+					cost = estimate_tokens(text)
+				else:
+					continue
+			selected[index] = text
+			tokens += cost
+
+		return {
+			"document": document,
+			"section": section,
+			"breadcrumb": section.breadcrumb,
+			"sections": [
+				{"index": index, "section": sections[index], "text": selected[index]}
+				for index in sorted(selected)
+			],
+			"tokens": tokens,
+			"truncated": truncated,
+		}
+
+	def _log_query(
+		self,
+		operation: str,
+		query: str,
+		params: Dict[str, Any],
+		results: SearchResults,
+		start: float,
+	) -> None:
+		"""
+		Append a query record to the query log.
+
+		Args:
+			operation: "search" or "related"
+			query: Query string, or the reference path of a related query
+			params: Parameters of the call, enough to replay it
+			results: Results returned
+			start: perf_counter() value when the call started
+		"""
+		latency_ms = (time.perf_counter() - start) * 1000
+
+		# Only paid for when logging is enabled
+		import json
+		from datetime import datetime, timezone
+
+		record = {
+			"timestamp": datetime.now(timezone.utc).isoformat(),
+			"operation": operation,
+			"query": query,
+			"params": params,
+			"results": len(results),
+			"partial": results.partial,
+			"latency_ms": round(latency_ms, 3),
+		}
+		line = json.dumps(record, ensure_ascii=False) + "\n"
+
+		with self._query_log_lock:
+			# One write per record in append mode, so concurrent engines and
+			# processes logging to the same file do not interleave lines
+			with open(self.query_log, "a", encoding="utf-8") as f:
+				f.write(line)
 
 	def format_result(self, result: Dict[str, Any]) -> str:
 		"""
@@ -288,9 +1897,10 @@ class DocumentationSearchEngine:
 
 		output = []
 		output.append(f"\n{'='*80}")
-		output.append(f"📄 {doc['title']}")
-		output.append(f"   Path: {doc['path']}")
-		output.append(f"   Priority: {doc['priority'].upper()}")
+		output.append(f"📄 {doc.title}")
+		output.append(f"   Path: {doc.path}")
+		output.append(f"   Priority: {doc.priority.upper()}")
+		output.append(f"   Source: {doc.source}")
 		output.append(f"   Score: {score:.2%}")
 
 		if sections:
@@ -298,12 +1908,13 @@ class DocumentationSearchEngine:
 			for i, section_info in enumerate(sections, 1):
 				section = section_info["section"]
 				output.append(
-					f"   {i}. {section['title']} (Level {section['level']}) - "
+					f"   {i}. {' > '.join(section.breadcrumb)} (Level {section.level}, "
+					f"lines {section.line_start}-{section.line_end}) - "
 					f"{section_info['matches']} matches"
 				)
 
 				# Add excerpt
-				content = section["content"][:150].strip()
+				content = section.content[:150].strip()
 				if content:
 					output.append(f"      \"{content}...\"")
 
@@ -324,25 +1935,105 @@ class DocumentationSearchEngine:
 
 def main():
 	"""Main entry point for command-line usage."""
+	import argparse
+
+	parser = argparse.ArgumentParser(description="Search the documentation index")
+	parser.add_argument("query", nargs="*", help="Search query")
+	parser.add_argument(
+		"--index",
+		default="docs/.doc-index.json",
+		help="Index file, segments directory, SQLite database, or metadata file for a two-tier search",
+	)
+	parser.add_argument("--overlay", help="Overlay index of branch changes, searched on top of --index")
+	parser.add_argument(
+		"--deadline-ms",
+		type=float,
+		help="Return the best results found within this many milliseconds",
+	)
+	parser.add_argument(
+		"--max-work",
+		type=int,
+		help="Score at most this many documents, best priors first",
+	)
+	parser.add_argument(
+		"--context",
+		choices=DocumentationSearchEngine.EXPANSION_SCOPES,
+		help="Print this context around the best section of the top result",
+	)
+	parser.add_argument(
+		"--token-budget",
+		type=int,
+		default=2000,
+		help="Estimated token budget of the --context output",
+	)
+	parser.add_argument(
+		"--query-log",
+		default=os.environ.get("RAG_QUERY_LOG"),
+		help="Append a JSON line per query to this file (default: $RAG_QUERY_LOG)",
+	)
+	parser.add_argument("--max-results", type=int, default=5)
+	parser.add_argument(
+		"--priority",
+		action="append",
+		choices=list(PRIORITY_MULTIPLIERS),
+		help="Only search documents with this priority (repeatable)",
+	)
+	parser.add_argument("--path", dest="path_prefix", help="Only search documents under this path prefix")
+	parser.add_argument("--since", dest="modified_since", help="Only documents modified at or after this ISO date")
+	parser.add_argument("--before", dest="modified_before", help="Only documents modified before this ISO date")
+	parser.add_argument(
+		"--source",
+		action="append",
+		help="Only search documents from this index root, e.g. docs or src (repeatable)",
+	)
+	args = parser.parse_args()
+
 	print("🔍 Documentation Search Engine - Lumina Portfolio RAG System\n")
 
 	# Check for query argument
-	if len(sys.argv) < 2:
-		print("Usage: python search_documentation.py \"your search query\"")
+	if not args.query:
+		print("Usage: python search_documentation.py \"your search query\" [filters]")
 		print("\nExample searches:")
 		print("  python search_documentation.py \"tags system\"")
 		print("  python search_documentation.py \"architecture\"")
 		print("  python search_documentation.py \"Gemini API\"")
+		print("  python search_documentation.py \"schema\" --path docs/developer/database")
+		print("  python search_documentation.py \"tags\" --priority high --since 2026-01-01")
+		print("  python search_documentation.py \"suggest tags\" --source src")
+		print("  python search_documentation.py \"tags\" --overlay docs/.doc-overlay.json")
+		print("  python search_documentation.py \"tags\" --index docs/.doc-metadata.json")
+		print("  python search_documentation.py \"tags\" --index docs/.doc-index.sqlite")
+		print("  python search_documentation.py \"substring:useLibrary\"")
+		print("  python search_documentation.py \"regex:use(Library|Collections)\\b\"")
+		print("  python search_documentation.py \"tags\" --context subtree --token-budget 1000")
 		sys.exit(1)
 
-	query = " ".join(sys.argv[1:])
+	query = " ".join(args.query)
 
 	try:
 		# Create search engine
-		engine = DocumentationSearchEngine()
+		engine = DocumentationSearchEngine(
+			args.index, overlay_path=args.overlay, query_log=args.query_log
+		)
 
 		# Perform search
-		results = engine.search(query, max_results=5)
+		results = engine.search(
+			query,
+			max_results=args.max_results,
+			priority=args.priority,
+			path_prefix=args.path_prefix,
+			modified_since=args.modified_since,
+			modified_before=args.modified_before,
+			source=args.source,
+			deadline_ms=args.deadline_ms,
+			max_work=args.max_work,
+		)
+
+		if results.partial:
+			print(
+				f"\n⏱️  Partial results: scored {results.visited} of "
+				f"{results.candidates} candidate documents within the budget"
+			)
 
 		# Display results
 		if not results:
@@ -357,20 +2048,36 @@ def main():
 			for result in results:
 				print(engine.format_result(result))
 
+			top_sections = results[0]["matching_sections"]
+			if args.context and top_sections:
+				context = engine.expand_section(
+					results[0]["document"], top_sections[0]["index"], args.context, args.token_budget
+				)
+				print(f"\n\n📖 {' > '.join(context['breadcrumb'])} ({args.context}, ~{context['tokens']} tokens)")
+				for entry in context["sections"]:
+					print(f"\n{entry['text'].rstrip()}")
+				if context["truncated"]:
+					print("\n   (context cut to the token budget)")
+
 			# Show related documents for top result
 			if results:
-				top_doc_path = results[0]["document"]["path"]
-				print(f"\n\n🔗 Related documents to '{results[0]['document']['title']}':")
-
-				related = engine.find_related_documents(top_doc_path, max_related=3)
+				top_doc_path = results[0]["document"].path
+				print(f"\n\n🔗 Related documents to '{results[0]['document'].title}':")
+
+				related = engine.find_related_documents(
+					top_doc_path,
+					max_related=3,
+					deadline_ms=args.deadline_ms,
+					max_work=args.max_work,
+				)
 				for i, rel in enumerate(related, 1):
 					rel_doc = rel["document"]
 					print(
-						f"  {i}. {rel_doc['title']} ({rel_doc['path']}) - "
+						f"  {i}. {rel_doc.title} ({rel_doc.path}) - "
 						f"Score: {rel['score']:.2%}"
 					)
 
-	except FileNotFoundError as e:
+	except (FileNotFoundError, ValueError) as e:
 		print(f"\n❌ Error: {e}")
 		sys.exit(1)
 	except Exception as e:
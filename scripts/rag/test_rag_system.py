@@ -9,14 +9,67 @@ Usage:
     python scripts/rag/test_rag_system.py
 """
 
+import contextlib
+import io
 import json
+import os
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import subprocess
+import tempfile
+import time
+import types
 from pathlib import Path
 import sys
 
 # Add parent directory to path for imports
 sys.path.insert(0, str(Path(__file__).parent))
 
-from search_documentation import DocumentationSearchEngine
+from build_doc_index import DocumentationIndexBuilder
+from index_postings import PostingsReader, SpimiIndexWriter, decode_varbytes, encode_varbyte
+from index_roots import IndexRoot
+from doc_records import Document
+from evaluate_search import (
+	DEFAULT_GOLDEN_PATH,
+	evaluate_mode,
+	load_golden,
+	ndcg_at_k,
+	recall_at_k,
+	reciprocal_rank,
+)
+from index_segments import SegmentStore
+from index_snapshot import build_lookups, load_snapshot
+import index_sqlite
+from index_sqlite import SqliteIndex
+from index_trigrams import build_trigrams, fold_case, regex_query
+from replay_queries import load_query_log, replay
+import search_documentation
+from search_documentation import AUTHORITY_WEIGHT, DocumentationSearchEngine, priority_score
+
+SEARCH_SCRIPT = Path(__file__).parent / "search_documentation.py"
+BUILD_SCRIPT = Path(__file__).parent / "build_doc_index.py"
+
+# Startup budget for a one-shot `rag:search` call, in milliseconds, only
+# checked when RAG_TIMING_TESTS=1 (wall-clock budgets fail on loaded CI
+# machines). Import time is measured with `python -X importtime` on top of
+# a bare interpreter start; time-to-first-result is wall time until the
+# CLI prints its first result.
+STARTUP_IMPORT_BUDGET_MS = 60
+FIRST_RESULT_BUDGET_MS = 400
+TIMING_TESTS = os.environ.get("RAG_TIMING_TESTS") == "1"
+
+# Modules that must stay off the snapshot query path
+LAZY_MODULES = [
+	"json",
+	"traceback",
+	"subprocess",
+	"sqlite3",
+	"threading",
+	"index_postings",
+	"index_sqlite",
+	"index_trigrams",
+]
 
 
 def test_index_exists():
@@ -241,6 +294,1221 @@ def test_keyword_extraction():
 		return False
 
 
+def test_snapshot_loading():
+	"""Test that the snapshot is used and scores match the reference scan."""
+	print("🧪 Test 10: Testing index snapshot...")
+
+	index_path = Path("docs/.doc-index.json")
+	assert load_snapshot(index_path) is not None, (
+		"❌ Snapshot missing or stale, rebuild with build_doc_index.py"
+	)
+
+	indexed = DocumentationSearchEngine(scoring_mode="indexed", verbose=False)
+	scan = DocumentationSearchEngine(scoring_mode="scan", verbose=False)
+
+	for query in ["tags", "architecture", "React", "Gemini API", "configuration"]:
+		for min_score in (0.0, 0.3):
+			expected = [
+				(r["document"]["path"], r["score"])
+				for r in scan.search(query, max_results=20, min_score=min_score)
+			]
+			actual = [
+				(r["document"]["path"], r["score"])
+				for r in indexed.search(query, max_results=20, min_score=min_score)
+			]
+			assert actual == expected, f"❌ Indexed results differ for '{query}'"
+
+	print("   ✅ Snapshot loaded and indexed scores match the scan")
+	return True
+
+
+def _parse_importtime(stderr: str) -> dict:
+	"""Parse `-X importtime` output into {module: self time in µs}."""
+	modules = {}
+	for line in stderr.splitlines():
+		if not line.startswith("import time:") or "self [us]" in line:
+			continue
+		self_us, _, name = line[len("import time:"):].split("|")
+		modules[name.strip()] = int(self_us)
+	return modules
+
+
+def test_startup_budget():
+	"""Test that a one-shot CLI query stays on the snapshot startup path."""
+	print("🧪 Test 11: Testing CLI startup path...")
+
+	# Without JSON imported, the documents can only come from the snapshot
+	assert load_snapshot(Path("docs/.doc-index.json")) is not None, "❌ Snapshot missing or stale"
+
+	baseline = subprocess.run(
+		[sys.executable, "-X", "importtime", "-c", "pass"],
+		capture_output=True, text=True,
+	)
+	profile = subprocess.run(
+		[sys.executable, "-X", "importtime", str(SEARCH_SCRIPT), "architecture"],
+		capture_output=True, text=True,
+	)
+	assert profile.returncode == 0, f"❌ Search failed: {profile.stderr[-500:]}"
+	assert "📄" in profile.stdout, "❌ CLI printed no result"
+
+	baseline_modules = _parse_importtime(baseline.stderr)
+	modules = _parse_importtime(profile.stderr)
+	for name in LAZY_MODULES:
+		assert name not in modules or name in baseline_modules, (
+			f"❌ '{name}' imported on the query path"
+		)
+	extra_us = sum(
+		us for name, us in modules.items() if name not in baseline_modules
+	)
+
+	if not TIMING_TESTS:
+		print(f"   ✅ Snapshot query path imports none of {', '.join(LAZY_MODULES)}")
+		return True
+
+	assert extra_us / 1000 <= STARTUP_IMPORT_BUDGET_MS, (
+		f"❌ Imports took {extra_us / 1000:.1f} ms "
+		f"(budget {STARTUP_IMPORT_BUDGET_MS} ms)"
+	)
+
+	env = dict(os.environ, PYTHONUNBUFFERED="1")
+	start = time.perf_counter()
+	process = subprocess.Popen(
+		[sys.executable, str(SEARCH_SCRIPT), "architecture"],
+		stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True, env=env,
+	)
+	first_result_ms = None
+	for line in process.stdout:
+		if line.startswith("📄"):
+			first_result_ms = (time.perf_counter() - start) * 1000
+			break
+	process.stdout.close()
+	process.wait()
+
+	assert first_result_ms is not None, "❌ CLI printed no result"
+	assert first_result_ms <= FIRST_RESULT_BUDGET_MS, (
+		f"❌ First result after {first_result_ms:.0f} ms "
+		f"(budget {FIRST_RESULT_BUDGET_MS} ms)"
+	)
+
+	print(
+		f"   ✅ Imports {extra_us / 1000:.1f} ms, "
+		f"first result after {first_result_ms:.0f} ms"
+	)
+	return True
+
+
+def test_evaluation_harness():
+	"""Test the evaluation metrics and run the harness on every mode."""
+	print("🧪 Test 12: Testing evaluation harness...")
+
+	relevant = {"a.md": 2, "b.md": 1}
+	assert recall_at_k(["c.md", "a.md", "b.md"], relevant, 2) == 0.5, "❌ recall@k"
+	assert reciprocal_rank(["c.md", "b.md"], relevant) == 0.5, "❌ MRR"
+	assert ndcg_at_k(["a.md", "b.md"], relevant, 5) == 1.0, "❌ nDCG ideal"
+	assert ndcg_at_k(["b.md", "a.md"], relevant, 5) < 1.0, "❌ nDCG order"
+
+	golden = load_golden(DEFAULT_GOLDEN_PATH)
+	reports = {
+		mode: evaluate_mode(mode, golden, repeats=1)
+		for mode in DocumentationSearchEngine.SCORING_MODES
+	}
+
+	for mode, report in reports.items():
+		for key in ["recall@5", "mrr", "ndcg@5", "p50_ms", "p99_ms", "peak_memory_kb"]:
+			assert key in report, f"❌ Missing '{key}' in {mode} report"
+		print(
+			f"   {mode}: recall@5 {report['recall@5']:.3f}, MRR {report['mrr']:.3f}, "
+			f"p50 {report['p50_ms']:.2f} ms"
+		)
+
+	# Indexed scoring is exact, so it must not lose quality against the scan
+	for key in ["recall@5", "mrr", "ndcg@5"]:
+		assert reports["indexed"][key] == reports["scan"][key], (
+			f"❌ Indexed {key} differs from scan"
+		)
+
+	print("   ✅ Evaluation harness working")
+	return True
+
+
+def _make_document(path: str, title: str, text: str, priority: str = "normal") -> dict:
+	"""Create a minimal index document for tests on synthetic corpora."""
+	return {
+		"path": path,
+		"title": title,
+		"priority": priority,
+		"keywords": [word.lower() for word in text.split()],
+		"sections": [{"title": title, "level": 1, "content": text + "\n", "line_start": 0}],
+		"word_count": len(text.split()),
+		"heading_count": 1,
+	}
+
+
+def test_segmented_index():
+	"""Test delta segments, hot reload and background merging."""
+	print("🧪 Test 13: Testing segmented index...")
+
+	with tempfile.TemporaryDirectory() as tmp:
+		store = SegmentStore(Path(tmp) / "segments", merge_factor=3)
+		alpha = _make_document("docs/alpha.md", "Alpha", "segment storage alpha")
+		beta = _make_document("docs/beta.md", "Beta", "segment storage beta")
+		store.write_delta([alpha, beta], {"total_documents": 2})
+
+		engine = DocumentationSearchEngine(store.root, verbose=False)
+		paths = {r["document"]["path"] for r in engine.search("segment storage")}
+		assert paths == {"docs/alpha.md", "docs/beta.md"}, f"❌ Unexpected {paths}"
+		first_segment = engine.segments[0]
+
+		# Update alpha, delete beta, add gamma
+		alpha_v2 = _make_document("docs/alpha.md", "Alpha", "segment storage rewritten")
+		gamma = _make_document("docs/gamma.md", "Gamma", "segment storage gamma")
+		assert store.write_delta([alpha_v2, gamma], {"total_documents": 2})
+		assert store.write_delta([alpha_v2, gamma], {"total_documents": 2}) is None, (
+			"❌ Unchanged build wrote a segment"
+		)
+
+		results = engine.search("segment storage")
+		paths = {r["document"]["path"] for r in results}
+		assert paths == {"docs/alpha.md", "docs/gamma.md"}, f"❌ Unexpected {paths}"
+		assert engine.segments[0] is first_segment, "❌ Old segment was reloaded"
+		assert engine.search("rewritten"), "❌ Alpha update not visible"
+		assert not engine.refresh(), "❌ Refresh without a new manifest"
+
+		# Enough small deltas trigger a size-tiered merge
+		for i in range(3):
+			store.write_delta(
+				[alpha_v2, gamma, _make_document(f"docs/extra{i}.md", "Extra", "extra")],
+				{"total_documents": 3},
+			)
+		before = [(r["document"]["path"], r["score"]) for r in engine.search("segment extra")]
+		segments_before = len(store.read_manifest()["segments"])
+		store.merge_in_background().join()
+		segments_after = len(store.read_manifest()["segments"])
+		after = [(r["document"]["path"], r["score"]) for r in engine.search("segment extra")]
+
+		assert segments_after < segments_before, "❌ No merge happened"
+		assert after == before, "❌ Merge changed search results"
+		files = sorted(p.name for p in store.root.glob("seg-*.json"))
+		assert len(files) == segments_after, f"❌ Obsolete segments left: {files}"
+
+		# Deltas are computed from the manifest fingerprints alone
+		read_segment = store.read_segment
+		store.read_segment = None
+		try:
+			assert store.write_delta([alpha_v2], {"total_documents": 1})
+		finally:
+			store.read_segment = read_segment
+		assert set(store.live_documents()) == {"docs/alpha.md"}
+
+	# Concurrent builders in separate processes never drop a segment
+	with tempfile.TemporaryDirectory() as tmp:
+		root = Path(tmp) / "segments"
+		writer = (
+			"import sys; sys.path.insert(0, sys.argv[1])\n"
+			"from index_segments import SegmentStore\n"
+			"store = SegmentStore(sys.argv[2], merge_factor=10**6)\n"
+			"for i in range(10):\n"
+			"    document = {'path': f'docs/{sys.argv[3]}.md', 'title': str(i), 'sections': []}\n"
+			"    print(store.write_delta([document], {}))\n"
+		)
+		processes = [
+			subprocess.Popen(
+				[sys.executable, "-c", writer, str(Path(__file__).parent), str(root), f"writer{n}"],
+				stdout=subprocess.PIPE, text=True,
+			)
+			for n in range(4)
+		]
+		written = [line for process in processes for line in process.communicate()[0].split()]
+		assert all(process.returncode == 0 for process in processes), "❌ Concurrent writer failed"
+		names = [entry["name"] for entry in SegmentStore(root).read_manifest()["segments"]]
+		assert sorted(names) == sorted(written) and len(set(names)) == 40, (
+			f"❌ Concurrent builds lost segments ({len(names)} of {len(written)} listed)"
+		)
+
+	print(f"   ✅ Delta segments and hot reload working ({segments_before} → {segments_after} segments)")
+	return True
+
+
+def test_search_filters():
+	"""Test priority, path prefix and modified filters against the scan."""
+	print("🧪 Test 14: Testing search filters...")
+
+	documents = [
+		_make_document("docs/guides/a.md", "Filter A", "filter common", "high"),
+		_make_document("docs/guides/b.md", "Filter B", "filter common", "normal"),
+		_make_document("docs/archives/c.md", "Filter C", "filter common", "archive"),
+		_make_document("docs/guidelines.md", "Filter D", "filter common", "normal"),
+	]
+	for document, modified in zip(documents, ["2025-06-01", "2026-01-02", "2024-03-04", "2026-02-01"]):
+		document["modified"] = f"{modified}T10:00:00"
+
+	cases = [
+		({"priority": "high"}, {"docs/guides/a.md"}),
+		({"priority": ["normal", "archive"]}, {"docs/guides/b.md", "docs/archives/c.md", "docs/guidelines.md"}),
+		({"path_prefix": "docs/guides/"}, {"docs/guides/a.md", "docs/guides/b.md"}),
+		({"path_prefix": "docs/guide"}, {"docs/guides/a.md", "docs/guides/b.md", "docs/guidelines.md"}),
+		({"modified_since": "2026-01-01"}, {"docs/guides/b.md", "docs/guidelines.md"}),
+		({"modified_since": "2025-01-01", "modified_before": "2026-02-01"}, {"docs/guides/a.md", "docs/guides/b.md"}),
+		({"priority": "normal", "path_prefix": "docs/guides/"}, {"docs/guides/b.md"}),
+		({"path_prefix": "src/"}, set()),
+	]
+
+	with tempfile.TemporaryDirectory() as tmp:
+		index_path = Path(tmp) / "index.json"
+		with open(index_path, "w", encoding="utf-8") as f:
+			json.dump({"metadata": {"total_documents": 4}, "documents": documents}, f)
+
+		indexed = DocumentationSearchEngine(index_path, verbose=False)
+		scan = DocumentationSearchEngine(index_path, scoring_mode="scan", verbose=False)
+
+		for filters, expected in cases:
+			for min_score in (0.0, 0.3):
+				paths = {
+					r["document"]["path"]
+					for r in indexed.search("filter common", 10, min_score, **filters)
+				}
+				reference = {
+					r["document"]["path"]
+					for r in scan.search("filter common", 10, min_score, **filters)
+				}
+				assert paths == expected, f"❌ {filters}: got {paths}"
+				assert paths == reference, f"❌ {filters}: indexed differs from scan"
+
+		try:
+			indexed.search("filter", priority="urgent")
+			assert False, "❌ Unknown priority accepted"
+		except ValueError:
+			pass
+
+	# Filtered results on the real index are a subset of the unfiltered ones
+	engine = DocumentationSearchEngine(verbose=False)
+	unfiltered = {r["document"]["path"] for r in engine.search("database", 50)}
+	filtered = engine.search("database", 50, path_prefix="docs/developer/database/")
+	assert filtered, "❌ No results under docs/developer/database/"
+	for result in filtered:
+		assert result["document"]["path"] in unfiltered, "❌ Filter added a result"
+		assert result["document"]["path"].startswith("docs/developer/database/")
+
+	print(f"   ✅ Filters working ({len(cases)} filter combinations)")
+	return True
+
+
+def test_markdown_tokenizer():
+	"""Test the single-pass tokenizer, including fenced code blocks."""
+	print("🧪 Test 15: Testing markdown tokenizer...")
+
+	content = "\n".join([
+		"Intro paragraph about tokenizer preamble",
+		"# Tokenizer Guide",
+		"Some text about sections.",
+		"```bash",
+		"# install dependencies",
+		"npm install",
+		"```",
+		"## Second Section",
+		"~~~~",
+		"## not a heading either",
+		"~~~",
+		"still inside the fence",
+		"~~~~",
+		"Closing words about tokenizer",
+		"",
+	])
+
+	builder = DocumentationIndexBuilder(docs_root="docs")
+	records = list(builder.tokenize_markdown(content.split("\n")))
+	sections = [r for r in records if r["level"]]
+
+	titles = [s["title"] for s in sections]
+	assert titles == ["Tokenizer Guide", "Second Section"], f"❌ Headings: {titles}"
+	assert "# install dependencies" in sections[0]["content"], "❌ Fenced line lost"
+	assert "## not a heading either" in sections[1]["content"], "❌ Tilde fence ignored"
+	assert records[0]["level"] == 0 and records[0]["title"] is None, "❌ Missing preamble"
+
+	# Counts from the token stream match whole-document extraction
+	word_count = sum(r["word_count"] for r in records)
+	assert word_count == len(content.split()), "❌ Word count mismatch"
+	term_counts = sum((r["term_counts"] for r in records), Counter())
+	keywords = [word for word, _ in term_counts.most_common(50)]
+	assert keywords == builder.extract_keywords(content), "❌ Keyword mismatch"
+
+	print(f"   ✅ Tokenizer working ({len(sections)} sections, {word_count} words)")
+	return True
+
+
+def _build_quietly(docs_root: Path) -> DocumentationIndexBuilder:
+	"""Build an index for a docs tree without the builder's progress output."""
+	builder = DocumentationIndexBuilder(docs_root=str(docs_root))
+	with contextlib.redirect_stdout(io.StringIO()):
+		builder.build_index()
+	return builder
+
+
+def test_deterministic_build():
+	"""Test that identical docs produce an identical index."""
+	print("🧪 Test 16: Testing deterministic index builds...")
+
+	with tempfile.TemporaryDirectory() as tmp:
+		docs_root = Path(tmp) / "docs"
+		(docs_root / "guides").mkdir(parents=True)
+		for name in ["zeta.md", "alpha.md", "guides/beta.md"]:
+			(docs_root / name).write_text(f"# {name}\n\nDeterministic content.\n", encoding="utf-8")
+
+		git = ["git", "-c", "user.name=RAG Test", "-c", "user.email=rag@example.com"]
+		subprocess.run(git + ["init", "-q"], cwd=tmp, check=True)
+		subprocess.run(git + ["add", "."], cwd=tmp, check=True)
+		subprocess.run(git + ["commit", "-q", "-m", "docs"], cwd=tmp, check=True)
+
+		first = _build_quietly(docs_root)
+		first_output = json.dumps({"metadata": first.metadata, "documents": [d.to_dict() for d in first.documents]})
+
+		# A fresh checkout changes mtimes but not the content
+		for file_path in docs_root.rglob("*.md"):
+			os.utime(file_path, (1_000_000_000, 1_000_000_000))
+		second = _build_quietly(docs_root)
+		second_output = json.dumps({"metadata": second.metadata, "documents": [d.to_dict() for d in second.documents]})
+
+		assert first_output == second_output, "❌ Index changed without doc changes"
+		paths = [doc["path"] for doc in first.documents]
+		assert paths == sorted(paths), f"❌ Unsorted traversal: {paths}"
+
+		content_hash = first.metadata["content_hash"]
+		assert second.compute_content_hash() == content_hash, "❌ Unstable content hash"
+		(docs_root / "alpha.md").write_text("# alpha.md\n\nChanged.\n", encoding="utf-8")
+		assert second.compute_content_hash() != content_hash, "❌ Hash ignores content"
+
+		# A segmented build must not make the stale JSON index look current
+		def build(*args: str) -> str:
+			result = subprocess.run(
+				[sys.executable, str(BUILD_SCRIPT), *args], cwd=tmp, capture_output=True, text=True
+			)
+			assert result.returncode == 0, f"❌ Build {args} failed: {result.stderr[-500:]}"
+			return result.stdout
+
+		(docs_root / "alpha.md").write_text("# alpha.md\n\nDeterministic content.\n", encoding="utf-8")
+		build()
+		assert "skipping build" in build("--if-changed"), "❌ Unchanged docs rebuilt"
+		(docs_root / "alpha.md").write_text("# alpha.md\n\nChanged.\n", encoding="utf-8")
+		build("--segments")
+		assert "skipping build" not in build("--if-changed"), "❌ Stale JSON index skipped"
+		assert "Changed." in (docs_root / ".doc-index.json").read_text(encoding="utf-8")
+		assert "skipping build" in build("--segments", "--if-changed")
+		assert "skipping build" not in build("--if-changed", "--max-section-size", "64"), (
+			"❌ Changed size caps skipped"
+		)
+
+	print(f"   ✅ Builds are reproducible (hash {content_hash[:12]})")
+	return True
+
+
+def test_document_records():
+	"""Test that slotted records round-trip the JSON index schema."""
+	print("🧪 Test 17: Testing document records...")
+
+	with open("docs/.doc-index.json", "r", encoding="utf-8") as f:
+		index = json.load(f)
+
+	for data in index["documents"]:
+		document = Document.from_dict(data)
+		assert document.to_dict() == data, f"❌ JSON round trip failed for {data['path']}"
+		assert Document.from_tuple(document.to_tuple()) == document, "❌ Tuple round trip failed"
+		assert document["path"] == document.get("path") == data["path"], "❌ Mapping access"
+
+	assert not hasattr(document, "__dict__"), "❌ Records should not carry a __dict__"
+	assert not hasattr(document.sections[0], "__dict__"), "❌ Sections should be slotted"
+
+	print(f"   ✅ {len(index['documents'])} documents round-trip through records")
+	return True
+
+
+def test_link_graph():
+	"""Test link extraction, authority scores and broken link reporting."""
+	print("🧪 Test 18: Testing link graph...")
+
+	with tempfile.TemporaryDirectory() as tmp:
+		docs_root = Path(tmp) / "docs"
+		(docs_root / "guides").mkdir(parents=True)
+		(docs_root / "hub.md").write_text("# Hub\n\nThe central page.\n", encoding="utf-8")
+		(docs_root / "guides" / "one.md").write_text(
+			"# One\n\nSee [the hub](../hub.md#top) and [two](two.md).\n"
+			"Also [missing](./missing.md), [site](https://example.com) and [anchor](#one).\n"
+			"```md\n[in code](ignored.md)\n```\n"
+			"Inline `[code](ignored.md)` and ![image](../hub.md).\n",
+			encoding="utf-8",
+		)
+		(docs_root / "guides" / "two.md").write_text(
+			"# Two\n\n[Hub](/docs/hub.md)\n", encoding="utf-8"
+		)
+
+		builder = _build_quietly(docs_root)
+		documents = {doc.path: doc for doc in builder.documents}
+
+		assert documents["docs/guides/one.md"].links == ["docs/guides/two.md", "docs/hub.md"], (
+			f"❌ Unexpected links {documents['docs/guides/one.md'].links}"
+		)
+		assert documents["docs/guides/two.md"].links == ["docs/hub.md"], "❌ Root-relative link"
+		assert builder.broken_links == [
+			{"source": "docs/guides/one.md", "line": 4, "target": "./missing.md"}
+		], f"❌ Unexpected broken links {builder.broken_links}"
+
+		authority = {path: doc.authority for path, doc in documents.items()}
+		assert authority["docs/hub.md"] == 1.0, "❌ Most linked page should lead"
+		assert authority["docs/hub.md"] > authority["docs/guides/two.md"] > authority["docs/guides/one.md"]
+		assert builder.metadata["link_graph"]["links"] == 3, "❌ Link count"
+
+	# Authority enters the score identically in both scoring modes
+	engine = DocumentationSearchEngine(verbose=False)
+	for document in engine.index_data["documents"]:
+		assert 0.0 <= document.authority <= 1.0, f"❌ Authority out of range: {document.path}"
+	scan = DocumentationSearchEngine(scoring_mode="scan", verbose=False)
+	for query in ["setup", "interface features", "database"]:
+		indexed_results = [(r["document"].path, r["score"]) for r in engine.search(query, min_score=0.0)]
+		scan_results = [(r["document"].path, r["score"]) for r in scan.search(query, min_score=0.0)]
+		assert indexed_results == scan_results, f"❌ Modes differ for '{query}'"
+
+	print(f"   ✅ Link graph working (hub authority {authority['docs/hub.md']:.2f})")
+	return True
+
+
+def test_bounded_ingestion():
+	"""Test streaming ingestion and per-file / per-section size caps."""
+	print("🧪 Test 19: Testing bounded-memory ingestion...")
+
+	with tempfile.TemporaryDirectory() as tmp:
+		docs_root = Path(tmp) / "docs"
+		docs_root.mkdir()
+		file_path = docs_root / "changelog.md"
+		with open(file_path, "w", encoding="utf-8") as f:
+			f.write("# Changelog\n\nGenerated release notes.\n")
+			for version in range(50):
+				f.write(f"\n## v{version}.0.0\n\n")
+				for line in range(40):
+					f.write(f"- Fixed collection viewer regression {version}.{line}\n")
+
+		def process(**caps):
+			builder = DocumentationIndexBuilder(docs_root=str(docs_root), **caps)
+			with contextlib.redirect_stdout(io.StringIO()):
+				return builder.process_document(file_path)
+
+		whole = process()
+		streamed = process(streaming_threshold=0)
+		assert streamed == whole, "❌ Streaming changed the document"
+		assert not whole.truncation, "❌ Unexpected truncation"
+
+		# Section cap: content is bounded, counts still cover the full text
+		capped = process(max_section_size=200)
+		assert all(len(s.content) <= 200 for s in capped.sections), "❌ Section cap ignored"
+		assert capped.keywords == whole.keywords, "❌ Section cap changed keywords"
+		assert capped.word_count == whole.word_count, "❌ Section cap changed word count"
+		assert capped.truncation == {"sections": 50}, f"❌ Unexpected {capped.truncation}"
+
+		# File cap: indexing stops early and records how much was read
+		file_capped = process(max_file_size=2000, streaming_threshold=0)
+		indexed_chars = file_capped.truncation["indexed_chars"]
+		assert 0 < indexed_chars <= 2000, f"❌ Unexpected {file_capped.truncation}"
+		assert file_capped.word_count < whole.word_count, "❌ File cap ignored"
+
+	print(f"   ✅ Streaming and size caps working ({indexed_chars} chars under file cap)")
+	return True
+
+
+def test_multi_root_index():
+	"""Test indexing several roots with extractors, parallelism and per-root state."""
+	print("🧪 Test 20: Testing multi-root indexing...")
+
+	with tempfile.TemporaryDirectory() as tmp:
+		repo = Path(tmp)
+		(repo / "docs").mkdir()
+		(repo / "src" / "services").mkdir(parents=True)
+		(repo / "src-tauri" / "src").mkdir(parents=True)
+		(repo / "docs" / "guide.md").write_text("# Guide\n\nSuggest tags from the gallery.\n", encoding="utf-8")
+		(repo / "README.md").write_text("# Project\n\nRepository overview.\n", encoding="utf-8")
+		(repo / "src" / "services" / "tags.ts").write_text(
+			"/**\n * Tag Suggestion Service\n */\n\nimport { x } from './x';\n\n"
+			"/**\n * Suggest tags from similar images\n */\n"
+			"export const suggestTags = async () => [];\n",
+			encoding="utf-8",
+		)
+		(repo / "src" / "constants.ts").write_text("export const LIMIT = 5;\n", encoding="utf-8")
+		(repo / "src-tauri" / "src" / "lib.rs").write_text(
+			"//! Tauri backend entry point\n\n/// Opens the photo database\n"
+			"#[tauri::command]\npub fn open_database() {}\n",
+			encoding="utf-8",
+		)
+		roots = [
+			IndexRoot("docs", "docs"),
+			IndexRoot("readme", ".", ("README.md",)),
+			IndexRoot("src", "src", ("**/*.ts",), "tsdoc"),
+			IndexRoot("tauri", "src-tauri/src", ("**/*.rs",), "rustdoc"),
+		]
+
+		def build(jobs: int = 1, state: bool = True):
+			builder = DocumentationIndexBuilder(
+				docs_root=str(repo / "docs"),
+				roots=roots,
+				state_dir=str(repo / "state") if state else None,
+				jobs=jobs,
+			)
+			parsed = []
+			process_document = builder.process_document
+			builder.process_document = lambda path, root=None: (
+				parsed.append(path.name) or process_document(path, root)
+			)
+			with contextlib.redirect_stdout(io.StringIO()):
+				builder.build_index()
+			return builder, parsed
+
+		first, parsed = build()
+		documents = {doc.path: doc for doc in first.documents}
+		assert sorted(parsed) == ["README.md", "constants.ts", "guide.md", "lib.rs", "tags.ts"], f"❌ {parsed}"
+		assert "src/constants.ts" not in documents, "❌ File without doc comments indexed"
+		(repo / "notes").mkdir()
+		(repo / "notes" / "empty.md").write_text("", encoding="utf-8")
+		with contextlib.redirect_stdout(io.StringIO()):
+			empty = first.process_document(repo / "notes" / "empty.md", roots[0])
+		assert empty is not None and empty.word_count == 0, "❌ Empty markdown page skipped"
+		assert [doc.source for doc in first.documents] == ["docs", "readme", "src", "tauri"]
+		ts_sections = [s.title for s in documents["src/services/tags.ts"].sections]
+		assert ts_sections == ["Overview", "suggestTags"], f"❌ TSDoc sections {ts_sections}"
+		rs_sections = [s.title for s in documents["src-tauri/src/lib.rs"].sections]
+		assert rs_sections == ["Overview", "open_database"], f"❌ Rust doc sections {rs_sections}"
+		assert first.metadata["source_breakdown"] == {"docs": 1, "readme": 1, "src": 1, "tauri": 1}
+
+		# Unchanged roots are served from their state; one edit reparses one file
+		second, parsed = build()
+		assert parsed == [], f"❌ Unchanged files parsed again: {parsed}"
+		assert [d.to_dict() for d in second.documents] == [d.to_dict() for d in first.documents]
+		(repo / "README.md").write_text("# Project\n\nRepository overview, updated.\n", encoding="utf-8")
+		third, parsed = build()
+		assert parsed == ["README.md"], f"❌ Unexpected reparse: {parsed}"
+
+		# Parallel workers produce the same index as the in-process build
+		parallel, _ = build(jobs=2, state=False)
+		assert [d.to_dict() for d in parallel.documents] == [d.to_dict() for d in third.documents]
+
+		# Source filter, identical in both scoring modes
+		index_path = repo / "index.json"
+		with contextlib.redirect_stdout(io.StringIO()):
+			third.save_index(str(index_path))
+		for mode in DocumentationSearchEngine.SCORING_MODES:
+			engine = DocumentationSearchEngine(str(index_path), scoring_mode=mode, verbose=False)
+			paths = [r["document"].path for r in engine.search("suggest tags", source="src")]
+			assert paths == ["src/services/tags.ts"], f"❌ {mode} source filter: {paths}"
+			assert len(engine.search("suggest tags", min_score=0.0)) == 4
+
+	print("   ✅ Multi-root indexing working (4 roots, incremental state, parallel workers)")
+	return True
+
+
+def test_external_memory_build():
+	"""Test the SPIMI build: sorted runs, k-way merge and compressed postings."""
+	print("🧪 Test 21: Testing external-memory index build...")
+
+	encoded = bytearray()
+	values = [0, 1, 127, 128, 16383, 16384, 2**31]
+	for value in values:
+		encode_varbyte(value, encoded)
+	assert decode_varbytes(bytes(encoded)) == values, "❌ Variable-byte round trip failed"
+
+	with tempfile.TemporaryDirectory() as tmp:
+		output_dir = Path(tmp) / "postings"
+		builder = DocumentationIndexBuilder(docs_root="docs")
+		with contextlib.redirect_stdout(io.StringIO()):
+			# A tiny budget forces many runs through the merge
+			stats = builder.build_external_index(str(output_dir), memory_budget=64 * 1024)
+		assert stats["runs"] > 1, f"❌ Expected several runs, got {stats['runs']}"
+		assert not list(output_dir.glob(".spimi-*")), "❌ Temporary runs left behind"
+
+		# Merged postings equal the in-memory lookups of the same documents
+		reference = DocumentationSearchEngine(verbose=False)
+		lookups = build_lookups(reference.index_data["documents"])
+		with open(output_dir / "table.json", "r", encoding="utf-8") as f:
+			table = json.load(f)
+		reader = PostingsReader(output_dir / table["postings_file"])
+		for term, doc_ids in lookups["title_terms"].items():
+			assert [d for d, _ in reader.postings("t:" + term)] == doc_ids, f"❌ Title postings of {term}"
+		for term, counts in lookups["section_terms"].items():
+			assert dict(reader.postings("s:" + term)) == counts, f"❌ Section postings of {term}"
+		assert len(reader) == stats["terms"]
+		assert reader.postings("t:no-such-term") == [] and reader.postings("~") == []
+
+		# Per-document state is counted against the budget, leaving postings
+		# less room (but at least their share of it)
+		documents = reference.index_data["documents"]
+		writers = [SpimiIndexWriter(str(Path(tmp) / name), 256 * 1024) for name in ("free", "reserved")]
+		try:
+			writers[1].reserve(10 * 1024 * 1024)
+			assert writers[1].postings_budget() == 256 * 1024 // 8
+			for writer in writers:
+				for document in documents:
+					writer.add_document(document)
+			assert len(writers[1].runs) > len(writers[0].runs), "❌ Reserved memory ignored"
+		finally:
+			for writer in writers:
+				writer.close()
+
+		# Searching the posting index gives the same results as the JSON index
+		for mode in DocumentationSearchEngine.SCORING_MODES:
+			engine = DocumentationSearchEngine(str(output_dir), scoring_mode=mode, verbose=False)
+			for query in ["database migrations", "tags", "keyboard shortcuts"]:
+				expected = [(r["document"].path, r["score"]) for r in reference.search(query, max_results=10)]
+				actual = [(r["document"].path, r["score"]) for r in engine.search(query, max_results=10)]
+				assert actual == expected, f"❌ {mode} results differ for '{query}'"
+
+	# A reader opened before a rebuild keeps reading its own generation
+	with tempfile.TemporaryDirectory() as tmp:
+		output_dir = Path(tmp) / "postings"
+
+		def publish(documents: list) -> None:
+			writer = SpimiIndexWriter(str(output_dir))
+			try:
+				for document in documents:
+					writer.add_document(Document.from_dict(document))
+				writer.finish({"total_documents": len(documents)}, {})
+			finally:
+				writer.close()
+
+		old = Document.from_dict(_make_document("docs/alpha.md", "Alpha", "generation storage old")).to_dict()
+		publish([old])
+		before = DocumentationSearchEngine(str(output_dir), verbose=False)
+
+		new = Document.from_dict(
+			_make_document("docs/alpha.md", "Alpha", "generation storage rewritten " + "padding " * 50)
+		).to_dict()
+		publish([_make_document("docs/beta.md", "Beta", "generation storage beta"), new])
+		after = DocumentationSearchEngine(str(output_dir), verbose=False)
+
+		assert before.get_document("docs/alpha.md").to_dict() == old, "❌ Old reader mixed generations"
+		assert after.get_document("docs/alpha.md").to_dict() == new, "❌ New reader sees the old index"
+
+		# Concurrent readers share the document cache, evicting constantly
+		documents = after.segments[0]["documents"]
+		documents.cache_size = 1
+		with ThreadPoolExecutor(max_workers=8) as pool:
+			titles = list(pool.map(lambda i: documents[i % 2].title, range(2000)))
+		assert titles == ["Beta", "Alpha"] * 1000, "❌ Concurrent cache reads failed"
+		assert len(documents._cache) <= 1
+
+		publish([new])
+		names = sorted(path.name for path in output_dir.iterdir())
+		assert names == [
+			"documents-000002.jsonl", "documents-000003.jsonl",
+			"postings-000002.bin", "postings-000003.bin", "table.json",
+		], f"❌ Unexpected generation files: {names}"
+		assert after.get_document("docs/alpha.md").to_dict() == new
+
+	print(f"   ✅ SPIMI build working ({stats['runs']} runs, {stats['terms']} posting keys)")
+	return True
+
+
+def test_overlay_index():
+	"""Test that a git-diff overlay on a base index matches a full rebuild."""
+	print("🧪 Test 22: Testing git-aware overlay indexes...")
+
+	with tempfile.TemporaryDirectory() as tmp:
+		docs_root = Path(tmp) / "docs"
+		docs_root.mkdir()
+		pages = {
+			"storage.md": "# Storage\n\n## Backends\n\nSQLite storage backend and migrations.\n",
+			"tags.md": "# Tags\n\n## Tag rules\n\nTags group photos in the gallery.\n",
+			"search.md": "# Search\n\n## Ranking\n\nSearch ranking of gallery photos.\n",
+		}
+		for name, text in pages.items():
+			(docs_root / name).write_text(text, encoding="utf-8")
+
+		git = ["git", "-c", "user.name=RAG Test", "-c", "user.email=rag@example.com"]
+		subprocess.run(git + ["init", "-q"], cwd=tmp, check=True)
+		subprocess.run(git + ["add", "."], cwd=tmp, check=True)
+		subprocess.run(git + ["commit", "-q", "-m", "docs"], cwd=tmp, check=True)
+
+		base = _build_quietly(docs_root)
+		base_path = Path(tmp) / "base.json"
+		with contextlib.redirect_stdout(io.StringIO()):
+			base.save_index(str(base_path))
+			base.save_metadata(str(Path(tmp) / "base-metadata.json"))
+
+		# Branch changes: one edit, one new page, one deletion
+		(docs_root / "tags.md").write_text(
+			"# Tags\n\n## Tag rules\n\nTags group albums with keyboard shortcuts.\n", encoding="utf-8"
+		)
+		(docs_root / "shortcuts.md").write_text(
+			"# Shortcuts\n\n## Keyboard\n\nKeyboard shortcuts of the gallery.\n", encoding="utf-8"
+		)
+		(docs_root / "storage.md").unlink()
+
+		builder = DocumentationIndexBuilder(docs_root=str(docs_root))
+		overlay_path = Path(tmp) / "overlay.json"
+		with contextlib.redirect_stdout(io.StringIO()):
+			builder.build_overlay("HEAD", str(Path(tmp) / "base-metadata.json"))
+			builder.save_overlay(str(overlay_path))
+		assert [doc.path for doc in builder.documents] == ["docs/shortcuts.md", "docs/tags.md"]
+		assert builder.deleted == ["docs/storage.md"], f"❌ Tombstones: {builder.deleted}"
+
+		full = _build_quietly(docs_root)
+		full_path = Path(tmp) / "full.json"
+		with contextlib.redirect_stdout(io.StringIO()):
+			full.save_index(str(full_path))
+
+		engine = DocumentationSearchEngine(str(base_path), verbose=False, overlay_path=str(overlay_path))
+		reference = DocumentationSearchEngine(str(full_path), verbose=False)
+		assert sorted(doc.path for doc in engine.index_data["documents"]) == sorted(
+			doc.path for doc in reference.index_data["documents"]
+		), "❌ Overlay does not shadow the base documents"
+		for query in ["keyboard shortcuts", "gallery photos", "sqlite storage", "tags albums"]:
+			for mode in DocumentationSearchEngine.SCORING_MODES:
+				engine.scoring_mode = mode
+				expected = [(r["document"].path, r["score"]) for r in reference.search(query, min_score=0.0)]
+				actual = [(r["document"].path, r["score"]) for r in engine.search(query, min_score=0.0)]
+				assert sorted(actual) == sorted(expected), f"❌ {mode} overlay results differ for '{query}'"
+
+		assert engine.index_data["metadata"]["overlay"]["deleted_documents"] == 1
+
+	print("   ✅ Overlay shadows edited, added and deleted documents")
+	return True
+
+
+def test_query_log_replay():
+	"""Test query logging and the concurrent replay load tester."""
+	print("🧪 Test 23: Testing query logging and replay...")
+
+	with tempfile.TemporaryDirectory() as tmp:
+		log_path = Path(tmp) / "queries.jsonl"
+		engine = DocumentationSearchEngine(verbose=False, query_log=str(log_path))
+		results = engine.search("database migrations", max_results=3, path_prefix="docs/")
+		engine.search("tags", min_score=0.1)
+		related = engine.find_related_documents(results[0]["document"].path, max_related=2)
+
+		records = load_query_log(str(log_path))
+		# The search behind a related query is not logged on its own
+		assert [r["operation"] for r in records] == ["search", "search", "related"], records
+		first = records[0]
+		assert first["query"] == "database migrations"
+		assert first["params"]["max_results"] == 3 and first["params"]["path_prefix"] == "docs/"
+		assert first["results"] == len(results) and first["latency_ms"] >= 0
+		assert records[2]["results"] == len(related)
+		assert "timestamp" in first
+
+		# A line cut short by a crash is skipped
+		with open(log_path, "a", encoding="utf-8") as f:
+			f.write('{"operation": "search", "que')
+		assert len(load_query_log(str(log_path))) == 3
+
+		for processes in (False, True):
+			report = replay(records * 4, workers=2, processes=processes, rate=200, slowest=3)
+			assert report["completed"] == 12 and not report["errors"], report["errors"]
+			assert report["result_mismatches"] == 0, "❌ Replayed results differ from the log"
+			assert report["throughput_qps"] > 0
+			assert report["service_ms"]["p50"] <= report["service_ms"]["p99"] <= report["service_ms"]["max"]
+			slowest = [query["service_ms"] for query in report["slowest"]]
+			assert len(slowest) == 3 and slowest == sorted(slowest, reverse=True)
+
+	print(f"   ✅ Queries logged and replayed ({report['throughput_qps']:.0f} q/s with 2 processes)")
+	return True
+
+
+def test_section_tree():
+	"""Test section tree links, source spans and context expansion."""
+	print("🧪 Test 24: Testing section tree and context expansion...")
+
+	engine = DocumentationSearchEngine(verbose=False)
+	checked = 0
+	for document in engine.index_data["documents"]:
+		if document.truncation:
+			continue
+		raw = Path(document.path).read_bytes()
+		lines = raw.decode("utf-8").split("\n")
+		for index, section in enumerate(document.sections):
+			heading = raw[section.byte_start:section.byte_end].decode("utf-8").split("\n", 1)[0]
+			assert heading.lstrip("#").strip() == section.title, f"❌ Byte span of {document.path}#{index}"
+			assert lines[section.line_start - 1] == heading, f"❌ Line span of {document.path}#{index}"
+			# Subtrees are contiguous and nested in their parent
+			last = document.sections[section.subtree_end - 1]
+			assert all(s.level > section.level for s in document.sections[index + 1:section.subtree_end])
+			assert last.byte_end <= (
+				document.sections[section.subtree_end].byte_start
+				if section.subtree_end < len(document.sections) else len(raw)
+			)
+			if section.parent is not None:
+				parent = document.sections[section.parent]
+				assert parent.level < section.level and section.parent < index < parent.subtree_end
+				assert section.breadcrumb == parent.breadcrumb + [section.title]
+			checked += 1
+
+	content = "\n".join([
+		"# Guide", "Intro.",
+		"## Install", "Install steps.",
+		"### Linux", "apt install.",
+		"### macOS", "brew install.",
+		"## Usage", "Run it.",
+		"",
+	])
+	builder = DocumentationIndexBuilder(docs_root="docs")
+	sections = builder.extract_markdown_sections(content)
+	assert [s.parent for s in sections] == [None, 0, 1, 1, 0]
+	assert [s.subtree_end for s in sections] == [5, 4, 3, 4, 5]
+	assert sections[3].breadcrumb == ["Guide", "Install", "macOS"]
+	assert (sections[2].line_start, sections[2].line_end) == (5, 6)
+
+	# Byte spans of CRLF files match the raw bytes, on both read paths
+	with tempfile.TemporaryDirectory() as tmp:
+		crlf_path = Path(tmp) / "crlf.md"
+		crlf_path.write_bytes(content.replace("\n", "\r\n").replace("macOS", "mac\u00e9").encode("utf-8"))
+		raw = crlf_path.read_bytes()
+		for threshold in (len(raw), 0):
+			builder.streaming_threshold = threshold
+			lines = builder.read_lines(crlf_path, len(raw), {})
+			records = [r for r in builder.tokenize_markdown(lines) if r["level"]]
+			for record in records:
+				span = raw[record["byte_start"]:record["byte_end"]].decode("utf-8")
+				assert span.split("\r\n", 1)[0].lstrip("#").strip() == record["title"], (
+					f"❌ CRLF byte span of {record['title']}"
+				)
+				assert "\r" not in record["content"] and "\r" not in record["title"]
+			assert records[-1]["byte_end"] == len(raw)
+
+	# Indexes written before the tree existed are linked on load
+	legacy = Document.from_dict({
+		"path": "legacy.md",
+		"title": "Legacy",
+		"sections": [{"title": s.title, "level": s.level, "content": s.content, "line_start": 0} for s in sections],
+	})
+	assert [s.subtree_end for s in legacy.sections] == [5, 4, 3, 4, 5]
+
+	document = Document("docs/guide.md", "Guide", sections=sections)
+	subtree = engine.expand_section(document, 1, "subtree", token_budget=1000)
+	assert [e["index"] for e in subtree["sections"]] == [1, 2, 3] and not subtree["truncated"]
+	siblings = engine.expand_section(document, 2, "siblings", token_budget=1000)
+	assert [e["index"] for e in siblings["sections"]] == [2, 3]
+	parent = engine.expand_section(document, 2, "parent", token_budget=1000)
+	assert [e["index"] for e in parent["sections"]] == [1, 2, 3]
+	usage = engine.expand_section(document, 4, "siblings", token_budget=1000)
+	assert [e["index"] for e in usage["sections"]] == [1, 4]
+	top = engine.expand_section(document, 0, "siblings", token_budget=1000)
+	assert [e["index"] for e in top["sections"]] == [0]
+	# A tight budget keeps the section itself and its parent first
+	tight = engine.expand_section(document, 2, "parent", token_budget=13)
+	assert [e["index"] for e in tight["sections"]] == [1, 2] and tight["truncated"]
+	assert tight["tokens"] <= 13
+	cut = engine.expand_section(document, 0, "subtree", token_budget=1)
+	assert cut["sections"][0]["text"] == "# Gu" and cut["truncated"]
+
+	# Search results point at sections that can be expanded by path
+	result = engine.search("database migrations", max_results=1)[0]
+	hit = result["matching_sections"][0]
+	assert engine.get_document(result["document"].path) is result["document"]
+	assert engine.get_document("docs/missing.md") is None
+	context = engine.expand_section(result["document"].path, hit["index"], "parent", 500)
+	assert context["section"] is hit["section"] and context["tokens"] <= 500
+
+	print(f"   ✅ Section tree and spans verified on {checked} sections")
+	return True
+
+
+def test_deadline_search():
+	"""Test budgeted searches: prior order, partial flag and exact completion."""
+	print("🧪 Test 25: Testing deadline-aware search...")
+
+	with tempfile.TemporaryDirectory() as tmp:
+		# An overlay adds a second segment, so candidates are merged across segments
+		base = DocumentationSearchEngine(verbose=False)
+		documents = base.index_data["documents"]
+		edited = documents[3].to_dict()
+		edited["title"] = "Database migrations overview"
+		overlay_path = Path(tmp) / "overlay.json"
+		overlay_path.write_text(
+			json.dumps({"metadata": {}, "documents": [edited], "deleted": [documents[5].path]}),
+			encoding="utf-8",
+		)
+
+		for mode in DocumentationSearchEngine.SCORING_MODES:
+			engine = DocumentationSearchEngine(scoring_mode=mode, verbose=False, overlay_path=str(overlay_path))
+			for query in ["database migrations", "tags", "keyboard shortcuts gallery"]:
+				for min_score in (0.0, 0.3):
+					expected = [(r["document"].path, r["score"]) for r in engine.search(query, 10, min_score)]
+					results = engine.search(query, 10, min_score, deadline_ms=60_000, max_work=10**6)
+					assert not results.partial, f"❌ {mode} search cut short for '{query}'"
+					assert [(r["document"].path, r["score"]) for r in results] == expected, (
+						f"❌ {mode} budgeted results differ for '{query}'"
+					)
+
+			# A work budget scores the documents with the best priors first
+			results = engine.search("database migrations", min_score=0.0, max_work=4)
+			assert results.partial and results.visited == 4 and results.candidates > 4
+			priors = sorted(
+				(priority_score(d.priority) + d.authority * AUTHORITY_WEIGHT for d in engine.index_data["documents"]),
+				reverse=True,
+			)
+			for result in results:
+				document = result["document"]
+				assert priority_score(document.priority) + document.authority * AUTHORITY_WEIGHT >= priors[3]
+
+			expired = engine.search("database migrations", deadline_ms=0)
+			assert expired.partial and expired.visited == 0 and list(expired) == []
+
+		related = engine.find_related_documents(documents[0].path, max_related=2, max_work=3)
+		assert related.partial and len(related) <= 2
+		assert not engine.search("tags").partial, "❌ Unbudgeted search flagged partial"
+
+	print("   ✅ Budgeted searches visit best priors first and match complete searches")
+	return True
+
+
+def test_two_tier_search():
+	"""Test two-tier search: metadata candidates, lazily read full documents."""
+	print("🧪 Test 26: Testing two-tier search...")
+
+	with tempfile.TemporaryDirectory() as tmp:
+		index_path = Path(tmp) / "index.json"
+		metadata_path = Path(tmp) / "metadata.json"
+		builder = DocumentationIndexBuilder(docs_root="docs")
+		with contextlib.redirect_stdout(io.StringIO()):
+			builder.build_index()
+			builder.save_index(str(index_path))
+			builder.save_metadata(str(metadata_path))
+
+		reference = DocumentationSearchEngine(str(index_path), verbose=False)
+		engine = DocumentationSearchEngine(str(metadata_path), verbose=False)
+		bodies = engine.segments[0]["bodies"]
+		assert not bodies._cache, "❌ Full documents read while loading the first tier"
+
+		# First-tier scores are lower bounds of the full scores
+		full_scores = {
+			r["document"].path: r["score"] for r in reference.search("database migrations", 100, 0.0)
+		}
+		for stub, score in engine.calculate_indexed_scores(["database", "migrations"], 0.0):
+			assert score <= full_scores[stub.path] + 1e-12, f"❌ First tier overestimates {stub.path}"
+
+		# Candidates are rescored exactly on their full documents
+		results = engine.search("tags system")
+		expected = reference.search("tags system")
+		assert [(r["document"].path, r["score"]) for r in results] == [
+			(r["document"].path, r["score"]) for r in expected
+		], "❌ Two-tier results differ from the full index"
+		assert results[0]["matching_sections"] and results[0]["document"].sections[0].content
+
+		# A word that only occurs in a body (not in any stub) is found, and
+		# documents whose term filter excludes it are never read
+		engine = DocumentationSearchEngine(str(metadata_path), verbose=False)
+		bodies = engine.segments[0]["bodies"]
+		results = engine.search("enqueue", 20, 0.12)
+		assert [r["document"].path for r in results] == [
+			r["document"].path for r in reference.search("enqueue", 20, 0.12)
+		], "❌ Two-tier results differ from the full index"
+		assert any(r["matching_sections"] for r in results), (
+			"❌ Body-only match missed by the two-tier index"
+		)
+		read = len(bodies._cache)
+		assert read < len(bodies), "❌ Every full document read for a body-only word"
+
+		# Results equal the full index even when few candidates are read
+		# per batch, beyond the best first-tier scores
+		saved = search_documentation.FIRST_TIER_CANDIDATES
+		search_documentation.FIRST_TIER_CANDIDATES = 1
+		try:
+			for query in ["database migrations", "keyboard shortcuts gallery", "gemini", "enqueue"]:
+				for min_score in (0.0, 0.3):
+					assert [(r["document"].path, r["score"]) for r in engine.search(query, 10, min_score)] == [
+						(r["document"].path, r["score"]) for r in reference.search(query, 10, min_score)
+					], f"❌ Reranked results differ for '{query}'"
+		finally:
+			search_documentation.FIRST_TIER_CANDIDATES = saved
+
+		# A body store rewritten after the metadata is detected
+		with open(index_path, "a", encoding="utf-8") as f:
+			f.write("\n")
+		try:
+			DocumentationSearchEngine(str(metadata_path), verbose=False)
+			assert False, "❌ Stale body store accepted"
+		except ValueError:
+			pass
+
+		# Metadata without a body store is refused, not served as stubs
+		with open(metadata_path, "r", encoding="utf-8") as f:
+			metadata = json.load(f)
+		del metadata["metadata"]["body_store"]
+		for doc in metadata["documents"]:
+			del doc["body"]
+		with open(metadata_path, "w", encoding="utf-8") as f:
+			json.dump(metadata, f)
+		try:
+			DocumentationSearchEngine(str(metadata_path), verbose=False)
+			assert False, "❌ Metadata without body store accepted"
+		except ValueError as e:
+			assert "build_doc_index.py" in str(e)
+
+	print(f"   ✅ Two-tier search working ({len(results)} results, {read} documents read)")
+	return True
+
+
+def test_pattern_search():
+	"""Test substring and regex queries narrowed by the trigram index."""
+	print("🧪 Test 27: Testing substring and regex search...")
+
+	assert regex_query(r"use(Library|Collections)\b") == ("all", ["use"])
+	assert regex_query(r"useState|useRef") == ("any", [("all", ["usestate"]), ("all", ["useref"])])
+	assert regex_query(r"colou?r") == ("all", ["colo"]), "❌ Optional character kept in a literal"
+	assert regex_query(r"[Tt]ag\.tsx") == ("all", ["ag.tsx"])
+	assert regex_query(r"a{2,}|tags") is None, "❌ Alternative without literal narrowed"
+	# Escapes are consumed whole: decoded to their character, or flushed
+	for pattern in [r"\x75seTag", r"\u0075seTag", r"\U00000075seTag", r"\165seTag", r"use\124ag"]:
+		assert regex_query(pattern) == ("all", ["usetag"]), f"❌ Escape digits kept in '{pattern}'"
+	assert regex_query(r"\0165seTag") == ("all", ["\x0e5setag"]), "❌ Octal \\0 escape"
+	assert regex_query(r"(u)\12seTag") == ("all", ["setag"]), "❌ Backreference digits kept"
+	assert regex_query(r"\N{LATIN SMALL LETTER U}seTag") == ("all", ["setag"])
+	assert fold_case("\u0130\u017fK") == "isk"
+
+	engine = DocumentationSearchEngine(verbose=False)
+	trigrams = engine._trigram_index()
+	assert "format" in trigrams, "❌ Trigram file of the builder not used"
+	built = build_trigrams(engine.index_data["documents"])
+	assert built["postings"] == trigrams["postings"] and built["starts"] == trigrams["starts"]
+
+	# Narrowed searches find exactly the documents a full scan finds
+	for query, matches in [
+		("substring:useLibrary", lambda text: "uselibrary" in text.lower()),
+		("substring:.tsx", lambda text: ".tsx" in text.lower()),
+		("regex:use(Library|Collections)\\b", lambda text: re.search(r"use(Library|Collections)\b", text, re.I)),
+		("regex:gemini.*api", lambda text: re.search(r"gemini.*api", text, re.I)),
+		("regex:\\x75seLibrary", lambda text: "uselibrary" in text.lower()),
+		("regex:\\u0075se\\114ibrary", lambda text: "uselibrary" in text.lower()),
+	]:
+		expected = {
+			document.path
+			for document in engine.index_data["documents"]
+			if matches(document.title)
+			or any(matches(section.title + "\n" + section.content) for section in document.sections)
+		}
+		results = engine.search(query, max_results=100, min_score=0.0)
+		assert {r["document"].path for r in results} == expected, f"❌ Wrong documents for '{query}'"
+		assert expected, f"❌ No match for '{query}'"
+		for result in results:
+			for section in result["matching_sections"]:
+				assert section["matches"] > 0
+
+	# Segmented indexes build the trigram index in memory
+	with tempfile.TemporaryDirectory() as tmp:
+		store = SegmentStore(Path(tmp) / "segments")
+		documents = engine.index_data["documents"]
+		store.write_delta([doc.to_dict() for doc in documents], {})
+		segmented = DocumentationSearchEngine(str(store.root), verbose=False)
+		assert [(r["document"].path, r["score"]) for r in segmented.search("substring:.tsx", 10, 0.0)] == [
+			(r["document"].path, r["score"]) for r in engine.search("substring:.tsx", 10, 0.0)
+		], "❌ Segmented pattern search differs"
+
+	budgeted = engine.search("substring:the", max_results=100, min_score=0.0, max_work=3)
+	assert budgeted.partial and budgeted.visited == 3 and len(budgeted) <= 3
+	try:
+		engine.search("regex:use(")
+		assert False, "❌ Invalid regex accepted"
+	except ValueError:
+		pass
+
+	print(f"   ✅ Pattern search working ({len(trigrams['postings'])} trigrams)")
+	return True
+
+
+def test_sqlite_backend():
+	"""Test the SQLite FTS5 backend: incremental upserts and on-disk search."""
+	print("🧪 Test 28: Testing SQLite index backend...")
+
+	with tempfile.TemporaryDirectory() as tmp:
+		database_path = Path(tmp) / "index.sqlite"
+		builder = DocumentationIndexBuilder(docs_root="docs")
+		with contextlib.redirect_stdout(io.StringIO()):
+			builder.build_index()
+			builder.save_sqlite(str(database_path))
+
+		documents = builder.documents
+		index = SqliteIndex(database_path)
+		stats = index.write(documents, builder.metadata)
+		assert stats == {"written": 0, "deleted": 0, "unchanged": len(documents)}, (
+			f"❌ Unchanged build rewrote documents: {stats}"
+		)
+
+		reference = DocumentationSearchEngine(verbose=False)
+		engine = DocumentationSearchEngine(str(database_path), verbose=False)
+		assert engine.sqlite is not None and not engine.segments
+		assert len(engine.index_data["documents"]) == len(documents)
+
+		# Scores are those of lexical scoring, whatever the filters
+		for query, filters in [
+			("database migrations", {}),
+			("tags system", {}),
+			("keyboard shortcuts gallery", {"path_prefix": "docs/user-guide/"}),
+			("performance", {"priority": ["critical", "high"]}),
+		]:
+			expected = {
+				r["document"].path: round(r["score"], 9) for r in reference.search(query, 10, **filters)
+			}
+			results = engine.search(query, 10, **filters)
+			assert {r["document"].path: round(r["score"], 9) for r in results} == expected, (
+				f"❌ SQLite results differ for '{query}'"
+			)
+			for result in results:
+				assert result["matching_sections"], "❌ No matching sections"
+				for section in result["matching_sections"]:
+					assert section["section"] is result["document"].sections[section["index"]]
+
+		path = documents[0].path
+		assert engine.get_document(path).to_dict() == documents[0].to_dict()
+		assert engine.get_document("missing.md") is None
+
+		# Many readers query the database concurrently
+		expected = [(r["document"].path, r["score"]) for r in engine.search("database migrations")]
+		with ThreadPoolExecutor(max_workers=4) as pool:
+			outcomes = list(pool.map(
+				lambda _: [(r["document"].path, r["score"]) for r in engine.search("database migrations")],
+				range(16),
+			))
+		assert all(outcome == expected for outcome in outcomes), "❌ Concurrent readers disagree"
+
+		# Only the edited and the removed documents are written
+		edited = documents[1].to_dict()
+		edited["title"] = "Zymurgical Handbook"
+		stats = index.write([documents[0], Document.from_dict(edited)] + documents[3:], builder.metadata)
+		assert stats == {"written": 1, "deleted": 1, "unchanged": len(documents) - 2}, (
+			f"❌ Unexpected incremental update: {stats}"
+		)
+		results = engine.search("zymurgical")
+		assert [r["document"].path for r in results] == [documents[1].path]
+		assert engine.get_document(documents[2].path) is None, "❌ Removed document still indexed"
+
+		expired = engine.search("database migrations", deadline_ms=0)
+		assert expired.partial and not expired, "❌ Expired deadline not reported"
+
+		# Candidates are scored in slices; a deadline keeps the slices scored
+		# before it (the clock moves once the first slice is scored)
+		clock = [0.0]
+
+		def prior(priority: str, authority: float) -> float:
+			clock[0] = 1.0
+			return DocumentationSearchEngine._prior_score(priority, authority)
+
+		saved = index_sqlite.SEARCH_BATCH_ROWS, index_sqlite.PROGRESS_STEPS, index_sqlite.time
+		index_sqlite.SEARCH_BATCH_ROWS = 2
+		try:
+			sliced = SqliteIndex(database_path, prior)
+			rows, complete = sliced.search(["database", "migrations"], None, 0.0, 10)
+			assert complete and rows == engine.sqlite.search(["database", "migrations"], None, 0.0, 10)[0], (
+				"❌ Sliced SQLite search differs"
+			)
+			index_sqlite.PROGRESS_STEPS = 10**9
+			index_sqlite.time = types.SimpleNamespace(perf_counter=lambda: clock[0])
+			clock[0] = 0.0
+			rows, complete = sliced.search(["database", "migrations"], None, 0.0, 10, deadline=0.5)
+			assert not complete and 0 < len(rows) <= 2, f"❌ Scored slice dropped: {rows}"
+		finally:
+			index_sqlite.SEARCH_BATCH_ROWS, index_sqlite.PROGRESS_STEPS, index_sqlite.time = saved
+		try:
+			engine.search("substring:useTag")
+			assert False, "❌ Pattern query accepted by the SQLite backend"
+		except ValueError:
+			pass
+
+	print(f"   ✅ SQLite backend working ({len(documents)} documents, incremental updates)")
+	return True
+
+
 def run_all_tests():
 	"""Run all tests and report results."""
 	print("🤖 RAG System Test Suite - Lumina Portfolio\n")
@@ -256,6 +1524,25 @@ def run_all_tests():
 		test_related_documents,
 		test_priority_system,
 		test_keyword_extraction,
+		test_snapshot_loading,
+		test_startup_budget,
+		test_evaluation_harness,
+		test_segmented_index,
+		test_search_filters,
+		test_markdown_tokenizer,
+		test_deterministic_build,
+		test_document_records,
+		test_link_graph,
+		test_bounded_ingestion,
+		test_multi_root_index,
+		test_external_memory_build,
+		test_overlay_index,
+		test_query_log_replay,
+		test_section_tree,
+		test_deadline_search,
+		test_two_tier_search,
+		test_pattern_search,
+		test_sqlite_backend,
 	]
 
 	results = []